@@ -1,10 +1,17 @@
 # file: C:\Users\Novaes Engenharia\github - deploy\VRP\backend\VRP_DATABASE\database.py
 """
 SQLite + criação/migração do schema.
-- get_conn(): conexão
-- init_db(): cria e migra tabelas
+- connection(): conexão reaproveitada (pool por processo, uma por thread em uso)
+- transaction(): mesma conexão dentro de BEGIN/COMMIT (ROLLBACK em erro; aninhável)
+- connection_stats(): contadores de conexões abertas/reaproveitadas
+- get_conn(): conexão avulsa (legado; quem chama deve fechar)
+- init_db(): aplica migrações pendentes (schema_version + PRAGMA user_version)
 """
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
 
 try:
     from backend.VRP_SERVICE.export_paths import DB_PATH
@@ -12,26 +19,175 @@ except Exception:
     from pathlib import Path
     DB_PATH = Path(__file__).resolve().parents[1] / "VRP_DATABASE" / "vrp.db"
 
+# PRAGMAs aplicados uma única vez, quando a conexão é aberta
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA busy_timeout = 5000;",
+    "PRAGMA mmap_size = 268435456;",   # 256 MB
+    "PRAGMA cache_size = -20000;",     # ~20 MB
+    "PRAGMA foreign_keys = ON;",
+)
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+
+def _open_conn() -> sqlite3.Connection:
+    # isolation_level=None: autocommit; transações explícitas via transaction()
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+class ConnectionManager:
+    """
+    Pool de conexões SQLite por processo.
+    Cada thread recebe uma conexão exclusiva enquanto estiver dentro de connection();
+    chamadas aninhadas na mesma thread reutilizam a mesma conexão.
+    Ao sair do bloco externo a conexão volta ao pool (até max_idle ociosas).
+    """
+
+    def __init__(self, max_idle: int = 8):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: list[sqlite3.Connection] = []
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self.opened = 0
+        self.reused = 0
+
+    def _check_fork(self):
+        # conexões herdadas de outro processo (fork) não podem ser usadas
+        if self._pid != os.getpid():
+            self._idle = []
+            self._local = threading.local()
+            self._pid = os.getpid()
+            self.opened = self.reused = 0
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            self._check_fork()
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+            self.opened += 1
+        return _open_conn()
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        local = self._local
+        if getattr(local, "depth", 0) > 0:
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+        conn = self._acquire()
+        local.conn, local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            local.depth = 0
+            local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # transação aninhada -> SAVEPOINT
+                name = f"sp_{self._local.depth}"
+                conn.execute(f"SAVEPOINT {name}")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute(f"ROLLBACK TO {name}")
+                    conn.execute(f"RELEASE {name}")
+                    raise
+                conn.execute(f"RELEASE {name}")
+                return
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "opened": self.opened,
+                "reused": self.reused,
+                "idle": len(self._idle),
+            }
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_manager = ConnectionManager()
+
+
+def connection():
+    """Context manager com a conexão da thread atual (sem transação explícita)."""
+    return _manager.connection()
+
+
+def transaction(immediate: bool = False):
+    """Context manager com BEGIN/COMMIT; ROLLBACK se houver exceção."""
+    return _manager.transaction(immediate=immediate)
+
+
+def connection_stats() -> dict:
+    """Contadores do pool: conexões abertas, reaproveitadas e ociosas."""
+    return _manager.stats()
+
+
+def get_conn() -> sqlite3.Connection:
+    """Conexão avulsa, fora do pool (já configurada). Quem chama deve fechar."""
+    with _manager._lock:
+        _manager.opened += 1
+    return _open_conn()
+
+
 def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
     cur = conn.execute(f"PRAGMA table_info({table})")
     return any(r["name"] == column for r in cur.fetchall())
 
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
+def _run_script(conn: sqlite3.Connection, script: str):
+    """
+    Executa um script SQL comando a comando (executescript faria COMMIT implícito
+    e quebraria a transação da migração). Suporta triggers (BEGIN ... END;).
+    """
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                conn.execute(buf)
+            buf = ""
+    if buf.strip():
+        conn.execute(buf)
 
-    # --- Tabelas base
-    cur.executescript(
-        """
+
+# ---------- migrações (ordem importa; nunca editar uma já publicada) ----------
+def _m001_base_schema(conn: sqlite3.Connection):
+    _run_script(conn, """
         CREATE TABLE IF NOT EXISTS companies (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -89,7 +245,7 @@ def init_db():
             include_in_report INTEGER DEFAULT 1,
             display_order INTEGER DEFAULT 1,
             created_at TEXT DEFAULT (datetime('now')),
-            -- vrp_site_id será garantido por migração abaixo (ADD COLUMN)
+            -- vrp_site_id é garantido pela migração 2 (ADD COLUMN)
             FOREIGN KEY(checklist_id) REFERENCES checklists(id) ON DELETE CASCADE
         );
 
@@ -105,44 +261,398 @@ def init_db():
 
         CREATE INDEX IF NOT EXISTS idx_checklists_site ON checklists(vrp_site_id);
         CREATE INDEX IF NOT EXISTS idx_photos_checklist ON photos(checklist_id);
+    """)
+
+
+def _m002_photos_vrp_site(conn: sqlite3.Connection):
+    # garantir coluna vrp_site_id em photos
+    if not _column_exists(conn, "photos", "vrp_site_id"):
+        conn.execute("ALTER TABLE photos ADD COLUMN vrp_site_id INTEGER;")
+    # preenche vrp_site_id usando o checklist vinculado (quando existir)
+    conn.execute(
+        """
+        UPDATE photos
+           SET vrp_site_id = (
+                SELECT vrp_site_id FROM checklists
+                 WHERE checklists.id = photos.checklist_id
+           )
+         WHERE vrp_site_id IS NULL;
         """
     )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_site ON photos(vrp_site_id);")
 
-    # --- Migração: garantir coluna vrp_site_id em photos
-    if not _column_exists(conn, "photos", "vrp_site_id"):
-        cur.execute("ALTER TABLE photos ADD COLUMN vrp_site_id INTEGER;")
-        conn.commit()
-        # preenche vrp_site_id usando o checklist vinculado (quando existir)
-        cur.execute(
-            """
-            UPDATE photos
-               SET vrp_site_id = (
-                    SELECT vrp_site_id FROM checklists
-                     WHERE checklists.id = photos.checklist_id
-               )
-             WHERE vrp_site_id IS NULL;
-            """
-        )
-        conn.commit()
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_photos_site ON photos(vrp_site_id);")
-        conn.commit()
-
-    # --- Migração: adicionar campos de localização geográfica
-    if not _column_exists(conn, "vrp_sites", "latitude"):
-        cur.execute("ALTER TABLE vrp_sites ADD COLUMN latitude REAL;")
-        conn.commit()
-    
-    if not _column_exists(conn, "vrp_sites", "longitude"):
-        cur.execute("ALTER TABLE vrp_sites ADD COLUMN longitude REAL;")
-        conn.commit()
-
-    # --- Migração: adicionar novos campos do checklist
-    if not _column_exists(conn, "vrp_sites", "network_depth_cm"):
-        cur.execute("ALTER TABLE vrp_sites ADD COLUMN network_depth_cm REAL;")
-        conn.commit()
-    
-    if not _column_exists(conn, "vrp_sites", "has_automation"):
-        cur.execute("ALTER TABLE vrp_sites ADD COLUMN has_automation INTEGER DEFAULT 0;")
-        conn.commit()
-
-    conn.close()
+
+def _m003_vrp_sites_fields(conn: sqlite3.Connection):
+    # localização geográfica + novos campos do checklist (bancos antigos)
+    for column, ddl in (
+        ("latitude", "REAL"),
+        ("longitude", "REAL"),
+        ("network_depth_cm", "REAL"),
+        ("has_automation", "INTEGER DEFAULT 0"),
+    ):
+        if not _column_exists(conn, "vrp_sites", column):
+            conn.execute(f"ALTER TABLE vrp_sites ADD COLUMN {column} {ddl};")
+
+
+def _m004_vrp_sites_municipality(conn: sqlite3.Connection):
+    # município é gravado pelo formulário e lido pelas telas, mas faltava no schema
+    if not _column_exists(conn, "vrp_sites", "municipality"):
+        conn.execute("ALTER TABLE vrp_sites ADD COLUMN municipality TEXT;")
+
+
+def _m005_photo_derivatives(conn: sqlite3.Connection):
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS photo_derivatives (
+            photo_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            bytes INTEGER,
+            created_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (photo_id, kind),
+            FOREIGN KEY(photo_id) REFERENCES photos(id) ON DELETE CASCADE
+        );
+    """)
+
+
+def _m006_photos_content_hash(conn: sqlite3.Connection):
+    # armazenamento por conteúdo: referência = linhas de 'photos' com o mesmo content_hash
+    for column in ("content_hash", "source_hash"):
+        if not _column_exists(conn, "photos", column):
+            conn.execute(f"ALTER TABLE photos ADD COLUMN {column} TEXT;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_content_hash ON photos(content_hash);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_source_hash ON photos(source_hash);")
+
+
+def _m007_reports_fingerprint(conn: sqlite3.Connection):
+    # impressão digital das entradas do último relatório gerado (cache DOCX/PDF)
+    if not _column_exists(conn, "reports", "fingerprint"):
+        conn.execute("ALTER TABLE reports ADD COLUMN fingerprint TEXT;")
+
+
+def _m008_reports_image_bytes(conn: sqlite3.Connection):
+    # tamanho das fotos originais x variantes embutidas no último DOCX
+    for column in ("images_original_bytes", "images_embedded_bytes"):
+        if not _column_exists(conn, "reports", column):
+            conn.execute(f"ALTER TABLE reports ADD COLUMN {column} INTEGER;")
+
+
+def _m009_report_batches(conn: sqlite3.Connection):
+    # geração em lote (batch_report_service): um item por checklist, retomável
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS report_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            query TEXT,
+            options TEXT,
+            total INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'pending',
+            created_at TEXT DEFAULT (datetime('now')),
+            finished_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS report_batch_items (
+            batch_id INTEGER NOT NULL,
+            checklist_id INTEGER NOT NULL,
+            status TEXT CHECK(status IN ('pending','running','done','failed')) DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            docx_path TEXT,
+            pdf_path TEXT,
+            ai_ms INTEGER,
+            duration_ms INTEGER,
+            error TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            PRIMARY KEY (batch_id, checklist_id),
+            FOREIGN KEY(batch_id) REFERENCES report_batches(id) ON DELETE CASCADE,
+            FOREIGN KEY(checklist_id) REFERENCES checklists(id) ON DELETE CASCADE
+        );
+    """)
+
+
+def _m010_jobs(conn: sqlite3.Connection):
+    # fila de tarefas em segundo plano (job_service): relatório, IA e email
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            status TEXT CHECK(status IN ('queued','running','done','failed')) DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 3,
+            progress REAL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            worker TEXT,
+            run_after TEXT DEFAULT (datetime('now')),
+            heartbeat_at TEXT,
+            created_at TEXT DEFAULT (datetime('now')),
+            started_at TEXT,
+            finished_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_kind_created ON jobs(kind, created_at);
+    """)
+
+
+def _m011_ai_cache(conn: sqlite3.Connection):
+    # narrativas da IA por hash de contexto + modelo + prompt + temperatura (ai_cache)
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            ai_text TEXT NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT (datetime('now')),
+            last_used_at TEXT DEFAULT (datetime('now'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used ON ai_cache(last_used_at);
+    """)
+
+
+def _m012_email_outbox(conn: sqlite3.Connection):
+    # fila de saída de emails (email_outbox): status de entrega por mensagem
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            checklist_id INTEGER,
+            recipients TEXT NOT NULL,
+            report_path TEXT,
+            photos TEXT,
+            status TEXT CHECK(status IN ('queued','sending','sent','failed')) DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 5,
+            next_attempt_at TEXT DEFAULT (datetime('now')),
+            claimed_at TEXT,
+            last_error TEXT,
+            smtp_response TEXT,
+            created_at TEXT DEFAULT (datetime('now')),
+            sent_at TEXT,
+            FOREIGN KEY(checklist_id) REFERENCES checklists(id) ON DELETE SET NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, next_attempt_at, id);
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_checklist ON email_outbox(checklist_id, id);
+    """)
+
+def _m013_email_outbox_parts(conn: sqlite3.Connection):
+    # anexos planejados por mensagem: um envio grande vira várias linhas (parte k de n)
+    if not _column_exists(conn, "email_outbox", "attachments"):
+        conn.execute("ALTER TABLE email_outbox ADD COLUMN attachments TEXT;")
+    for column in ("part", "parts"):
+        if not _column_exists(conn, "email_outbox", column):
+            conn.execute(f"ALTER TABLE email_outbox ADD COLUMN {column} INTEGER DEFAULT 1;")
+
+def _m014_vrp_sites_rtree(conn: sqlite3.Connection):
+    # índice espacial (R*Tree) das coordenadas das VRPs, mantido por triggers
+    _run_script(conn, """
+        CREATE VIRTUAL TABLE IF NOT EXISTS vrp_sites_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng);
+        INSERT OR REPLACE INTO vrp_sites_rtree
+            SELECT id, latitude, latitude, longitude, longitude FROM vrp_sites
+             WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+        CREATE TRIGGER IF NOT EXISTS trg_vrp_sites_rtree_ins AFTER INSERT ON vrp_sites
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO vrp_sites_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_vrp_sites_rtree_upd AFTER UPDATE OF latitude, longitude ON vrp_sites
+        BEGIN
+            DELETE FROM vrp_sites_rtree WHERE id = OLD.id;
+            INSERT INTO vrp_sites_rtree
+                SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+                 WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_vrp_sites_rtree_del AFTER DELETE ON vrp_sites
+        BEGIN
+            DELETE FROM vrp_sites_rtree WHERE id = OLD.id;
+        END;
+    """)
+
+def _m015_vrp_sites_filter_indexes(conn: sqlite3.Connection):
+    # filtros/facetas do mapa no SQL: município (+DMC, tipo, DN), DMC isolado, tipo + DN
+    _run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_vrp_sites_filters ON vrp_sites(municipality, city, type, dn);
+        CREATE INDEX IF NOT EXISTS idx_vrp_sites_city ON vrp_sites(city);
+        CREATE INDEX IF NOT EXISTS idx_vrp_sites_type_dn ON vrp_sites(type, dn);
+    """)
+
+def _m016_checklists_history_indexes(conn: sqlite3.Connection):
+    # Histórico: páginas por (date, id) decrescente, com ou sem filtro de VRP/tipo de serviço
+    _run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_checklists_date_id ON checklists(date, id);
+        CREATE INDEX IF NOT EXISTS idx_checklists_site_date ON checklists(vrp_site_id, date, id);
+        CREATE INDEX IF NOT EXISTS idx_checklists_service_date ON checklists(service_type, date, id);
+    """)
+
+def _m017_search_index(conn: sqlite3.Connection):
+    # busca textual (FTS5): observações do checklist, acesso da VRP, rótulo/observação das fotos.
+    # rowid = id*4 + tipo (1 checklist, 2 VRP, 3 foto): triggers removem/atualizam sem varrer o índice
+    _run_script(conn, """
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            kind UNINDEXED, ref_id UNINDEXED, body,
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+
+        INSERT INTO search_index (rowid, kind, ref_id, body)
+            SELECT id * 4 + 1, 'checklist', id,
+                   trim(coalesce(notes_hydraulics, '') || char(10) || coalesce(observations_general, ''))
+              FROM checklists
+             WHERE trim(coalesce(notes_hydraulics, '') || coalesce(observations_general, '')) <> '';
+        INSERT INTO search_index (rowid, kind, ref_id, body)
+            SELECT id * 4 + 2, 'site', id, notes_access FROM vrp_sites
+             WHERE trim(coalesce(notes_access, '')) <> '';
+        INSERT INTO search_index (rowid, kind, ref_id, body)
+            SELECT id * 4 + 3, 'photo', id, trim(coalesce(label, '') || char(10) || coalesce(caption, ''))
+              FROM photos
+             WHERE trim(coalesce(label, '') || coalesce(caption, '')) <> '';
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_checklists_ins AFTER INSERT ON checklists
+        BEGIN
+            INSERT INTO search_index (rowid, kind, ref_id, body)
+                SELECT NEW.id * 4 + 1, 'checklist', NEW.id,
+                       trim(coalesce(NEW.notes_hydraulics, '') || char(10) || coalesce(NEW.observations_general, ''))
+                 WHERE trim(coalesce(NEW.notes_hydraulics, '') || coalesce(NEW.observations_general, '')) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_checklists_upd
+        AFTER UPDATE OF notes_hydraulics, observations_general ON checklists
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1;
+            INSERT INTO search_index (rowid, kind, ref_id, body)
+                SELECT NEW.id * 4 + 1, 'checklist', NEW.id,
+                       trim(coalesce(NEW.notes_hydraulics, '') || char(10) || coalesce(NEW.observations_general, ''))
+                 WHERE trim(coalesce(NEW.notes_hydraulics, '') || coalesce(NEW.observations_general, '')) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_checklists_del AFTER DELETE ON checklists
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_sites_ins AFTER INSERT ON vrp_sites
+        BEGIN
+            INSERT INTO search_index (rowid, kind, ref_id, body)
+                SELECT NEW.id * 4 + 2, 'site', NEW.id, NEW.notes_access
+                 WHERE trim(coalesce(NEW.notes_access, '')) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_sites_upd AFTER UPDATE OF notes_access ON vrp_sites
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2;
+            INSERT INTO search_index (rowid, kind, ref_id, body)
+                SELECT NEW.id * 4 + 2, 'site', NEW.id, NEW.notes_access
+                 WHERE trim(coalesce(NEW.notes_access, '')) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_sites_del AFTER DELETE ON vrp_sites
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + 2;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_search_photos_ins AFTER INSERT ON photos
+        BEGIN
+            INSERT INTO search_index (rowid, kind, ref_id, body)
+                SELECT NEW.id * 4 + 3, 'photo', NEW.id,
+                       trim(coalesce(NEW.label, '') || char(10) || coalesce(NEW.caption, ''))
+                 WHERE trim(coalesce(NEW.label, '') || coalesce(NEW.caption, '')) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_photos_upd AFTER UPDATE OF label, caption ON photos
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3;
+            INSERT INTO search_index (rowid, kind, ref_id, body)
+                SELECT NEW.id * 4 + 3, 'photo', NEW.id,
+                       trim(coalesce(NEW.label, '') || char(10) || coalesce(NEW.caption, ''))
+                 WHERE trim(coalesce(NEW.label, '') || coalesce(NEW.caption, '')) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_search_photos_del AFTER DELETE ON photos
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + 3;
+        END;
+    """)
+
+def _m018_data_version(conn: sqlite3.Connection):
+    # versão por tabela, incrementada por triggers em toda escrita (qualquer caminho/processo):
+    # o cache de leitura (read_cache) invalida comparando versões
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_version (
+            tbl TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+    for table in ("checklists", "vrp_sites", "photos", "photo_derivatives", "reports"):
+        conn.execute("INSERT OR IGNORE INTO data_version (tbl) VALUES (?)", (table,))
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            _run_script(conn, f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{op.lower()} AFTER {op} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE tbl = '{table}';
+                END;
+            """)
+
+
+MIGRATIONS = [
+    (1, "schema base", _m001_base_schema),
+    (2, "photos.vrp_site_id", _m002_photos_vrp_site),
+    (3, "vrp_sites: localização, profundidade e automação", _m003_vrp_sites_fields),
+    (4, "vrp_sites.municipality", _m004_vrp_sites_municipality),
+    (5, "photo_derivatives", _m005_photo_derivatives),
+    (6, "photos.content_hash/source_hash", _m006_photos_content_hash),
+    (7, "reports.fingerprint", _m007_reports_fingerprint),
+    (8, "reports.images_original_bytes/images_embedded_bytes", _m008_reports_image_bytes),
+    (9, "report_batches/report_batch_items", _m009_report_batches),
+    (10, "jobs", _m010_jobs),
+    (11, "ai_cache", _m011_ai_cache),
+    (12, "email_outbox", _m012_email_outbox),
+    (13, "email_outbox: partes e anexos", _m013_email_outbox_parts),
+    (14, "vrp_sites_rtree", _m014_vrp_sites_rtree),
+    (15, "vrp_sites: índices dos filtros", _m015_vrp_sites_filter_indexes),
+    (16, "checklists: índices do histórico", _m016_checklists_history_indexes),
+    (17, "search_index (FTS5)", _m017_search_index),
+    (18, "data_version", _m018_data_version),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_migrate_lock = threading.Lock()
+
+
+def _user_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _apply_migrations(conn: sqlite3.Connection) -> list[int]:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT (datetime('now'))
+        );
+        """
+    )
+    applied = []
+    for version, name, step in MIGRATIONS:
+        # BEGIN IMMEDIATE serializa com outros processos; a versão é relida dentro da transação
+        with transaction(immediate=True):
+            if _user_version(conn) >= version:
+                continue
+            step(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_version (version, name) VALUES (?,?)",
+                (version, name),
+            )
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    return applied
+
+
+def init_db() -> list[int]:
+    """
+    Cria/migra o schema. Barato em reruns: uma leitura de PRAGMA user_version
+    quando o banco já está na versão atual. Retorna as versões aplicadas agora.
+    """
+    with connection() as conn:
+        if _user_version(conn) >= SCHEMA_VERSION:
+            return []
+        with _migrate_lock:
+            return _apply_migrations(conn)
@@ -0,0 +1,209 @@
+"""
+Narrativas da IA em lote (ex.: um mês de checklists), com chamadas concorrentes:
+- um único AsyncGroq por lote, via llm_client (timeouts, métricas e disjuntor compartilhados;
+  GROQ_BASE_URL aponta para outro servidor compatível, ex. stub local)
+- TokenBucket: limita requisições/min (GROQ_RPM) e tokens/min (GROQ_TPM) como o provedor;
+  tokens estimados antes da chamada e ajustados pelo 'usage' da resposta
+- 429/erros transitórios: espera o Retry-After (ou backoff exponencial) e tenta de novo
+- falha definitiva de um item -> _offline_template só daquele item
+- usa o mesmo cache de ai_service (ai_cache): itens sem alteração nem chamam a IA
+- generate_ai_summaries(): API síncrona; agenerate_ai_summaries(): corrotina
+- CLI:
+    python -m backend.VRP_SERVICE.ai_batch_service --from 2025-08-01 --to 2025-08-31 --concurrency 8
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from . import llm_client
+from .ai_cache import ai_cache_key, get_cached, put_cached
+from .ai_service import (
+    GROQ_MODEL, SYSTEM_PROMPT, TEMPERATURE, _build_messages, _collect_context, _offline_template,
+)
+
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "12000"))
+EXPECTED_OUTPUT_TOKENS = 700  # reserva da resposta até o 'usage' real chegar
+MAX_RETRIES = 5        # 429 (limite do provedor)
+TRANSIENT_RETRIES = 2  # 5xx / conexão: desiste cedo e usa o modelo offline
+
+
+class TokenBucket:
+    """Balde que se enche a `per_minute`/60 por segundo, com capacidade de um minuto."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)  # pedido maior que o balde esperaria para sempre
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """Corrige a reserva (delta > 0 consome mais; < 0 devolve)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def _estimate_tokens(messages: list) -> int:
+    # ~4 caracteres por token em PT-BR é conservador o bastante para o limitador
+    return sum(len(m["content"]) for m in messages) // 4 + EXPECTED_OUTPUT_TOKENS
+
+
+def _retry_after(exc) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+async def _one(client, checklist_id: int, requests: TokenBucket, tokens: TokenBucket,
+               regenerate: bool) -> str:
+    import groq
+
+    # sqlite bloqueia (e get_cached grava contadores): fora do laço, para os baldes seguirem no ritmo
+    ctx = await asyncio.to_thread(_collect_context, checklist_id)
+    key = ai_cache_key(ctx, GROQ_MODEL, SYSTEM_PROMPT, TEMPERATURE)
+    if not regenerate:
+        cached = await asyncio.to_thread(get_cached, key)
+        if cached:
+            return cached
+    messages = _build_messages(ctx)
+    estimate = _estimate_tokens(messages)
+    # disjuntor consultado uma vez por item; os retries abaixo são do mesmo pedido
+    admitted = llm_client.breaker.admit()
+    if admitted is None:
+        return _offline_template(ctx)
+    rate_limited = transient = 0
+    recorded = False
+    try:
+        while True:
+            await requests.acquire()
+            await tokens.acquire(estimate)
+            t0 = time.perf_counter()
+            try:
+                chat = await client.chat.completions.create(
+                    model=GROQ_MODEL, temperature=TEMPERATURE, messages=messages,
+                )
+            except groq.RateLimitError as e:
+                # limite de taxa não indica provedor fora do ar: não conta no disjuntor
+                rate_limited += 1
+                if rate_limited > MAX_RETRIES:
+                    break
+                wait = _retry_after(e)  # "Retry-After: 0" vale: tenta de novo na hora
+                if wait is None:
+                    wait = min(60.0, 2 ** rate_limited) + random.uniform(0, 1)
+                await asyncio.sleep(wait)
+                continue
+            except (groq.APIConnectionError, groq.InternalServerError) as e:
+                llm_client.record((time.perf_counter() - t0) * 1000, e)
+                recorded = True
+                transient += 1
+                # disjuntor abriu (ou a chamada de teste falhou): não insiste
+                if transient > TRANSIENT_RETRIES or llm_client.breaker.state != "closed":
+                    break
+                await asyncio.sleep(2 ** transient + random.uniform(0, 1))
+                continue
+            except Exception as e:
+                llm_client.record((time.perf_counter() - t0) * 1000, e)
+                recorded = True
+                break
+            llm_client.record((time.perf_counter() - t0) * 1000)
+            recorded = True
+            usage = getattr(chat, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                tokens.adjust(usage.total_tokens - estimate)
+            text = chat.choices[0].message.content.strip()
+            await asyncio.to_thread(put_cached, key, GROQ_MODEL, text)
+            return text
+    finally:
+        if admitted == "trial" and not recorded:
+            llm_client.breaker.release()  # só 429 (ou cancelamento): a vaga de teste volta
+    return _offline_template(ctx)
+
+
+async def agenerate_ai_summaries(
+    checklist_ids: Iterable[int],
+    concurrency: int = 8,
+    regenerate: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[int, str]:
+    """{checklist_id: narrativa}; sem GROQ_API_KEY todos usam o modelo offline."""
+    ids = list(dict.fromkeys(checklist_ids))
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        return {cid: _offline_template(_collect_context(cid)) for cid in ids}
+
+    # retries ficam por conta deste módulo (respeitando o limitador)
+    client = llm_client.async_client(max_retries=0)
+    requests, tokens = TokenBucket(GROQ_RPM), TokenBucket(GROQ_TPM)
+    slots = asyncio.Semaphore(max(1, concurrency))
+    results: Dict[int, str] = {}
+
+    async def run(cid: int):
+        async with slots:
+            try:
+                results[cid] = await _one(client, cid, requests, tokens, regenerate)
+            except Exception:
+                results[cid] = _offline_template(await asyncio.to_thread(_collect_context, cid))
+        if progress:
+            progress(len(results), len(ids))
+
+    try:
+        await asyncio.gather(*(run(cid) for cid in ids))
+    finally:
+        await client.close()
+    return {cid: results[cid] for cid in ids}
+
+
+def generate_ai_summaries(
+    checklist_ids: Iterable[int],
+    concurrency: int = 8,
+    regenerate: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[int, str]:
+    return asyncio.run(agenerate_ai_summaries(checklist_ids, concurrency, regenerate, progress))
+
+
+if __name__ == "__main__":
+    import argparse
+    from backend.VRP_DATABASE.database import init_db
+    from .batch_report_service import select_checklists
+
+    parser = argparse.ArgumentParser(description="Gera narrativas da IA em lote (ficam no cache).")
+    parser.add_argument("ids", nargs="*", type=int, help="ids de checklist (padrão: filtros abaixo)")
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--dmc", dest="city")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--regenerate", action="store_true", help="ignora o cache")
+    args = parser.parse_args()
+
+    init_db()
+    ids = args.ids or select_checklists(date_from=args.date_from, date_to=args.date_to, city=args.city)
+    started = time.perf_counter()
+    out = generate_ai_summaries(
+        ids, args.concurrency, args.regenerate,
+        progress=lambda done, total: print(f"\r{done}/{total}", end="", flush=True),
+    )
+    print(f"\n{len(out)} narrativas em {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,73 @@
+"""
+Cache persistente das narrativas da IA (tabela 'ai_cache').
+- ai_cache_key(): hash do contexto do checklist + modelo + prompt de sistema + temperatura
+- get_cached() / put_cached(): leitura (atualiza uso) e gravação com expiração e descarte LRU
+- ai_cache_stats(): acertos/faltas deste processo e tamanho do cache
+
+Limites via .env:
+  VRP_AI_CACHE_TTL_DAYS (validade, padrão 30), VRP_AI_CACHE_MAX (entradas, padrão 500)
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+from backend.VRP_DATABASE.database import connection, transaction
+
+AI_CACHE_TTL_DAYS = int(os.getenv("VRP_AI_CACHE_TTL_DAYS", "30"))
+AI_CACHE_MAX = int(os.getenv("VRP_AI_CACHE_MAX", "500"))
+
+_counters = {"hits": 0, "misses": 0}
+_counters_lock = threading.Lock()
+
+
+def ai_cache_key(ctx: dict, model: str, system_prompt: str, temperature: float) -> str:
+    payload = {"ctx": ctx, "model": model, "system": system_prompt, "temperature": temperature}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def get_cached(key: str) -> Optional[str]:
+    """Narrativa em cache ainda válida (None = falta)."""
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT ai_text FROM ai_cache WHERE key=? AND created_at >= datetime('now', ?)",
+            (key, f"-{AI_CACHE_TTL_DAYS} days"),
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE ai_cache SET hits=hits+1, last_used_at=datetime('now') WHERE key=?", (key,)
+            )
+    _count("hits" if row else "misses")
+    return row["ai_text"] if row else None
+
+
+def put_cached(key: str, model: str, ai_text: str):
+    """Grava (ou renova) a entrada; remove expiradas e as menos usadas acima de AI_CACHE_MAX."""
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO ai_cache (key, model, ai_text) VALUES (?,?,?)
+               ON CONFLICT(key) DO UPDATE SET ai_text=excluded.ai_text, model=excluded.model,
+                   created_at=datetime('now'), last_used_at=datetime('now')""",
+            (key, model, ai_text),
+        )
+        conn.execute("DELETE FROM ai_cache WHERE created_at < datetime('now', ?)", (f"-{AI_CACHE_TTL_DAYS} days",))
+        conn.execute(
+            """DELETE FROM ai_cache WHERE key IN (
+                   SELECT key FROM ai_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)""",
+            (AI_CACHE_MAX,),
+        )
+
+
+def ai_cache_stats() -> dict:
+    with _counters_lock:
+        stats = dict(_counters)
+    with connection() as conn:
+        stats["entries"] = conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+    return stats
@@ -3,28 +3,45 @@
 Narrativa técnica com GROQ (Llama-3.3-70B-Versatile).
 - Usa observações como CONTEXTO, mas NÃO as reproduz.
 - Saída em PT-BR, termos de VRP e unidades em mca.
-Docs oficiais: models e chat completions. 
+- Respostas em cache por contexto/modelo/prompt/temperatura (ai_cache); regenerate=True ignora o cache.
+- stream_ai_summary(): mesma narrativa em pedaços (stream da chat completion) para a tela exibir aos poucos.
+- Chamadas via llm_client (cliente único, timeouts, disjuntor): IA indisponível -> modelo offline.
+Docs oficiais: models e chat completions.
 """
 import os
+import re
 from textwrap import dedent
+from typing import Iterator
 from dotenv import load_dotenv
-from backend.VRP_DATABASE.database import get_conn
+from backend.VRP_DATABASE.database import connection, transaction
+from . import llm_client
+from .ai_cache import ai_cache_key, get_cached, put_cached
 
 load_dotenv()
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+TEMPERATURE = 0.3
+
+SYSTEM_PROMPT = dedent("""
+Você é engenheiro especialista em válvulas redutoras de pressão (VRP).
+Gere uma ANÁLISE TÉCNICA concisa em PT-BR, com foco em condições encontradas,
+procedimentos executados, aferições (mca) e recomendações.
+Use as observações fornecidas APENAS como insumo; NÃO cite, copie ou revele as frases originais.
+Não invente números. Unidades de pressão: mca.
+Seja efetivo, não seja redundante.
+Estruture com pequenos e médios parágrafos e listas quando adequado.
+""")
 
 def _collect_context(checklist_id: int) -> dict:
-    conn = get_conn()
-    ck = conn.execute("SELECT * FROM checklists WHERE id=?", (checklist_id,)).fetchone()
-    site = None
-    if ck and ck["vrp_site_id"]:
-        site = conn.execute("SELECT * FROM vrp_sites WHERE id=?", (ck["vrp_site_id"],)).fetchone()
-    photos = conn.execute("""
-        SELECT label, caption FROM photos
-        WHERE checklist_id=? AND include_in_report=1
-        ORDER BY display_order,id
-    """, (checklist_id,)).fetchall()
-    conn.close()
+    with connection() as conn:
+        ck = conn.execute("SELECT * FROM checklists WHERE id=?", (checklist_id,)).fetchone()
+        site = None
+        if ck and ck["vrp_site_id"]:
+            site = conn.execute("SELECT * FROM vrp_sites WHERE id=?", (ck["vrp_site_id"],)).fetchone()
+        photos = conn.execute("""
+            SELECT label, caption FROM photos
+            WHERE checklist_id=? AND include_in_report=1
+            ORDER BY display_order,id
+        """, (checklist_id,)).fetchall()
     return {"ck": dict(ck) if ck else {}, "site": dict(site) if site else {}, "photos": [dict(p) for p in photos]}
 
 def _offline_template(ctx: dict) -> str:
@@ -38,40 +55,89 @@ def _offline_template(ctx: dict) -> str:
     Recomendações: manter rotina de inspeção, reaperto e validação pós-intervenção.
     """).strip()
 
-def generate_ai_summary(checklist_id: int) -> str:
+def _build_messages(ctx: dict) -> list:
+    user_payload = {
+        "checklist": {k:v for k,v in ctx["ck"].items() if k not in ("notes_hydraulics","observations_general")},
+        "site": ctx["site"],
+        # Observações das fotos entram como insumo, mas não devem aparecer textualmente
+        "observations_from_images": [p.get("caption","") for p in ctx["photos"] if p.get("caption")],
+    }
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Elabore a análise técnica a partir destes dados:\n{user_payload}"}
+    ]
+
+def generate_ai_summary(checklist_id: int, regenerate: bool = False) -> str:
     ctx = _collect_context(checklist_id)
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
         return _offline_template(ctx)
+    key = ai_cache_key(ctx, GROQ_MODEL, SYSTEM_PROMPT, TEMPERATURE)
+    if not regenerate:
+        cached = get_cached(key)
+        if cached:
+            return cached
     try:
-        from groq import Groq  # SDK oficial
-        client = Groq(api_key=api_key)
+        chat = llm_client.chat(_build_messages(ctx), model=GROQ_MODEL, temperature=TEMPERATURE)
+        text = chat.choices[0].message.content.strip()
+    except Exception:
+        # falha já registrada em llm_client (log/métricas/disjuntor);
+        # modelo offline não entra no cache: a próxima chamada tenta a IA de novo
+        return _offline_template(ctx)
+    put_cached(key, GROQ_MODEL, text)
+    return text
 
-        system = dedent("""
-        Você é engenheiro especialista em válvulas redutoras de pressão (VRP).
-        Gere uma ANÁLISE TÉCNICA concisa em PT-BR, com foco em condições encontradas,
-        procedimentos executados, aferições (mca) e recomendações.
-        Use as observações fornecidas APENAS como insumo; NÃO cite, copie ou revele as frases originais.
-        Não invente números. Unidades de pressão: mca.
-        Seja efetivo, não seja redundante.
-        Estruture com pequenos e médios parágrafos e listas quando adequado.
-        """)
+class AIStreamInterrupted(RuntimeError):
+    """A resposta da IA caiu no meio do stream (o texto já exibido está incompleto)."""
 
-        user_payload = {
-            "checklist": {k:v for k,v in ctx["ck"].items() if k not in ("notes_hydraulics","observations_general")},
-            "site": ctx["site"],
-            # Observações das fotos entram como insumo, mas não devem aparecer textualmente
-            "observations_from_images": [p.get("caption","") for p in ctx["photos"] if p.get("caption")],
-        }
+def _chunked(text: str) -> Iterator[str]:
+    # palavra a palavra, preservando espaços e quebras de linha
+    yield from re.findall(r"\S+\s*|\s+", text)
 
-        chat = client.chat.completions.create(
-            model=GROQ_MODEL,
-            temperature=0.3,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": f"Elabore a análise técnica a partir destes dados:\n{user_payload}"}
-            ],
+def stream_ai_summary(checklist_id: int, regenerate: bool = False) -> Iterator[str]:
+    """
+    Gera a narrativa em pedaços. Cache e modelo offline seguem a mesma regra de generate_ai_summary.
+    AIStreamInterrupted se a IA falhar depois de já ter enviado parte do texto.
+    """
+    ctx = _collect_context(checklist_id)
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        yield from _chunked(_offline_template(ctx))
+        return
+    key = ai_cache_key(ctx, GROQ_MODEL, SYSTEM_PROMPT, TEMPERATURE)
+    if not regenerate:
+        cached = get_cached(key)
+        if cached:
+            yield cached
+            return
+    parts, finished = [], False
+    try:
+        stream = llm_client.chat_stream(_build_messages(ctx), model=GROQ_MODEL, temperature=TEMPERATURE)
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+            finished = finished or chunk.choices[0].finish_reason is not None
+        if not finished:
+            # conexão encerrada sem o último pedaço (finish_reason): resposta incompleta
+            raise ConnectionError("stream encerrado antes do fim da resposta")
+    except Exception as e:
+        if not parts:
+            yield from _chunked(_offline_template(ctx))
+            return
+        raise AIStreamInterrupted(str(e)) from e
+    text = "".join(parts).strip()
+    if text:
+        put_cached(key, GROQ_MODEL, text)
+
+def save_ai_summary(checklist_id: int, ai_text: str):
+    """Grava a narrativa em 'reports' (sobrevive a recarregar a página, antes da exportação)."""
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO reports (checklist_id, ai_summary) VALUES (?,?)
+               ON CONFLICT(checklist_id) DO UPDATE SET ai_summary=excluded.ai_summary""",
+            (checklist_id, ai_text),
         )
-        return chat.choices[0].message.content.strip()
-    except Exception:
-        return _offline_template(ctx)
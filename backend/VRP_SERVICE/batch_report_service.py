@@ -0,0 +1,293 @@
+"""
+Geração de relatórios em lote (fechamento mensal, todas as VRPs de um DMC etc.).
+- select_checklists(): checklists por período, VRP, local DMC, município e tipo de serviço
+- create_batch(): registra o lote em 'report_batches' + um item por checklist em 'report_batch_items'
+- run_batch(): processa os itens pendentes em um pool de processos (concorrência limitada);
+  cada item concluído é gravado na hora, então um lote interrompido é retomado de onde parou;
+  narrativas que faltam são geradas antes, em lote (ai_batch_service), e os processos as leem do cache
+- CLI (sem Streamlit):
+    python -m backend.VRP_SERVICE.batch_report_service run --from 2025-08-01 --to 2025-08-31 --workers 4
+    python -m backend.VRP_SERVICE.batch_report_service resume 7 [--retry-failed]
+    python -m backend.VRP_SERVICE.batch_report_service list
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.VRP_DATABASE.database import connection, transaction
+
+
+def select_checklists(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    vrp_site_id: Optional[int] = None,
+    city: Optional[str] = None,
+    municipality: Optional[str] = None,
+    service_type: Optional[str] = None,
+) -> List[int]:
+    """Ids dos checklists que atendem aos filtros (datas 'YYYY-MM-DD', inclusivas)."""
+    where, params = [], []
+    if date_from:
+        where.append("c.date >= ?"); params.append(date_from)
+    if date_to:
+        where.append("c.date <= ?"); params.append(date_to)
+    if vrp_site_id:
+        where.append("c.vrp_site_id = ?"); params.append(vrp_site_id)
+    if city:
+        where.append("vs.city = ?"); params.append(city)
+    if municipality:
+        where.append("vs.municipality = ?"); params.append(municipality)
+    if service_type:
+        where.append("c.service_type = ?"); params.append(service_type)
+    sql = "SELECT c.id FROM checklists c LEFT JOIN vrp_sites vs ON vs.id = c.vrp_site_id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY c.date, c.id"
+    with connection() as conn:
+        return [r["id"] for r in conn.execute(sql, params)]
+
+
+def create_batch(query: Dict[str, Any], with_ai: bool = True, force: bool = False) -> int:
+    """Cria o lote com os checklists selecionados por query (kwargs de select_checklists)."""
+    ids = select_checklists(**query)
+    options = {"with_ai": with_ai, "force": force}
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT INTO report_batches (query, options, total) VALUES (?,?,?)",
+            (json.dumps(query, ensure_ascii=False), json.dumps(options), len(ids)),
+        )
+        batch_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO report_batch_items (batch_id, checklist_id) VALUES (?,?)",
+            [(batch_id, cid) for cid in ids],
+        )
+    return batch_id
+
+
+def _process_one(checklist_id: int, with_ai: bool, force: bool) -> Dict[str, Any]:
+    """Executa no processo filho: narrativa (salva > IA > modelo offline) + DOCX/PDF."""
+    from .ai_service import generate_ai_summary
+    from .report_service import generate_full_report
+
+    t0 = time.perf_counter()
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT ai_summary FROM reports WHERE checklist_id=?", (checklist_id,)
+        ).fetchone()
+    ai_text = row["ai_summary"] if row and row["ai_summary"] else None
+    if not ai_text:
+        if with_ai:
+            ai_text = generate_ai_summary(checklist_id)
+        else:
+            from .ai_service import _collect_context, _offline_template
+            ai_text = _offline_template(_collect_context(checklist_id))
+    t_ai = time.perf_counter()
+    docx_path, pdf_path = generate_full_report(checklist_id, ai_text, force=force)
+    t_end = time.perf_counter()
+    return {
+        "docx_path": docx_path,
+        "pdf_path": pdf_path,
+        "ai_ms": int((t_ai - t0) * 1000),
+        "duration_ms": int((t_end - t0) * 1000),
+    }
+
+
+def _prefetch_ai(checklist_ids: List[int]):
+    """Narrativas que faltam geradas de uma vez (concorrentes, com limite de taxa) -> cache da IA."""
+    from .ai_batch_service import generate_ai_summaries
+    marks = ",".join("?" * len(checklist_ids))
+    with connection() as conn:
+        saved = {r["checklist_id"] for r in conn.execute(
+            f"SELECT checklist_id FROM reports WHERE ai_summary IS NOT NULL AND checklist_id IN ({marks})",
+            checklist_ids,
+        )}
+    missing = [cid for cid in checklist_ids if cid not in saved]
+    if missing:
+        generate_ai_summaries(missing)
+
+
+def _pending_items(batch_id: int, retry_failed: bool) -> List[int]:
+    statuses = ("pending", "running", "failed") if retry_failed else ("pending", "running")
+    marks = ",".join("?" * len(statuses))
+    with transaction() as conn:
+        # 'running' sobrando = execução anterior interrompida
+        conn.execute(
+            "UPDATE report_batch_items SET status='pending' WHERE batch_id=? AND status='running'",
+            (batch_id,),
+        )
+        rows = conn.execute(
+            f"SELECT checklist_id FROM report_batch_items WHERE batch_id=? AND status IN ({marks}) ORDER BY checklist_id",
+            (batch_id, *statuses),
+        ).fetchall()
+    return [r["checklist_id"] for r in rows]
+
+
+def _finish_item(batch_id: int, checklist_id: int, result: Optional[Dict[str, Any]], error: Optional[str]):
+    with transaction() as conn:
+        if error is None:
+            conn.execute(
+                """UPDATE report_batch_items
+                      SET status='done', docx_path=?, pdf_path=?, ai_ms=?, duration_ms=?, error=NULL,
+                          attempts=attempts+1, finished_at=datetime('now')
+                    WHERE batch_id=? AND checklist_id=?""",
+                (result["docx_path"], result["pdf_path"], result["ai_ms"], result["duration_ms"],
+                 batch_id, checklist_id),
+            )
+        else:
+            conn.execute(
+                """UPDATE report_batch_items
+                      SET status='failed', error=?, attempts=attempts+1, finished_at=datetime('now')
+                    WHERE batch_id=? AND checklist_id=?""",
+                (error, batch_id, checklist_id),
+            )
+
+
+def run_batch(
+    batch_id: int,
+    workers: Optional[int] = None,
+    retry_failed: bool = False,
+    on_item: Optional[Callable[[int, Optional[Dict[str, Any]], Optional[str]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Processa os itens pendentes do lote com no máximo `workers` processos.
+    on_item(checklist_id, resultado, erro) é chamado a cada item concluído.
+    Retorna o resumo do lote (batch_summary).
+    """
+    with connection() as conn:
+        batch = conn.execute("SELECT options FROM report_batches WHERE id=?", (batch_id,)).fetchone()
+    if not batch:
+        raise ValueError(f"Lote {batch_id} não encontrado")
+    options = json.loads(batch["options"] or "{}")
+    todo = _pending_items(batch_id, retry_failed)
+    if todo:
+        with transaction() as conn:
+            conn.execute("UPDATE report_batches SET status='running', finished_at=NULL WHERE id=?", (batch_id,))
+            conn.executemany(
+                "UPDATE report_batch_items SET status='running', started_at=datetime('now') WHERE batch_id=? AND checklist_id=?",
+                [(batch_id, cid) for cid in todo],
+            )
+        if options.get("with_ai", True):
+            _prefetch_ai(todo)
+        workers = max(1, min(workers or os.cpu_count() or 1, len(todo)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_process_one, cid, options.get("with_ai", True), options.get("force", False)): cid
+                for cid in todo
+            }
+            for fut in as_completed(futures):
+                cid = futures[fut]
+                try:
+                    result, error = fut.result(), None
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+                _finish_item(batch_id, cid, result, error)
+                if on_item:
+                    on_item(cid, result, error)
+
+    summary = batch_summary(batch_id)
+    status = "done" if summary["failed"] == 0 and summary["pending"] == 0 else "partial"
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE report_batches SET status=?, finished_at=datetime('now') WHERE id=?",
+            (status, batch_id),
+        )
+    summary["status"] = status
+    return summary
+
+
+def batch_summary(batch_id: int) -> Dict[str, Any]:
+    with connection() as conn:
+        rows = [dict(r) for r in conn.execute(
+            "SELECT * FROM report_batch_items WHERE batch_id=? ORDER BY checklist_id", (batch_id,)
+        )]
+    done = [r for r in rows if r["status"] == "done"]
+    durations = sorted(r["duration_ms"] for r in done if r["duration_ms"] is not None)
+    return {
+        "batch_id": batch_id,
+        "total": len(rows),
+        "done": len(done),
+        "failed": sum(1 for r in rows if r["status"] == "failed"),
+        "pending": sum(1 for r in rows if r["status"] in ("pending", "running")),
+        "p50_ms": durations[len(durations) // 2] if durations else None,
+        "max_ms": durations[-1] if durations else None,
+        "failures": [(r["checklist_id"], r["error"]) for r in rows if r["status"] == "failed"],
+    }
+
+
+def list_batches(limit: int = 20) -> List[Dict[str, Any]]:
+    with connection() as conn:
+        return [dict(r) for r in conn.execute(
+            "SELECT id, created_at, finished_at, status, total, query FROM report_batches ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )]
+
+
+def _print_item(cid: int, result: Optional[Dict[str, Any]], error: Optional[str]):
+    if error:
+        print(f"[FALHA] CK {cid}: {error}", flush=True)
+    else:
+        pdf = "PDF ok" if result["pdf_path"] else "sem PDF"
+        print(f"[ok] CK {cid}: {result['duration_ms'] / 1000:.1f}s (IA {result['ai_ms'] / 1000:.1f}s, {pdf}) "
+              f"-> {result['docx_path']}", flush=True)
+
+
+def _print_summary(summary: Dict[str, Any], elapsed: float):
+    print("-" * 60)
+    print(f"Lote #{summary['batch_id']}: {summary['done']}/{summary['total']} concluídos, "
+          f"{summary['failed']} falhas, {summary['pending']} pendentes em {elapsed:.1f}s")
+    if summary["p50_ms"] is not None:
+        print(f"Tempo por relatório: mediana {summary['p50_ms'] / 1000:.1f}s • máximo {summary['max_ms'] / 1000:.1f}s")
+    for cid, err in summary["failures"]:
+        print(f"  CK {cid}: {err}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from backend.VRP_DATABASE.database import init_db
+
+    parser = argparse.ArgumentParser(description="Geração de relatórios VRP em lote.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="cria e executa um lote")
+    run.add_argument("--from", dest="date_from", help="data inicial (YYYY-MM-DD)")
+    run.add_argument("--to", dest="date_to", help="data final (YYYY-MM-DD)")
+    run.add_argument("--site", dest="vrp_site_id", type=int, help="id da VRP")
+    run.add_argument("--dmc", dest="city", help="local DMC (ex.: 'DMC - PIO XII')")
+    run.add_argument("--municipality", help="município")
+    run.add_argument("--service-type", help="tipo de serviço")
+    run.add_argument("--no-ai", action="store_true", help="sem chamada à IA (usa narrativa salva ou modelo offline)")
+    run.add_argument("--force", action="store_true", help="regera mesmo relatórios sem alterações")
+    run.add_argument("--workers", type=int, default=None, help="processos simultâneos (padrão: nº de CPUs)")
+
+    res = sub.add_parser("resume", help="retoma um lote interrompido")
+    res.add_argument("batch_id", type=int)
+    res.add_argument("--retry-failed", action="store_true", help="reprocessa também os itens com falha")
+    res.add_argument("--workers", type=int, default=None)
+
+    sub.add_parser("list", help="lista os últimos lotes")
+    args = parser.parse_args()
+
+    init_db()
+    if args.cmd == "list":
+        for b in list_batches():
+            print(f"#{b['id']}  {b['created_at']}  {b['status']:<8} {b['total']:>4} itens  {b['query']}")
+        sys.exit(0)
+
+    if args.cmd == "run":
+        query = {k: v for k, v in {
+            "date_from": args.date_from, "date_to": args.date_to, "vrp_site_id": args.vrp_site_id,
+            "city": args.city, "municipality": args.municipality, "service_type": args.service_type,
+        }.items() if v}
+        batch_id = create_batch(query, with_ai=not args.no_ai, force=args.force)
+        print(f"Lote #{batch_id} criado.")
+        retry_failed = False
+    else:
+        batch_id, retry_failed = args.batch_id, args.retry_failed
+
+    started = time.perf_counter()
+    summary = run_batch(batch_id, workers=args.workers, retry_failed=retry_failed, on_item=_print_item)
+    _print_summary(summary, time.perf_counter() - started)
+    sys.exit(0 if summary["failed"] == 0 else 1)
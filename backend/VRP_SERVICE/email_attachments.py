@@ -0,0 +1,255 @@
+"""
+Anexos de email dentro do limite do provedor, sem carregar os arquivos na memória:
+- plan_report_email(): decide o que vai em cada mensagem
+    * fotos: derivado 'medium' (1280 px) quando existir, senão o original
+    * muitas fotos (> EMAIL_ZIP_PHOTOS_OVER): agrupadas em ZIP(s)
+    * tamanho estimado já codificado em base64; passou de EMAIL_MAX_MESSAGE_MB -> nova mensagem
+    * um anexo que sozinho passa do limite -> AttachmentTooLargeError (o provedor recusaria)
+- write_mime(): grava a mensagem MIME em arquivo, codificando cada anexo em blocos
+  (ZIPs montados em arquivo temporário na hora do envio)
+- send_mime_file(): MAIL/RCPT/DATA com o corpo lido do arquivo (nunca a mensagem inteira na memória)
+
+Config via .env:
+  EMAIL_MAX_MESSAGE_MB (tamanho máximo codificado por mensagem, padrão 20),
+  EMAIL_ZIP_PHOTOS_OVER (fotos acima disso vão em ZIP, padrão 8; 0 = sempre ZIP)
+"""
+import base64
+import logging
+import mimetypes
+import os
+import smtplib
+import tempfile
+import uuid
+import zipfile
+from email.header import Header
+from email.utils import encode_rfc2231, formatdate, make_msgid
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+MAX_MESSAGE_BYTES = int(float(os.getenv("EMAIL_MAX_MESSAGE_MB", "20")) * 1024 * 1024)
+ZIP_PHOTOS_OVER = int(os.getenv("EMAIL_ZIP_PHOTOS_OVER", "8"))
+
+PART_OVERHEAD = 400           # cabeçalhos MIME de cada anexo
+MESSAGE_OVERHEAD = 4 * 1024   # cabeçalhos + corpo do email
+ZIP_ENTRY_OVERHEAD = 120      # cabeçalho local + diretório central por arquivo
+B64_CHUNK = 57 * 1024         # múltiplo de 57 bytes = linhas base64 completas de 76 caracteres
+SEND_CHUNK = 64 * 1024
+
+
+class AttachmentTooLargeError(ValueError):
+    """Anexo que não cabe numa mensagem nem sozinho (EMAIL_MAX_MESSAGE_MB)."""
+
+
+def encoded_size(raw_bytes: int) -> int:
+    """Bytes após base64 com quebra de linha CRLF a cada 76 caracteres."""
+    b64 = 4 * ((raw_bytes + 2) // 3)
+    return b64 + 2 * ((b64 + 75) // 76) + PART_OVERHEAD
+
+
+def _photo_file(path: str) -> Optional[Path]:
+    """Derivado de tela (medium) se existir; senão o original."""
+    from .image_service import derivative_path  # PIL só quando há email com fotos
+    src = Path(path)
+    medium = derivative_path(src, "medium")
+    if medium.is_file():
+        return medium
+    return src if src.is_file() else None
+
+
+def _file_unit(path: Path, name: Optional[str] = None) -> Dict:
+    size = path.stat().st_size
+    return {"kind": "file", "path": str(path), "name": name or path.name, "est": encoded_size(size)}
+
+
+def _zip_units(photos: List[Path], budget: int, prefix: str) -> List[Dict]:
+    """Agrupa as fotos em ZIPs (sem compressão: JPEG não encolhe) que cabem no orçamento."""
+    groups, current, current_raw = [], [], 0
+    for p in photos:
+        raw = p.stat().st_size + ZIP_ENTRY_OVERHEAD + len(p.name.encode())
+        if current and encoded_size(current_raw + raw) > budget:
+            groups.append((current, current_raw))
+            current, current_raw = [], 0
+        current.append(p)
+        current_raw += raw
+    if current:
+        groups.append((current, current_raw))
+    units = []
+    for i, (members, raw) in enumerate(groups, 1):
+        suffix = f"_{i}" if len(groups) > 1 else ""
+        units.append({"kind": "zip", "name": f"{prefix}{suffix}.zip",
+                      "members": [str(m) for m in members], "est": encoded_size(raw + 22)})
+    return units
+
+
+def plan_report_email(checklist_id: int, report_path: str, photos_paths: List[str],
+                      max_bytes: int = MAX_MESSAGE_BYTES) -> List[List[Dict]]:
+    """
+    Lista de mensagens, cada uma com seus anexos:
+    [{"kind": "file", "path", "name", "est"} | {"kind": "zip", "name", "members", "est"}].
+    AttachmentTooLargeError se algum anexo sozinho já passar de max_bytes.
+    """
+    budget = max_bytes - MESSAGE_OVERHEAD
+    units: List[Dict] = []
+    if report_path and Path(report_path).is_file():
+        units.append(_file_unit(Path(report_path)))
+    photos = [p for p in (_photo_file(x) for x in photos_paths) if p is not None]
+    if photos and len(photos) > ZIP_PHOTOS_OVER:
+        units.extend(_zip_units(photos, budget, f"Fotos_Checklist_{checklist_id}"))
+    else:
+        units.extend(_file_unit(p) for p in photos)
+
+    oversize = [u for u in units if u["est"] > budget]
+    if oversize:
+        names = ", ".join(f"{u['name']} (~{u['est'] / (1024 * 1024):.1f} MB)" for u in oversize)
+        log.warning("Checklist %s: anexo acima do limite do email: %s", checklist_id, names)
+        raise AttachmentTooLargeError(
+            f"Anexo acima do limite de {max_bytes / (1024 * 1024):.0f} MB por email (já codificado): {names}"
+        )
+
+    # na ordem (relatório primeiro): abre nova mensagem quando o próximo anexo não cabe
+    messages: List[List[Dict]] = [[]]
+    used = 0
+    for unit in units:
+        if messages[-1] and used + unit["est"] > budget:
+            messages.append([])
+            used = 0
+        messages[-1].append(unit)
+        used += unit["est"]
+    return messages
+
+
+# ---------- MIME em arquivo ----------
+def _write_b64(out: BinaryIO, src: BinaryIO):
+    while True:
+        chunk = src.read(B64_CHUNK)
+        if not chunk:
+            break
+        out.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+
+
+def _filename_params(name: str) -> str:
+    try:
+        name.encode("ascii")
+        return f'filename="{name}"'
+    except UnicodeEncodeError:
+        return f"filename*={encode_rfc2231(name, 'utf-8')}"
+
+
+def _write_attachment(out: BinaryIO, boundary: str, unit: Dict):
+    name = unit["name"]
+    ctype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    out.write(
+        f"--{boundary}\r\n"
+        f"Content-Type: {ctype}\r\n"
+        f"Content-Transfer-Encoding: base64\r\n"
+        f"Content-Disposition: attachment; {_filename_params(name)}\r\n\r\n".encode("ascii")
+    )
+    if unit["kind"] == "zip":
+        with tempfile.TemporaryFile() as tmp:
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+                for member in unit["members"]:
+                    if Path(member).is_file():
+                        zf.write(member, Path(member).name)
+            tmp.seek(0)
+            _write_b64(out, tmp)
+    else:
+        with open(unit["path"], "rb") as fh:
+            _write_b64(out, fh)
+
+
+def write_mime(out: BinaryIO, from_email: str, recipients: List[str], subject: str,
+               body: str, attachments: List[Dict]):
+    """Grava a mensagem completa (linhas CRLF) em `out`, anexo por anexo."""
+    boundary = f"==vrp_{uuid.uuid4().hex}"
+    headers = [
+        f"From: {from_email}",
+        f"To: {', '.join(recipients)}",
+        f"Subject: {Header(subject, 'utf-8').encode()}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: {make_msgid(domain='vrp.local')}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+    ]
+    out.write(("\r\n".join(headers) + "\r\n\r\n").encode("utf-8"))
+    out.write(
+        f"--{boundary}\r\n"
+        'Content-Type: text/plain; charset="utf-8"\r\n'
+        "Content-Transfer-Encoding: base64\r\n\r\n".encode("ascii")
+    )
+    out.write(base64.encodebytes(body.encode("utf-8")).replace(b"\n", b"\r\n"))
+    for unit in attachments:
+        if unit["kind"] == "file" and not Path(unit["path"]).is_file():
+            continue  # arquivo removido depois de planejado
+        _write_attachment(out, boundary, unit)
+    out.write(f"--{boundary}--\r\n".encode("ascii"))
+
+
+# ---------- envio SMTP a partir do arquivo ----------
+def _reset(smtp: smtplib.SMTP):
+    try:
+        smtp.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+def _abort(smtp: smtplib.SMTP, code: int):
+    """421 = servidor encerrando: fecha; demais recusas: RSET e a conexão segue utilizável."""
+    if code == 421:
+        smtp.close()
+    else:
+        _reset(smtp)
+
+
+def send_mime_file(smtp: smtplib.SMTP, from_email: str, recipients: List[str],
+                   fp: BinaryIO) -> Dict[str, Tuple[int, bytes]]:
+    """
+    Equivalente a smtp.sendmail(), com o DATA enviado em blocos a partir de `fp`
+    (linhas CRLF, ponto inicial duplicado). Devolve os destinatários recusados.
+    """
+    smtp.ehlo_or_helo_if_needed()
+    options = []
+    if smtp.does_esmtp and smtp.has_extn("size"):
+        fp.seek(0, os.SEEK_END)
+        options.append(f"size={fp.tell()}")
+    fp.seek(0)
+
+    code, resp = smtp.mail(from_email, options)
+    if code != 250:
+        _abort(smtp, code)
+        raise smtplib.SMTPSenderRefused(code, resp, from_email)
+    refused = {}
+    for rcpt in recipients:
+        code, resp = smtp.rcpt(rcpt)
+        if code not in (250, 251):
+            refused[rcpt] = (code, resp)
+        if code == 421:
+            smtp.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(recipients):
+        _reset(smtp)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    smtp.putcmd("data")
+    code, resp = smtp.getreply()
+    if code != 354:
+        _reset(smtp)
+        raise smtplib.SMTPDataError(code, resp)
+    buf = bytearray()
+    for line in fp:
+        if line.startswith(b"."):
+            buf += b"."
+        buf += line
+        if len(buf) >= SEND_CHUNK:
+            smtp.send(bytes(buf))
+            buf.clear()
+    if buf and not buf.endswith(b"\r\n"):
+        buf += b"\r\n"
+    buf += b".\r\n"
+    smtp.send(bytes(buf))
+    code, resp = smtp.getreply()
+    if code != 250:
+        _abort(smtp, code)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
@@ -0,0 +1,306 @@
+"""
+Fila de saída de emails (tabela 'email_outbox'):
+- enqueue_report_email(): a tela só registra a mensagem (checklist, destinatários, anexos);
+  anexos acima de EMAIL_MAX_MESSAGE_MB viram várias mensagens (uma linha por parte, email_attachments)
+- cada mensagem é gravada em arquivo temporário e enviada em blocos (sem cópia inteira na memória)
+- sender: thread que entrega as mensagens pendentes por uma única conexão SMTP autenticada,
+  reaproveitada entre mensagens (NOOP antes de reusar; reconecta se o servidor derrubar)
+- falha temporária (4xx, conexão/timeout) -> nova tentativa com espera exponencial;
+  falha permanente (5xx, autenticação) ou tentativas esgotadas -> 'failed' com o erro
+- outbox_for_checklist() / outbox_stats(): status por mensagem para as telas
+- CLI:
+    python -m backend.VRP_SERVICE.email_outbox send [--once]
+    python -m backend.VRP_SERVICE.email_outbox status
+
+Config via .env: as mesmas de email_service (EMAIL_SMTP_SERVER/PORT/SECURITY...),
+  EMAIL_OUTBOX_RETRIES (padrão 5), EMAIL_SMTP_IDLE_SECONDS (fecha a conexão ociosa, padrão 60)
+"""
+import json
+import logging
+import os
+import smtplib
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.VRP_DATABASE.database import connection, transaction
+from .email_attachments import plan_report_email, send_mime_file
+from .email_service import email_service
+
+log = logging.getLogger(__name__)
+
+OUTBOX_RETRIES = int(os.getenv("EMAIL_OUTBOX_RETRIES", "5"))
+SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "60"))
+SENDING_STALE_MINUTES = 15
+POLL_SECONDS = 2.0
+
+_wakeup = threading.Event()
+_stats = {"connections": 0, "sent": 0, "retried": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+# ---------- API para as telas ----------
+def enqueue_report_email(checklist_id: int, report_path: str, photos_paths: List[str],
+                         recipients: List[str]) -> List[int]:
+    """Planeja os anexos e enfileira uma mensagem por parte; devolve os ids na ordem."""
+    plan = plan_report_email(checklist_id, report_path, photos_paths)
+    ids = []
+    with transaction() as conn:
+        for part, attachments in enumerate(plan, 1):
+            ids.append(conn.execute(
+                """INSERT INTO email_outbox (checklist_id, recipients, report_path, photos, attachments,
+                                            part, parts, max_attempts)
+                   VALUES (?,?,?,?,?,?,?,?)""",
+                (checklist_id, json.dumps(recipients), report_path, json.dumps(photos_paths),
+                 json.dumps(attachments), part, len(plan), OUTBOX_RETRIES),
+            ).lastrowid)
+    _wakeup.set()
+    return ids
+
+
+def _decode(row) -> Dict[str, Any]:
+    item = dict(row)
+    item["recipients"] = json.loads(item["recipients"] or "[]")
+    item["photos"] = json.loads(item["photos"] or "[]")
+    item["attachments"] = json.loads(item["attachments"]) if item.get("attachments") else None
+    return item
+
+
+def get_outbox(outbox_id: int) -> Optional[Dict[str, Any]]:
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM email_outbox WHERE id=?", (outbox_id,)).fetchone()
+    return _decode(row) if row else None
+
+
+def outbox_for_checklist(checklist_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM email_outbox WHERE checklist_id=? ORDER BY id DESC LIMIT ?",
+            (checklist_id, limit),
+        ).fetchall()
+    return [_decode(r) for r in rows]
+
+
+def outbox_stats() -> Dict[str, int]:
+    with connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM email_outbox GROUP BY status").fetchall()
+    out = {"queued": 0, "sending": 0, "sent": 0, "failed": 0}
+    out.update({r["status"]: r["n"] for r in rows})
+    with _stats_lock:
+        out.update({f"smtp_{k}": v for k, v in _stats.items()})
+    return out
+
+
+# ---------- conexão SMTP reaproveitada ----------
+class SmtpSession:
+    """Uma conexão autenticada, aberta sob demanda e reaproveitada entre mensagens."""
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        self.close()
+        self._smtp = email_service.open_smtp()
+        _count("connections")
+        return self._smtp
+
+    def _get(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            return self._connect()
+        if time.monotonic() - self._last_used > 10:
+            # conexão parada há algum tempo: confirma que o servidor ainda a mantém
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            return self._connect()
+        return self._smtp
+
+    def send(self, from_email: str, recipients: List[str], fp) -> Dict[str, Any]:
+        """Envia a mensagem gravada em `fp`; reconecta uma vez se o servidor tiver fechado a conexão."""
+        try:
+            refused = send_mime_file(self._get(), from_email, recipients, fp)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            refused = send_mime_file(self._connect(), from_email, recipients, fp)
+        self._last_used = time.monotonic()
+        return refused
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self._last_used if self._smtp else 0.0
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    # só rede: arquivo de anexo apagado/sem permissão (FileNotFoundError etc.) falha na hora
+    return isinstance(exc, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                            socket.timeout, ConnectionError))
+
+
+# ---------- entrega ----------
+def _claim(limit: int) -> List[Dict[str, Any]]:
+    with transaction(immediate=True) as conn:
+        # 'sending' esquecido = processo caiu no meio do envio: volta à fila se ainda há tentativas
+        stale = (f"-{SENDING_STALE_MINUTES} minutes",)
+        conn.execute(
+            """UPDATE email_outbox SET status='failed', last_error='Envio interrompido (tentativas esgotadas)'
+                WHERE status='sending' AND attempts >= max_attempts AND claimed_at < datetime('now', ?)""",
+            stale,
+        )
+        conn.execute(
+            """UPDATE email_outbox SET status='queued'
+                WHERE status='sending' AND attempts < max_attempts AND claimed_at < datetime('now', ?)""",
+            stale,
+        )
+        rows = conn.execute(
+            """SELECT * FROM email_outbox
+                WHERE status='queued' AND next_attempt_at <= datetime('now')
+                ORDER BY id LIMIT ?""",
+            (limit,),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE email_outbox SET status='sending', claimed_at=datetime('now'), attempts=attempts+1 WHERE id=?",
+            [(r["id"],) for r in rows],
+        )
+    items = [_decode(r) for r in rows]
+    for item in items:
+        item["attempts"] += 1
+    return items
+
+
+def _mark(item: Dict[str, Any], error: Optional[BaseException] = None, refused: Optional[dict] = None):
+    with transaction() as conn:
+        if error is None:
+            conn.execute(
+                """UPDATE email_outbox SET status='sent', sent_at=datetime('now'), last_error=NULL,
+                                          smtp_response=? WHERE id=?""",
+                # recusados parciais: {destinatário: código SMTP}
+                (json.dumps({k: c for k, (c, _) in refused.items()}) if refused else "ok", item["id"]),
+            )
+            _count("sent")
+        elif _is_transient(error) and item["attempts"] < item["max_attempts"]:
+            delay = 30 * 2 ** (item["attempts"] - 1)
+            conn.execute(
+                """UPDATE email_outbox SET status='queued', last_error=?,
+                                          next_attempt_at=datetime('now', ?) WHERE id=?""",
+                (f"{type(error).__name__}: {error}", f"+{delay} seconds", item["id"]),
+            )
+            _count("retried")
+        else:
+            conn.execute(
+                "UPDATE email_outbox SET status='failed', last_error=? WHERE id=?",
+                (f"{type(error).__name__}: {error}", item["id"]),
+            )
+            _count("failed")
+
+
+def deliver_due(session: SmtpSession, limit: int = 20) -> int:
+    """Entrega as mensagens vencidas pela mesma conexão; devolve quantas processou."""
+    items = _claim(limit)
+    for item in items:
+        try:
+            if item["attachments"] is None:
+                # linha anterior ao planejamento: tudo numa mensagem, como antes
+                plan = plan_report_email(item["checklist_id"], item["report_path"] or "", item["photos"])
+                item["attachments"] = [unit for message in plan for unit in message]
+            with tempfile.TemporaryFile() as fp:
+                email_service.write_report_message(
+                    fp, item["checklist_id"], item["attachments"], item["recipients"],
+                    item["part"] or 1, item["parts"] or 1,
+                )
+                refused = session.send(email_service.from_address(), item["recipients"], fp)
+        except Exception as e:
+            log.warning("Email %s falhou (tentativa %d): %s", item["id"], item["attempts"], e)
+            if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                session.close()  # erro de conexão: estado incerto (recusa SMTP já faz RSET)
+            _mark(item, error=e)
+        else:
+            _mark(item, refused=refused)
+    return len(items)
+
+
+def _sender_loop(stop: threading.Event):
+    session = SmtpSession()
+    try:
+        while not stop.is_set():
+            try:
+                if deliver_due(session):
+                    continue
+            except Exception:
+                log.exception("Erro no envio de emails")
+            if session.idle_for() > SMTP_IDLE_SECONDS:
+                session.close()
+            _wakeup.wait(POLL_SECONDS)
+            _wakeup.clear()
+    finally:
+        session.close()
+
+
+_sender: Optional[threading.Thread] = None
+_stop = threading.Event()
+_start_lock = threading.Lock()
+
+
+def start_sender() -> bool:
+    """Inicia a thread de envio deste processo uma única vez."""
+    global _sender
+    with _start_lock:
+        if _sender is None or not _sender.is_alive():
+            _sender = threading.Thread(target=_sender_loop, args=(_stop,), name="vrp-email-sender", daemon=True)
+            _sender.start()
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+    from backend.VRP_DATABASE.database import init_db
+
+    parser = argparse.ArgumentParser(description="Fila de saída de emails VRP.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    snd = sub.add_parser("send", help="entrega a fila (contínuo; --once para uma passada)")
+    snd.add_argument("--once", action="store_true")
+    sub.add_parser("status", help="contagem por status")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    init_db()
+    if args.cmd == "status":
+        print(outbox_stats())
+    elif args.once:
+        s = SmtpSession()
+        try:
+            total = 0
+            while (n := deliver_due(s)):
+                total += n
+        finally:
+            s.close()
+        print(f"{total} mensagem(ns) processada(s): {outbox_stats()}")
+    else:
+        start_sender()
+        print("Envio de emails ativo. Ctrl+C para encerrar.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            _stop.set()
@@ -1,20 +1,21 @@
 """
 Serviço de email para envio de relatórios VRP.
 Gerencia configurações de email e envio de relatórios com anexos.
+Envio em produção pela fila 'email_outbox' (email_outbox.py), que reaproveita a conexão SMTP.
+Anexos planejados e gravados em blocos por email_attachments.py (limite EMAIL_MAX_MESSAGE_MB).
 """
+import logging
 import os
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email.mime.image import MIMEImage
-from email import encoders
-from pathlib import Path
-from typing import List, Optional
+import tempfile
+from typing import BinaryIO, List, Optional, Tuple
 import streamlit as st
 
+from .email_attachments import plan_report_email, send_mime_file, write_mime
 from .export_paths import EXPORTS_DIR, UPLOADS_DIR
 
+log = logging.getLogger(__name__)
+
 class EmailService:
     def __init__(self):
         # Não carregar variáveis no __init__, carregar dinamicamente
@@ -25,10 +26,14 @@ class EmailService:
         from dotenv import load_dotenv
         load_dotenv()
         
+        # EMAIL_SMTP_SECURITY: starttls (Gmail, padrão) | ssl (porta 465) | none (servidor local de testes)
+        security = os.getenv("EMAIL_SMTP_SECURITY", "starttls").strip().lower()
         return {
             'host': os.getenv("EMAIL_SMTP_SERVER", "smtp.gmail.com"),
             'port': int(os.getenv("EMAIL_SMTP_PORT", "587")),
-            'use_tls': True,  # Sempre usar TLS para Gmail
+            'security': security,
+            'use_tls': security in ("starttls", "ssl"),
+            'timeout': float(os.getenv("EMAIL_SMTP_TIMEOUT", "30")),
             'user': os.getenv("EMAIL_ADDRESS", ""),
             'password': os.getenv("EMAIL_PASSWORD", ""),
             'from_email': os.getenv("GESTOR_EMAIL", "")
@@ -37,7 +42,30 @@ class EmailService:
     def is_configured(self) -> bool:
         """Verifica se as configurações de email estão completas."""
         config = self._get_config()
+        if config['security'] == "none":
+            return bool(config['from_email'])
         return all([config['user'], config['password'], config['from_email']])
+
+    def from_address(self) -> str:
+        """Remetente das mensagens (GESTOR_EMAIL)."""
+        return self._get_config()['from_email']
+
+    def open_smtp(self, config: Optional[dict] = None) -> smtplib.SMTP:
+        """Abre a conexão SMTP (TLS e login conforme a configuração)."""
+        config = config or self._get_config()
+        if config['security'] == "ssl":
+            server = smtplib.SMTP_SSL(config['host'], config['port'], timeout=config['timeout'])
+        else:
+            server = smtplib.SMTP(config['host'], config['port'], timeout=config['timeout'])
+        try:
+            if config['security'] == "starttls":
+                server.starttls()
+            if config['user'] and config['password']:
+                server.login(config['user'], config['password'])
+        except Exception:
+            server.close()
+            raise
+        return server
     
     def get_emails_from_session(self) -> List[str]:
         """Obtém lista de emails da sessão do Streamlit."""
@@ -63,10 +91,40 @@ class EmailService:
             return True
         return False
     
+    def report_message_text(self, checklist_id: int, part: int = 1, parts: int = 1) -> Tuple[str, str]:
+        """Assunto e corpo do email do relatório (parte k de n quando os anexos foram divididos)."""
+        subject = f"Relatório VRP - Checklist #{checklist_id}"
+        if parts > 1:
+            subject += f" (parte {part}/{parts})"
+        if part > 1:
+            intro = f"Continuação dos anexos do Checklist #{checklist_id} (parte {part} de {parts})."
+        else:
+            intro = f"Segue em anexo o relatório técnico do Checklist #{checklist_id}."
+            if parts > 1:
+                intro += f" Os anexos foram divididos em {parts} emails."
+        body = f"""
+        Prezados,
+        
+        {intro}
+        
+        Este relatório foi gerado automaticamente pelo sistema VRP da NOVAES Engenharia.
+        
+        Atenciosamente,
+        Sistema VRP
+        """
+        return subject, body
+
+    def write_report_message(self, out: BinaryIO, checklist_id: int, attachments: List[dict],
+                             recipients: List[str], part: int = 1, parts: int = 1):
+        """Grava a mensagem do relatório em `out` (anexos lidos do disco em blocos)."""
+        subject, body = self.report_message_text(checklist_id, part, parts)
+        write_mime(out, self.from_address(), recipients, subject, body, attachments)
+
     def send_report_email(self, checklist_id: int, report_path: str, 
                          photos_paths: List[str], recipients: List[str]) -> bool:
         """
-        Envia relatório por email com anexos.
+        Envia relatório por email com anexos, na hora (teste de configuração).
+        Envios normais passam pela fila: email_outbox.enqueue_report_email().
         
         Args:
             checklist_id: ID do checklist
@@ -86,64 +144,13 @@ class EmailService:
             return False
             
         try:
-            config = self._get_config()
-            
-            # Criar mensagem
-            msg = MIMEMultipart()
-            msg['From'] = config['from_email']
-            msg['To'] = ", ".join(recipients)
-            msg['Subject'] = f"Relatório VRP - Checklist #{checklist_id}"
-            
-            # Corpo do email
-            body = f"""
-            Prezados,
-            
-            Segue em anexo o relatório técnico do Checklist #{checklist_id}.
-            
-            Este relatório foi gerado automaticamente pelo sistema VRP da NOVAES Engenharia.
-            
-            Atenciosamente,
-            Sistema VRP
-            """
-            
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            # Anexar relatório
-            if Path(report_path).exists():
-                with open(report_path, "rb") as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                
-                encoders.encode_base64(part)
-                filename = Path(report_path).name
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {filename}'
-                )
-                msg.attach(part)
-            
-            # Anexar fotos
-            for photo_path in photos_paths:
-                if Path(photo_path).exists():
-                    try:
-                        with open(photo_path, "rb") as img:
-                            img_part = MIMEImage(img.read())
-                            filename = Path(photo_path).name
-                            img_part.add_header(
-                                'Content-Disposition',
-                                f'attachment; filename= {filename}'
-                            )
-                            msg.attach(img_part)
-                    except Exception as e:
-                        st.warning(f"Erro ao anexar foto {filename}: {e}")
-            
-            # Enviar email
-            with smtplib.SMTP(config['host'], config['port']) as server:
-                if config['use_tls']:
-                    server.starttls()
-                server.login(config['user'], config['password'])
-                server.send_message(msg)
-            
+            plan = plan_report_email(checklist_id, report_path, photos_paths)
+            from_email = self.from_address()
+            with self.open_smtp() as server:
+                for part, attachments in enumerate(plan, 1):
+                    with tempfile.TemporaryFile() as fp:
+                        self.write_report_message(fp, checklist_id, attachments, recipients, part, len(plan))
+                        send_mime_file(server, from_email, recipients, fp)
             return True
             
         except Exception as e:
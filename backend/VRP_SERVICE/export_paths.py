@@ -2,10 +2,13 @@
 """
 Centraliza e cria (se necessário) os diretórios de trabalho.
 Usado por toda a aplicação para evitar 'caminhos mágicos' espalhados.
+Variável de ambiente VRP_ROOT troca a raiz (ex.: perfil de partida em pasta temporária);
+é lida na importação, antes do load_dotenv do main_app.
 """
+import os
 from pathlib import Path
 
-ROOT = Path(r"C:\Users\Novaes Engenharia\github - deploy\VRP").resolve()
+ROOT = Path(os.getenv("VRP_ROOT") or r"C:\Users\Novaes Engenharia\github - deploy\VRP").resolve()
 
 BACKEND = ROOT / "backend"
 FRONTEND = ROOT / "frontend"
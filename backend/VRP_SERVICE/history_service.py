@@ -1,18 +1,26 @@
 # file: C:\Users\Novaes Engenharia\github - deploy\VRP\backend\VRP_SERVICE\history_service.py
 """
 Exclusão orquestrada de um checklist:
-- Remove arquivos das fotos e exports (DOCX/PDF)
+- Remove fotos (arquivos só quando sem outras referências) e exports (DOCX/PDF)
 - Remove pasta CK_{checklist} e, se ficar vazia, limpa VRP_{site}
 - Exclui registro do checklist (CASCADE remove photos/reports no DB)
+- Arquivos e pastas só são apagados depois do COMMIT (ROLLBACK não deixa linhas sem arquivo)
 - Opcional: exclui a VRP se ficar órfã (sem outros checklists)
+
+Listagem do Histórico (list_checklists): paginação por chave (date, id) decrescente —
+cada página continua após o último item da anterior, sem OFFSET — e filtros no SQL
+(período, VRP, tipo de serviço, município), com os índices da migração 16; páginas e totais
+reaproveitados pelo read_cache até a próxima escrita em checklists/vrp_sites.
 """
 
 from pathlib import Path
 import shutil
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
-from backend.VRP_DATABASE.database import get_conn
+from backend.VRP_DATABASE.database import connection, transaction
 from .export_paths import UPLOADS_DIR, EXPORTS_DIR
+from .read_cache import cached
+from .storage_service import delete_photo_rows, unlink_photo_files
 
 def _safe_unlink(path_str: str) -> bool:
     try:
@@ -33,6 +41,69 @@ def _rmtree_if_exists(p: Path) -> bool:
         pass
     return False
 
+Cursor = Tuple[str, int]  # (date, id) do último item da página
+
+
+def _history_where(filters: Optional[Dict[str, Any]]) -> Tuple[str, list]:
+    f = filters or {}
+    clauses, params = [], []
+    if f.get("date_from"):
+        clauses.append("c.date >= ?")
+        params.append(f["date_from"])
+    if f.get("date_to"):
+        clauses.append("c.date <= ?")
+        params.append(f["date_to"])
+    if f.get("vrp_site_id"):
+        clauses.append("c.vrp_site_id = ?")
+        params.append(f["vrp_site_id"])
+    if f.get("service_type"):
+        clauses.append("c.service_type = ?")
+        params.append(f["service_type"])
+    if f.get("municipality"):
+        clauses.append("vs.municipality = ?")
+        params.append(f["municipality"])
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+@cached("checklists", "vrp_sites")
+def list_checklists(filters: Optional[Dict[str, Any]] = None, after: Optional[Cursor] = None,
+                    page_size: int = 25) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """
+    Uma página do histórico (mais recentes primeiro) após o cursor `after`.
+    Devolve (linhas, cursor da próxima página ou None se for a última).
+    """
+    where, params = _history_where(filters)
+    if after is not None:
+        # valor de linha: o SQLite faz SEARCH no índice (date, id); com OR varreria as linhas mais novas
+        where += (" AND " if where else " WHERE ") + "(c.date, c.id) < (?, ?)"
+        params += [after[0], after[1]]
+    with connection() as conn:
+        rows = conn.execute(
+            f"""SELECT c.id, c.date, c.service_type, c.vrp_site_id,
+                       vs.municipality, vs.city, vs.place, vs.brand, vs.dn
+                  FROM checklists c
+                  LEFT JOIN vrp_sites vs ON vs.id = c.vrp_site_id
+                  {where}
+                 ORDER BY c.date DESC, c.id DESC
+                 LIMIT ?""",
+            params + [page_size + 1],
+        ).fetchall()
+    rows = [dict(r) for r in rows]
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return rows, ((rows[-1]["date"], rows[-1]["id"]) if has_more else None)
+
+
+@cached("checklists", "vrp_sites")
+def count_checklists(filters: Optional[Dict[str, Any]] = None) -> int:
+    where, params = _history_where(filters)
+    with connection() as conn:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM checklists c LEFT JOIN vrp_sites vs ON vs.id = c.vrp_site_id{where}",
+            params,
+        ).fetchone()[0]
+
+
 def delete_checklist(checklist_id: int, delete_vrp_if_orphan: bool = False) -> Dict[str, Any]:
     """
     Exclui um checklist e seus artefatos.
@@ -49,64 +120,51 @@ def delete_checklist(checklist_id: int, delete_vrp_if_orphan: bool = False) -> D
         "reason": "",
     }
 
-    conn = get_conn()
-    ck = conn.execute(
-        "SELECT id, vrp_site_id FROM checklists WHERE id=?", (checklist_id,)
-    ).fetchone()
-
-    if not ck:
-        summary["reason"] = "Checklist não encontrado"
-        conn.close()
-        return summary
-
-    vrp_site_id = ck["vrp_site_id"]
-
-    # 1) Coletar e remover arquivos de fotos
-    photos = conn.execute(
-        "SELECT file_path FROM photos WHERE checklist_id=?", (checklist_id,)
-    ).fetchall()
-    for row in photos:
-        if row and row["file_path"]:
-            if _safe_unlink(row["file_path"]):
-                summary["files_deleted"] += 1
-
-    # 2) Remover arquivos de exports (DOCX/PDF) e pasta de exports do checklist
-    rep = conn.execute(
-        "SELECT docx_path, pdf_path FROM reports WHERE checklist_id=?", (checklist_id,)
-    ).fetchone()
-    if rep:
-        if rep["docx_path"]:
-            _safe_unlink(rep["docx_path"])
-        if rep["pdf_path"]:
-            _safe_unlink(rep["pdf_path"])
-
-    ck_export_dir = EXPORTS_DIR / f"{checklist_id}"
-    summary["exports_deleted"] = _rmtree_if_exists(ck_export_dir)
-
-    # 3) Remover pasta CK específica dentro da VRP
-    ck_upload_dir = UPLOADS_DIR / f"VRP_{vrp_site_id}" / f"CK_{checklist_id}"
-    summary["ck_folder_deleted"] = _rmtree_if_exists(ck_upload_dir)
-
-    # 4) Excluir checklist (CASCADE remove photos/reports no DB)
-    conn.execute("DELETE FROM checklists WHERE id=?", (checklist_id,))
-    conn.commit()
-
-    # 5) Se solicitado, excluir VRP se ficou órfã (sem outros checklists)
-    if delete_vrp_if_orphan and vrp_site_id:
-        other = conn.execute(
-            "SELECT COUNT(*) AS n FROM checklists WHERE vrp_site_id=?", (vrp_site_id,)
+    with transaction(immediate=True) as conn:
+        ck = conn.execute(
+            "SELECT id, vrp_site_id FROM checklists WHERE id=?", (checklist_id,)
         ).fetchone()
-        if other and other["n"] == 0:
-            # Remover possível pasta da VRP (se vazia)
-            vrp_dir = UPLOADS_DIR / f"VRP_{vrp_site_id}"
-            # Se ainda tiver alguma subpasta residual, rmtree; é seguro pois está sob UPLOADS_DIR
-            summary["vrp_folder_deleted"] = _rmtree_if_exists(vrp_dir)
-
-            # Remover a VRP do banco
-            conn.execute("DELETE FROM vrp_sites WHERE id=?", (vrp_site_id,))
-            conn.commit()
-            summary["vrp_deleted"] = True
-
-    conn.close()
+
+        if not ck:
+            summary["reason"] = "Checklist não encontrado"
+            return summary
+
+        vrp_site_id = ck["vrp_site_id"]
+
+        # 1) Excluir fotos; arquivos compartilhados com outros checklists permanecem
+        photos = conn.execute(
+            "SELECT id FROM photos WHERE checklist_id=?", (checklist_id,)
+        ).fetchall()
+        photo_files = delete_photo_rows(conn, [row["id"] for row in photos])
+
+        # 2) Exports (DOCX/PDF) do checklist: caminhos anotados para depois do COMMIT
+        rep = conn.execute(
+            "SELECT docx_path, pdf_path FROM reports WHERE checklist_id=?", (checklist_id,)
+        ).fetchone()
+        export_files = [p for p in (rep["docx_path"], rep["pdf_path"]) if p] if rep else []
+
+        # 3) Excluir checklist (CASCADE remove photos/reports no DB)
+        conn.execute("DELETE FROM checklists WHERE id=?", (checklist_id,))
+
+        # 4) Se solicitado, excluir VRP se ficou órfã (sem outros checklists)
+        if delete_vrp_if_orphan and vrp_site_id:
+            other = conn.execute(
+                "SELECT COUNT(*) AS n FROM checklists WHERE vrp_site_id=?", (vrp_site_id,)
+            ).fetchone()
+            if other and other["n"] == 0:
+                conn.execute("DELETE FROM vrp_sites WHERE id=?", (vrp_site_id,))
+                summary["vrp_deleted"] = True
+
+    # 5) Disco, já com a transação confirmada
+    summary["files_deleted"] = unlink_photo_files(photo_files)
+    for path in export_files:
+        _safe_unlink(path)
+    summary["exports_deleted"] = _rmtree_if_exists(EXPORTS_DIR / f"{checklist_id}")
+    # pasta CK específica dentro da VRP (fotos antigas)
+    summary["ck_folder_deleted"] = _rmtree_if_exists(UPLOADS_DIR / f"VRP_{vrp_site_id}" / f"CK_{checklist_id}")
+    if summary["vrp_deleted"]:
+        # possível pasta residual da VRP; seguro pois está sob UPLOADS_DIR
+        summary["vrp_folder_deleted"] = _rmtree_if_exists(UPLOADS_DIR / f"VRP_{vrp_site_id}")
+
     summary["ok"] = True
     return summary
@@ -0,0 +1,174 @@
+"""
+Decodificação limitada e derivados das fotos enviadas:
+- open_bounded(): decodifica já reduzida (draft JPEG; reduce() nos demais formatos) até max_side,
+  aplica orientação EXIF e respeita orçamento de pixels/memória (conferido aqui; o limite
+  global do PIL fica como está); no máximo MAX_CONCURRENT_DECODES ao mesmo tempo
+- DERIVATIVE_SPECS: thumb (galerias), medium (prévia), report (DOCX, na resolução de impressão)
+- report_variant_size(): menor tamanho que cobre o quadro da figura (REPORT_FRAME_CM) a REPORT_DPI
+- derivative_path(): arquivo do derivado ao lado do original (_derivados/)
+- make_derivatives(): gera os derivados a partir do arquivo salvo
+
+Limites via .env:
+  VRP_PHOTO_MAX_SIDE (px, maior lado armazenado), VRP_PHOTO_MAX_PIXELS (pixels do arquivo de origem),
+  VRP_PHOTO_MAX_DECODE_MB (buffer decodificado por imagem), VRP_PHOTO_DECODE_SLOTS (decodificações simultâneas),
+  VRP_REPORT_DPI (resolução das figuras no relatório)
+"""
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional, Union
+
+from PIL import Image, ImageOps
+
+MAX_INGEST_SIDE = int(os.getenv("VRP_PHOTO_MAX_SIDE", "3072"))
+MAX_SOURCE_PIXELS = int(os.getenv("VRP_PHOTO_MAX_PIXELS", "120000000"))
+MAX_DECODE_BYTES = int(os.getenv("VRP_PHOTO_MAX_DECODE_MB", "128")) * 1024 * 1024
+MAX_CONCURRENT_DECODES = int(os.getenv("VRP_PHOTO_DECODE_SLOTS", "2"))
+
+REPORT_DPI = int(os.getenv("VRP_REPORT_DPI", "200"))
+REPORT_FRAME_CM = (7.5, 10.0)  # largura x altura das figuras em build_docx
+
+_decode_slots = threading.BoundedSemaphore(MAX_CONCURRENT_DECODES)
+
+def report_frame_px(dpi: int = REPORT_DPI) -> tuple[int, int]:
+    return tuple(round(cm / 2.54 * dpi) for cm in REPORT_FRAME_CM)
+
+# kind -> (maior lado em px, qualidade JPEG)
+# "report" não é limitado pelo maior lado: é redimensionado por report_variant_size();
+# o valor é só o teto de decodificação (cobre fotos 4:3/16:9 em qualquer orientação)
+DERIVATIVE_SPECS: Dict[str, tuple[int, int]] = {
+    "thumb":  (480, 75),
+    "medium": (1280, 82),
+    "report": (2 * max(report_frame_px()), 85),
+}
+SCREEN_KINDS = ("thumb", "medium")
+DERIVATIVES_DIRNAME = "_derivados"
+
+
+def report_variant_size(size: tuple[int, int]) -> tuple[int, int]:
+    """Menor tamanho (mesma proporção) que cobre o quadro de impressão nos dois eixos; nunca amplia."""
+    fw, fh = report_frame_px()
+    w, h = size
+    scale = min(1.0, max(fw / w, fh / h))
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+class ImageBudgetError(ValueError):
+    """Imagem acima do orçamento de pixels/memória configurado."""
+
+
+def _fit(size: tuple[int, int], max_side: int) -> tuple[int, int]:
+    w, h = size
+    scale = min(1.0, max_side / max(w, h))
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+def _reduce_factor(size: tuple[int, int], max_side: int) -> int:
+    """Fator inteiro para reduce(): sobra ~2x max_side (como reducing_gap do thumbnail)."""
+    return max(1, int(max(size) / (2 * max_side)))
+
+
+def _decoded_bands(im: Image.Image) -> int:
+    """Bandas do buffer que a decodificação aloca (paleta/bitmap viram RGB/RGBA antes do reduce)."""
+    if im.mode in ("1", "P"):
+        return 4 if "transparency" in im.info else 3
+    return len(im.getbands())
+
+
+def _check_decode(w: int, h: int, bands: int):
+    if w * h * bands > MAX_DECODE_BYTES:
+        raise ImageBudgetError(f"Decodificar {w}x{h} px excede {MAX_DECODE_BYTES // (1024 * 1024)} MB")
+
+
+def open_bounded(src: Union[str, Path, BinaryIO], max_side: int = MAX_INGEST_SIDE) -> Image.Image:
+    """
+    Abre e decodifica uma imagem em RGB com no máximo max_side px no maior lado.
+    - JPEG: draft() decodifica direto em 1/2, 1/4 ou 1/8 (não aloca o buffer cheio)
+    - PNG/WebP/etc.: sem decodificação reduzida; o buffer cheio é conferido com
+      MAX_DECODE_BYTES pelo cabeçalho, antes de decodificar, e só então reduce()
+    - orientação EXIF aplicada (fotos de celular)
+    - ImageBudgetError se a origem ou o buffer decodificado passar dos limites
+    """
+    with _decode_slots:
+        try:
+            im = Image.open(src)  # lê só o cabeçalho
+        except Image.DecompressionBombError as e:  # acima de 2x o limite padrão do PIL
+            raise ImageBudgetError(str(e)) from e
+        w, h = im.size
+        if w * h > MAX_SOURCE_PIXELS:
+            raise ImageBudgetError(f"Imagem com {w}x{h} px acima do limite de {MAX_SOURCE_PIXELS} px")
+        if im.format in ("JPEG", "MPO"):
+            # reduz já na decodificação
+            im.draft("RGB", _fit(im.size, max_side))
+        else:
+            # reduce()/load() decodificam a imagem inteira: recusa antes de alocar
+            _check_decode(w, h, _decoded_bands(im))
+            factor = _reduce_factor(im.size, max_side)
+            if factor > 1:
+                if im.mode in ("1", "P"):  # reduce() não trabalha com paleta/bitmap
+                    im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+                im = im.reduce(factor)
+        _check_decode(im.width, im.height, len(im.getbands()))  # JPEG: tamanho já do draft
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        im.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=2.0)
+        return im
+
+
+def report_variant_matches(src: Path, width: int, height: int) -> bool:
+    """A variante (width x height) corresponde ao DPI atual? Lê só o cabeçalho do original."""
+    try:
+        with Image.open(src) as im:
+            ew, eh = report_variant_size(im.size)
+    except Exception:
+        return False
+    # tolerância de arredondamento (draft/thumbnail antes do redimensionamento final)
+    return abs(ew - (width or 0)) <= 2 and abs(eh - (height or 0)) <= 2
+
+
+def derivative_path(src: Path, kind: str) -> Path:
+    src = Path(src)
+    return src.parent / DERIVATIVES_DIRNAME / f"{src.stem}_{kind}.jpg"
+
+
+def make_derivatives(
+    src: Path,
+    kinds: Optional[Iterable[str]] = None,
+    image: Optional[Image.Image] = None,
+) -> Dict[str, Dict]:
+    """
+    Gera os derivados pedidos (todos por padrão) a partir de src.
+    image: src já decodificada (evita decodificar o arquivo de novo).
+    Retorna {kind: {"file_path", "width", "height", "bytes"}}.
+    """
+    src = Path(src)
+    kinds = [k for k in (kinds or DERIVATIVE_SPECS) if k in DERIVATIVE_SPECS]
+    if not kinds:
+        return {}
+    # do maior para o menor: cada derivado parte do anterior (menos pixels para reamostrar)
+    kinds.sort(key=lambda k: DERIVATIVE_SPECS[k][0], reverse=True)
+    out: Dict[str, Dict] = {}
+    if image is not None:
+        current = image.copy()
+    else:
+        with open(src, "rb") as fh:
+            current = open_bounded(fh, DERIVATIVE_SPECS[kinds[0]][0])
+    for kind in kinds:
+        max_side, quality = DERIVATIVE_SPECS[kind]
+        if kind == "report":
+            target = report_variant_size(current.size)
+            variant = current if target == current.size else current.resize(target, Image.LANCZOS)
+        else:
+            current.thumbnail((max_side, max_side), Image.LANCZOS)
+            variant = current
+        dst = derivative_path(src, kind)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        variant.save(dst, "JPEG", quality=quality, optimize=True, progressive=True)
+        out[kind] = {
+            "file_path": str(dst),
+            "width": variant.width,
+            "height": variant.height,
+            "bytes": dst.stat().st_size,
+        }
+    return out
@@ -0,0 +1,295 @@
+"""
+Fila de tarefas em segundo plano (tabela 'jobs'), para não travar a sessão do Streamlit:
+- submit(): enfileira (mesma tarefa já na fila/em execução -> devolve o job existente)
+- get_job() / latest_job(): status, progresso e resultado para a tela consultar
+- workers: threads que pegam tarefas com BEGIN IMMEDIATE (vários processos podem
+  consumir a mesma fila); falha -> nova tentativa com espera exponencial até max_attempts;
+  job 'running' sem heartbeat há JOB_STALE_SECONDS volta para a fila (processo caiu)
+- tarefas: 'ai_summary', 'report', 'email_report' (registro via @handler)
+- start_workers(): threads no próprio processo do app (idempotente)
+- CLI (worker dedicado):
+    python -m backend.VRP_SERVICE.job_service worker --threads 2
+
+Config via .env:
+  VRP_JOB_THREADS (threads no app, padrão 2; 0 = só worker dedicado),
+  VRP_JOB_STALE_SECONDS (padrão 600)
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.VRP_DATABASE.database import connection, transaction
+
+log = logging.getLogger(__name__)
+
+JOB_THREADS = int(os.getenv("VRP_JOB_THREADS", "2"))
+JOB_STALE_SECONDS = int(os.getenv("VRP_JOB_STALE_SECONDS", "600"))
+POLL_SECONDS = 1.0
+
+_handlers: Dict[str, Callable[["JobContext", Dict[str, Any]], Any]] = {}
+_wakeup = threading.Event()
+
+
+def handler(kind: str):
+    """Registra a função que executa as tarefas do tipo `kind`."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+class JobContext:
+    """Passado ao handler: progresso e heartbeat do job."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def progress(self, fraction: float, message: str = ""):
+        with transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress=?, message=?, heartbeat_at=datetime('now') WHERE id=?",
+                (max(0.0, min(1.0, fraction)), message, self.job_id),
+            )
+
+
+# ---------- API para as telas ----------
+def submit(kind: str, payload: Dict[str, Any], max_attempts: int = 3) -> int:
+    """Enfileira a tarefa; se idêntica já estiver na fila/em execução, devolve o mesmo id."""
+    if kind not in _handlers:
+        raise ValueError(f"Tipo de tarefa desconhecido: {kind}")
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    with transaction(immediate=True) as conn:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE kind=? AND payload=? AND status IN ('queued','running')",
+            (kind, raw),
+        ).fetchone()
+        if row:
+            return row["id"]
+        job_id = conn.execute(
+            "INSERT INTO jobs (kind, payload, max_attempts, message) VALUES (?,?,?,?)",
+            (kind, raw, max_attempts, "Na fila"),
+        ).lastrowid
+    _wakeup.set()
+    return job_id
+
+
+def _decode(row) -> Optional[Dict[str, Any]]:
+    if not row:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    with connection() as conn:
+        return _decode(conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+
+def latest_job(kind: str, checklist_id: int) -> Optional[Dict[str, Any]]:
+    """Último job do tipo para o checklist (a tela reencontra o job após recarregar a página)."""
+    with connection() as conn:
+        return _decode(conn.execute(
+            """SELECT * FROM jobs WHERE kind=? AND json_extract(payload, '$.checklist_id')=?
+               ORDER BY id DESC LIMIT 1""",
+            (kind, checklist_id),
+        ).fetchone())
+
+
+def queue_stats() -> Dict[str, int]:
+    with connection() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+    stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+    stats.update({r["status"]: r["n"] for r in rows})
+    return stats
+
+
+# ---------- worker ----------
+def _requeue_stale(conn):
+    """Tarefas sem heartbeat: voltam à fila se ainda há tentativas; senão falham (como em _finish)."""
+    stale = (f"-{JOB_STALE_SECONDS} seconds",)
+    conn.execute(
+        """UPDATE jobs SET status='failed', error='Worker interrompido durante a execução',
+                          message='Falhou', worker=NULL, finished_at=datetime('now')
+            WHERE status='running' AND attempts >= max_attempts
+              AND COALESCE(heartbeat_at, started_at) < datetime('now', ?)""",
+        stale,
+    )
+    conn.execute(
+        """UPDATE jobs SET status='queued', message='Reenfileirado (worker interrompido)', worker=NULL
+            WHERE status='running' AND attempts < max_attempts
+              AND COALESCE(heartbeat_at, started_at) < datetime('now', ?)""",
+        stale,
+    )
+
+
+def _claim(worker: str) -> Optional[Dict[str, Any]]:
+    kinds = list(_handlers)
+    marks = ",".join("?" * len(kinds))
+    with transaction(immediate=True) as conn:
+        _requeue_stale(conn)
+        row = conn.execute(
+            f"""SELECT * FROM jobs
+                 WHERE status='queued' AND run_after <= datetime('now') AND kind IN ({marks})
+                 ORDER BY id LIMIT 1""",
+            kinds,
+        ).fetchone()
+        if not row:
+            return None
+        conn.execute(
+            """UPDATE jobs SET status='running', worker=?, attempts=attempts+1, progress=0,
+                              message='Em execução', error=NULL,
+                              started_at=datetime('now'), heartbeat_at=datetime('now')
+                WHERE id=?""",
+            (worker, row["id"]),
+        )
+    job = _decode(row)
+    job["attempts"] += 1
+    return job
+
+
+def _finish(job: Dict[str, Any], result: Any = None, error: Optional[str] = None):
+    with transaction() as conn:
+        if error is None:
+            conn.execute(
+                """UPDATE jobs SET status='done', progress=1, message='Concluído', result=?,
+                                  finished_at=datetime('now') WHERE id=?""",
+                (json.dumps(result, ensure_ascii=False, default=str), job["id"]),
+            )
+        elif job["attempts"] < job["max_attempts"]:
+            delay = 5 * 2 ** (job["attempts"] - 1)
+            conn.execute(
+                """UPDATE jobs SET status='queued', error=?, message=?, worker=NULL,
+                                  run_after=datetime('now', ?) WHERE id=?""",
+                (error, f"Falhou; nova tentativa em {delay}s", f"+{delay} seconds", job["id"]),
+            )
+        else:
+            conn.execute(
+                """UPDATE jobs SET status='failed', error=?, message='Falhou',
+                                  finished_at=datetime('now') WHERE id=?""",
+                (error, job["id"]),
+            )
+
+
+def run_one(worker: str = "main") -> bool:
+    """Executa a próxima tarefa disponível; False se a fila estiver vazia."""
+    job = _claim(worker)
+    if not job:
+        return False
+    try:
+        result = _handlers[job["kind"]](JobContext(job["id"]), job["payload"])
+    except Exception as e:
+        log.exception("Job %s (%s) falhou", job["id"], job["kind"])
+        _finish(job, error=f"{type(e).__name__}: {e}")
+    else:
+        _finish(job, result=result)
+    return True
+
+
+def _worker_loop(name: str, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            if run_one(name):
+                continue
+        except Exception:
+            log.exception("Erro no worker %s", name)
+        _wakeup.wait(POLL_SECONDS)
+        _wakeup.clear()
+
+
+_started: List[threading.Thread] = []
+_stop = threading.Event()
+_start_lock = threading.Lock()
+
+
+def start_workers(threads: int = JOB_THREADS) -> int:
+    """Inicia as threads de worker deste processo uma única vez (reruns do Streamlit não duplicam)."""
+    with _start_lock:
+        if not _started:
+            prefix = f"{socket.gethostname()}:{os.getpid()}"
+            for i in range(threads):
+                t = threading.Thread(target=_worker_loop, args=(f"{prefix}:{i}", _stop),
+                                     name=f"vrp-job-{i}", daemon=True)
+                t.start()
+                _started.append(t)
+        return len(_started)
+
+
+# ---------- tarefas ----------
+def _saved_ai_text(checklist_id: int) -> Optional[str]:
+    with connection() as conn:
+        row = conn.execute("SELECT ai_summary FROM reports WHERE checklist_id=?", (checklist_id,)).fetchone()
+    return row["ai_summary"] if row and row["ai_summary"] else None
+
+
+@handler("ai_summary")
+def _job_ai_summary(ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+    from .ai_service import generate_ai_summary, save_ai_summary
+    cid = payload["checklist_id"]
+    ctx.progress(0.1, "Gerando narrativa")
+    ai_text = generate_ai_summary(cid, regenerate=payload.get("regenerate", False))
+    save_ai_summary(cid, ai_text)
+    return {"ai_text": ai_text}
+
+
+@handler("report")
+def _job_report(ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+    from .ai_service import generate_ai_summary
+    from .report_service import generate_full_report
+    cid = payload["checklist_id"]
+    ai_text = payload.get("ai_text") or _saved_ai_text(cid)
+    if not ai_text:
+        ctx.progress(0.1, "Gerando narrativa")
+        ai_text = generate_ai_summary(cid)
+    ctx.progress(0.4, "Montando DOCX/PDF")
+    docx, pdf = generate_full_report(cid, ai_text, force=payload.get("force", False))
+    return {"docx_path": docx, "pdf_path": pdf}
+
+
+@handler("email_report")
+def _job_email_report(ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Garante o relatório e põe a mensagem na fila de saída (entrega: email_outbox)."""
+    from .email_outbox import enqueue_report_email
+    cid = payload["checklist_id"]
+    with connection() as conn:
+        row = conn.execute("SELECT docx_path FROM reports WHERE checklist_id=?", (cid,)).fetchone()
+        photos = [r["file_path"] for r in conn.execute(
+            "SELECT file_path FROM photos WHERE checklist_id=? AND include_in_report=1 ORDER BY display_order",
+            (cid,),
+        )]
+    docx = row["docx_path"] if row and row["docx_path"] else None
+    if not docx:
+        docx = _job_report(ctx, {"checklist_id": cid})["docx_path"]
+    ctx.progress(0.9, "Enfileirando email")
+    outbox_ids = enqueue_report_email(cid, docx, photos, payload["recipients"])
+    return {"docx_path": docx, "recipients": payload["recipients"], "outbox_ids": outbox_ids}
+
+
+if __name__ == "__main__":
+    import argparse
+    from backend.VRP_DATABASE.database import init_db
+
+    parser = argparse.ArgumentParser(description="Worker da fila de tarefas VRP.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="consome a fila até Ctrl+C")
+    w.add_argument("--threads", type=int, default=2)
+    sub.add_parser("stats", help="contagem de jobs por status")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    init_db()
+    if args.cmd == "stats":
+        print(queue_stats())
+    else:
+        start_workers(args.threads)
+        print(f"Worker ativo com {args.threads} thread(s). Ctrl+C para encerrar.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            _stop.set()
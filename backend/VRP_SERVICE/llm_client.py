@@ -0,0 +1,231 @@
+"""
+Cliente Groq único por processo, com limites de tempo e disjuntor (circuit breaker):
+- get_client(): Groq reaproveitado (httpx com keep-alive; timeouts de conexão e leitura explícitos)
+- async_client(): AsyncGroq com os mesmos timeouts (um por laço asyncio, ex. lote da IA)
+- breaker: após LLM_BREAKER_FAILURES falhas seguidas, abre por LLM_BREAKER_COOLDOWN s;
+  aberto -> LLMUnavailable na hora (quem chama usa o modelo offline); depois libera uma tentativa
+- chat(): chat completion (normal ou stream) com métricas e log de falhas;
+  429 (limite de taxa) não conta como falha no disjuntor
+- llm_metrics(): chamadas, erros, latência e estado do disjuntor (tela Config)
+
+Config via .env:
+  GROQ_API_KEY, GROQ_BASE_URL (servidor compatível, opcional),
+  LLM_CONNECT_TIMEOUT (s, padrão 5), LLM_READ_TIMEOUT (s, padrão 60),
+  LLM_BREAKER_FAILURES (padrão 3), LLM_BREAKER_COOLDOWN (s, padrão 60)
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "60"))
+
+TIMEOUT = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8, keepalive_expiry=120)
+
+
+class LLMUnavailable(RuntimeError):
+    """IA indisponível: sem chave configurada ou disjuntor aberto."""
+
+
+class CircuitBreaker:
+    """closed -> (falhas seguidas) -> open -> (cool-down) -> half_open -> closed/open."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.max_failures, self.cooldown = failures, cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def admit(self) -> Optional[str]:
+        """'closed' (liberado), 'trial' (a única chamada de teste do half_open) ou None (recusado)."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half_open" and not self._trial:
+                self._trial = True  # uma única chamada de teste
+                return "trial"
+            return None
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def release(self):
+        """Devolve a vaga de teste sem resultado (ex.: 429): a próxima chamada pode testar."""
+        with self._lock:
+            self._trial = False
+
+    def success(self):
+        with self._lock:
+            self.failures, self.opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.max_failures:
+                if self.opened_at is None or self._trial:
+                    log.warning("Disjuntor da IA aberto por %.0fs após %d falha(s)", self.cooldown, self.failures)
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def remaining(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+
+breaker = CircuitBreaker()
+
+_client = None
+_client_key = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+_metrics = {"calls": 0, "errors": 0, "rejected": 0, "total_ms": 0.0, "last_ms": 0.0, "last_error": ""}
+_latencies: deque = deque(maxlen=200)
+_metrics_lock = threading.Lock()
+
+
+def _api_key() -> str:
+    key = os.getenv("GROQ_API_KEY")
+    if not key:
+        raise LLMUnavailable("GROQ_API_KEY não configurada")
+    return key
+
+
+def get_client():
+    """Groq compartilhado pelas threads do processo (recriado se a chave mudar ou após fork)."""
+    global _client, _client_key, _client_pid
+    key = _api_key()
+    with _client_lock:
+        if _client is None or _client_key != key or _client_pid != os.getpid():
+            from groq import Groq
+            _client = Groq(
+                api_key=key,
+                base_url=os.getenv("GROQ_BASE_URL") or None,
+                timeout=TIMEOUT,
+                max_retries=1,
+                http_client=httpx.Client(timeout=TIMEOUT, limits=LIMITS),
+            )
+            _client_key, _client_pid = key, os.getpid()
+        return _client
+
+
+def async_client(max_retries: int = 0):
+    """AsyncGroq com os mesmos timeouts; o chamador fecha (await client.close())."""
+    from groq import AsyncGroq
+    return AsyncGroq(
+        api_key=_api_key(),
+        base_url=os.getenv("GROQ_BASE_URL") or None,
+        timeout=TIMEOUT,
+        max_retries=max_retries,
+        http_client=httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS),
+    )
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """429 do provedor (groq.RateLimitError): limite de taxa, não provedor fora do ar."""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+def _record_metrics(elapsed_ms: float, error: Optional[BaseException] = None):
+    with _metrics_lock:
+        _metrics["calls"] += 1
+        _metrics["total_ms"] += elapsed_ms
+        _metrics["last_ms"] = elapsed_ms
+        _latencies.append(elapsed_ms)
+        if error is not None:
+            _metrics["errors"] += 1
+            _metrics["last_error"] = f"{type(error).__name__}: {error}"[:300]
+
+
+def record(elapsed_ms: float, error: Optional[BaseException] = None):
+    """Métricas + disjuntor para uma chamada já feita (também usado pelo lote assíncrono)."""
+    _record_metrics(elapsed_ms, error)
+    if error is None:
+        breaker.success()
+    else:
+        log.warning("Falha na chamada à IA (%.0f ms): %s", elapsed_ms, error)
+        breaker.failure()
+
+
+def _check_breaker() -> str:
+    admitted = breaker.admit()
+    if admitted is None:
+        with _metrics_lock:
+            _metrics["rejected"] += 1
+        raise LLMUnavailable(f"Disjuntor aberto; nova tentativa em {breaker.remaining():.0f}s")
+    return admitted
+
+
+def _record_failure(elapsed_ms: float, error: BaseException, admitted: str):
+    """Como em ai_batch_service: 429 entra nas métricas, mas não conta como falha no disjuntor."""
+    if _is_rate_limited(error):
+        _record_metrics(elapsed_ms, error)
+        if admitted == "trial":
+            breaker.release()  # a chamada de teste não teve resultado: a vaga volta
+    else:
+        record(elapsed_ms, error)
+
+
+def chat(messages: list, model: str, temperature: float):
+    """Chat completion; LLMUnavailable se o disjuntor estiver aberto, demais erros propagam."""
+    client = get_client()
+    admitted = _check_breaker()
+    t0 = time.perf_counter()
+    try:
+        response = client.chat.completions.create(model=model, temperature=temperature, messages=messages)
+    except Exception as e:
+        _record_failure((time.perf_counter() - t0) * 1000, e, admitted)
+        raise
+    record((time.perf_counter() - t0) * 1000)
+    return response
+
+
+def chat_stream(messages: list, model: str, temperature: float) -> Iterator:
+    """Stream da chat completion (pedaços da API); métricas registradas ao fim do stream."""
+    client = get_client()
+    admitted = _check_breaker()
+    t0 = time.perf_counter()
+    try:
+        stream = client.chat.completions.create(
+            model=model, temperature=temperature, messages=messages, stream=True,
+        )
+        yield from stream
+    except GeneratorExit:
+        # a tela parou de consumir: não conta como falha do provedor
+        record((time.perf_counter() - t0) * 1000)
+        raise
+    except Exception as e:
+        _record_failure((time.perf_counter() - t0) * 1000, e, admitted)
+        raise
+    record((time.perf_counter() - t0) * 1000)
+
+
+def llm_metrics() -> dict:
+    with _metrics_lock:
+        m = dict(_metrics)
+        lat = sorted(_latencies)
+    m["avg_ms"] = m["total_ms"] / m["calls"] if m["calls"] else 0.0
+    m["p95_ms"] = lat[int(0.95 * (len(lat) - 1))] if lat else 0.0
+    m["breaker"] = breaker.state
+    m["breaker_remaining_s"] = breaker.remaining()
+    return m
@@ -0,0 +1,509 @@
+"""
+Conversão DOCX -> PDF com backends intercambiáveis:
+- docx2pdf: MS Word (somente Windows/macOS com Word instalado)
+- libreoffice: soffice headless mantido aquecido
+    * com UNO (pacote python3-uno): pool de processos soffice ouvindo em socket;
+      cada documento é aberto/exportado no processo já iniciado (sem cold start);
+      documento que passa de VRP_PDF_TIMEOUT -> soffice morto e reiniciado
+    * sem UNO: SEM processo aquecido — cada chamada parte um soffice --convert-to
+      (cold start de alguns segundos); só o perfil por slot é reaproveitado e convert_many()
+      envia vários documentos na mesma chamada. Aviso no log e modo "cli" em pdf_stats().
+      Em venv, o UNO do sistema fica visível com: python -m venv --system-site-packages
+- get_backend(): escolhido por VRP_PDF_BACKEND (auto | libreoffice | docx2pdf | none)
+- convert(): um documento; convert_many(): fila de documentos
+- pdf_stats(): latência por conversão (contagem, média, última, máxima, falhas) e modo
+
+Config via .env:
+  VRP_PDF_BACKEND (padrão auto: docx2pdf no Windows, LibreOffice no resto),
+  VRP_SOFFICE (caminho do executável), VRP_PDF_WORKERS (processos soffice, padrão 1),
+  VRP_PDF_TIMEOUT (segundos por documento, padrão 120)
+"""
+import atexit
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import util as mp_util
+from pathlib import Path
+from queue import Queue
+from typing import Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+PDF_BACKEND = os.getenv("VRP_PDF_BACKEND", "auto").strip().lower()
+PDF_WORKERS = max(1, int(os.getenv("VRP_PDF_WORKERS", "1")))
+PDF_TIMEOUT = float(os.getenv("VRP_PDF_TIMEOUT", "120"))
+
+
+class PdfConversionError(RuntimeError):
+    """Falha ao converter um documento."""
+
+
+# ---------- interface ----------
+class PdfBackend:
+    name = "base"
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def convert(self, docx_path: Path, pdf_path: Path):
+        """Gera pdf_path a partir de docx_path; PdfConversionError em caso de falha."""
+        raise NotImplementedError
+
+    def convert_many(self, jobs: Sequence[Tuple[Path, Path]]) -> List[Optional[str]]:
+        """Converte vários (docx, pdf); devolve o erro de cada item (None = ok)."""
+        errors: List[Optional[str]] = []
+        for docx_path, pdf_path in jobs:
+            try:
+                self.convert(docx_path, pdf_path)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+    def close(self):
+        pass
+
+
+class Docx2PdfBackend(PdfBackend):
+    name = "docx2pdf"
+
+    def available(self) -> bool:
+        try:
+            import docx2pdf  # noqa: F401
+        except ImportError:
+            return False
+        return sys.platform in ("win32", "darwin")
+
+    def convert(self, docx_path: Path, pdf_path: Path):
+        from docx2pdf import convert
+        try:
+            convert(str(docx_path), str(pdf_path))
+        except Exception as e:
+            raise PdfConversionError(str(e)) from e
+        if not Path(pdf_path).is_file():
+            raise PdfConversionError("docx2pdf não gerou o PDF")
+
+
+def _find_soffice() -> Optional[str]:
+    env = os.getenv("VRP_SOFFICE")
+    if env:
+        return env if Path(env).exists() or shutil.which(env) else None
+    for name in ("soffice", "libreoffice"):
+        found = shutil.which(name)
+        if found:
+            return found
+    for candidate in (
+        r"C:\Program Files\LibreOffice\program\soffice.exe",
+        "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+        "/usr/lib/libreoffice/program/soffice",
+    ):
+        if Path(candidate).exists():
+            return candidate
+    return None
+
+
+def _profile_dir(slot: int) -> Path:
+    """Perfil do LibreOffice por slot: criado uma vez e reaproveitado (é o que mais pesa na partida)."""
+    d = Path(tempfile.gettempdir()) / "vrp_soffice" / f"profile_{os.getpid()}_{slot}"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _soffice_args(soffice: str, slot: int) -> List[str]:
+    return [
+        soffice, "--headless", "--invisible", "--nologo", "--nodefault",
+        "--norestore", "--nolockcheck",
+        f"-env:UserInstallation={_profile_dir(slot).as_uri()}",
+    ]
+
+
+# ---------- LibreOffice via UNO (processo aquecido) ----------
+class _UnoWorker:
+    """Um soffice ouvindo em socket local + conexão UNO para o Desktop."""
+
+    def __init__(self, soffice: str, slot: int):
+        import uno  # noqa: F401 (garante o erro cedo)
+        self.soffice, self.slot = soffice, slot
+        self.proc = None
+        self.desktop = None
+        self._start()
+
+    def _start(self):
+        import uno
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        url = f"socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+        self.proc = subprocess.Popen(
+            _soffice_args(self.soffice, self.slot) + [f"--accept={url}"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:{url}")
+                break
+            except Exception:
+                if self.proc.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise PdfConversionError("soffice não respondeu no socket UNO")
+                time.sleep(0.25)
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    @staticmethod
+    def _props(**kwargs):
+        from com.sun.star.beans import PropertyValue
+        out = []
+        for k, v in kwargs.items():
+            p = PropertyValue()
+            p.Name, p.Value = k, v
+            out.append(p)
+        return tuple(out)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def convert(self, docx_path: Path, pdf_path: Path):
+        """Converte em outra thread; passou de PDF_TIMEOUT -> mata e reinicia o soffice."""
+        if not self.alive():
+            self._start()
+        outcome: Dict[str, BaseException] = {}
+
+        def run():
+            try:
+                self._export(docx_path, pdf_path)
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run, name=f"soffice-uno-{self.slot}", daemon=True)
+        thread.start()
+        thread.join(PDF_TIMEOUT)
+        if thread.is_alive():
+            log.warning("soffice (slot %d) excedeu %.0fs em %s; reiniciando", self.slot, PDF_TIMEOUT, Path(docx_path).name)
+            self._kill()  # a chamada UNO pendente falha quando o processo morre
+            thread.join(10)
+            try:
+                self._start()
+            except PdfConversionError as e:
+                log.warning("soffice (slot %d) não reiniciou: %s", self.slot, e)
+            raise PdfConversionError(f"tempo esgotado no soffice ({PDF_TIMEOUT:.0f}s)")
+        if "error" in outcome:
+            raise outcome["error"]
+
+    def _export(self, docx_path: Path, pdf_path: Path):
+        import uno
+        doc = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(str(Path(docx_path).resolve())), "_blank", 0,
+            self._props(Hidden=True, ReadOnly=True),
+        )
+        if doc is None:
+            raise PdfConversionError(f"LibreOffice não abriu {docx_path}")
+        try:
+            # sumário e lista de figuras (campos TOC) atualizados antes de exportar
+            indexes = doc.getDocumentIndexes()
+            for i in range(indexes.getCount()):
+                indexes.getByIndex(i).update()
+            doc.storeToURL(
+                uno.systemPathToFileUrl(str(Path(pdf_path).resolve())),
+                self._props(FilterName="writer_pdf_Export"),
+            )
+        finally:
+            doc.close(True)
+
+    def _kill(self):
+        self.desktop = None
+        if self.proc is not None:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+        self.proc = None
+
+    def close(self):
+        try:
+            if self.desktop is not None:
+                self.desktop.terminate()
+        except Exception:
+            pass
+        self.desktop = None
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+        shutil.rmtree(_profile_dir(self.slot), ignore_errors=True)
+
+
+# ---------- LibreOffice via linha de comando (perfil persistente) ----------
+class _CliWorker:
+    """
+    Sem UNO: uma chamada soffice --convert-to por lote, com perfil já inicializado.
+    Não há processo aquecido: cada chamada paga a partida do soffice.
+    """
+
+    def __init__(self, soffice: str, slot: int):
+        self.soffice, self.slot = soffice, slot
+
+    def alive(self) -> bool:
+        return True
+
+    def convert_batch(self, jobs: Sequence[Tuple[Path, Path]]) -> List[Optional[str]]:
+        with tempfile.TemporaryDirectory(prefix="vrp_pdf_") as tmp:
+            # nomes únicos no diretório de saída (o soffice usa o nome do DOCX)
+            staged: List[Optional[Path]] = []
+            errors: List[Optional[str]] = []
+            for i, (docx_path, _) in enumerate(jobs):
+                copy = Path(tmp) / f"{i:04d}.docx"
+                try:
+                    shutil.copyfile(docx_path, copy)
+                    staged.append(copy)
+                    errors.append(None)
+                except OSError as e:
+                    staged.append(None)
+                    errors.append(str(e))
+            inputs = [str(p) for p in staged if p is not None]
+            if not inputs:
+                return errors
+            out_dir = Path(tmp) / "out"
+            cmd = _soffice_args(self.soffice, self.slot) + [
+                "--convert-to", "pdf:writer_pdf_Export", "--outdir", str(out_dir), *inputs,
+            ]
+            try:
+                subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               timeout=PDF_TIMEOUT * len(inputs), check=False)
+            except subprocess.TimeoutExpired:
+                return [e or "tempo esgotado no soffice" for e in errors]
+            for i, (copy, (_, pdf_path)) in enumerate(zip(staged, jobs)):
+                if copy is None:
+                    continue
+                produced = out_dir / f"{copy.stem}.pdf"
+                if produced.is_file():
+                    shutil.move(str(produced), str(pdf_path))
+                else:
+                    errors[i] = "soffice não gerou o PDF"
+            return errors
+
+    def convert(self, docx_path: Path, pdf_path: Path):
+        err = self.convert_batch([(docx_path, pdf_path)])[0]
+        if err:
+            raise PdfConversionError(err)
+
+    def close(self):
+        shutil.rmtree(_profile_dir(self.slot), ignore_errors=True)
+
+
+_cold_warned = False
+
+
+class LibreOfficeBackend(PdfBackend):
+    name = "libreoffice"
+
+    def __init__(self, workers: int = PDF_WORKERS):
+        self.workers = workers
+        self._soffice = _find_soffice()
+        self._pool: "Queue" = Queue()
+        self._all: list = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @staticmethod
+    def uno_available() -> bool:
+        try:
+            import uno  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def available(self) -> bool:
+        return self._soffice is not None
+
+    @property
+    def mode(self) -> str:
+        return "uno" if self.uno_available() else "cli"
+
+    def _warn_cold(self):
+        global _cold_warned
+        if self.mode == "cli" and not _cold_warned:
+            _cold_warned = True
+            log.warning("python3-uno indisponível: PDF via soffice --convert-to, sem processo aquecido "
+                        "(cada conversão parte o LibreOffice)")
+
+    def _check_fork(self):
+        # processo filho (lote) não pode usar o soffice do pai
+        if self._pid != os.getpid():
+            self._pool, self._all, self._pid = Queue(), [], os.getpid()
+
+    def _acquire(self):
+        """Worker livre (ou novo, até self.workers); falhas viram PdfConversionError."""
+        if not self.available():
+            raise PdfConversionError("LibreOffice (soffice) não encontrado")
+        self._check_fork()
+        with self._lock:
+            if self._pool.empty() and len(self._all) < self.workers:
+                slot = len(self._all)
+                self._warn_cold()
+                try:
+                    worker = _UnoWorker(self._soffice, slot) if self.mode == "uno" else _CliWorker(self._soffice, slot)
+                except PdfConversionError:
+                    raise
+                except Exception as e:
+                    raise PdfConversionError(f"Falha ao iniciar o LibreOffice: {e}") from e
+                self._all.append(worker)
+                return worker
+        return self._pool.get()
+
+    def convert(self, docx_path: Path, pdf_path: Path):
+        worker = self._acquire()
+        try:
+            worker.convert(docx_path, pdf_path)
+        except PdfConversionError:
+            raise
+        except Exception as e:
+            raise PdfConversionError(str(e)) from e
+        finally:
+            self._pool.put(worker)
+
+    def convert_many(self, jobs: Sequence[Tuple[Path, Path]]) -> List[Optional[str]]:
+        if self.mode == "uno":
+            return super().convert_many(jobs)
+        # CLI: reparte a fila entre os slots, uma chamada do soffice por slot
+        jobs = list(jobs)
+        slots = max(1, min(self.workers, len(jobs)))
+        chunks = [jobs[i::slots] for i in range(slots)]
+
+        def run(chunk):
+            try:
+                worker = self._acquire()
+            except PdfConversionError as e:
+                return [str(e)] * len(chunk)
+            try:
+                return worker.convert_batch(chunk)
+            finally:
+                self._pool.put(worker)
+
+        with ThreadPoolExecutor(max_workers=slots) as ex:
+            results = list(ex.map(run, chunks))
+        errors: List[Optional[str]] = [None] * len(jobs)
+        for i, chunk_errors in enumerate(results):
+            for j, err in enumerate(chunk_errors):
+                errors[i + j * slots] = err
+        return errors
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            for worker in self._all:
+                worker.close()
+            self._all, self._pool = [], Queue()
+
+
+class NullBackend(PdfBackend):
+    name = "none"
+
+    def available(self) -> bool:
+        return True
+
+    def convert(self, docx_path: Path, pdf_path: Path):
+        raise PdfConversionError("conversão para PDF desativada (VRP_PDF_BACKEND=none)")
+
+
+# ---------- seleção e métricas ----------
+_backend: Optional[PdfBackend] = None
+_backend_lock = threading.Lock()
+_stats: Dict[str, float] = {"count": 0, "failures": 0, "total_ms": 0.0, "last_ms": 0.0, "max_ms": 0.0}
+_stats_lock = threading.Lock()
+
+
+def _pick_backend() -> PdfBackend:
+    if PDF_BACKEND == "none":
+        return NullBackend()
+    if PDF_BACKEND == "docx2pdf":
+        return Docx2PdfBackend()
+    if PDF_BACKEND == "libreoffice":
+        return LibreOfficeBackend()
+    for backend in (Docx2PdfBackend(), LibreOfficeBackend()):
+        if backend.available():
+            return backend
+    return NullBackend()
+
+
+def get_backend() -> PdfBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _pick_backend()
+                log.info("Backend de PDF: %s", _backend.name)
+    return _backend
+
+
+def close_backend():
+    if _backend is not None:
+        _backend.close()
+
+
+# encerra os soffice no fim do processo (atexit não roda nos filhos de ProcessPoolExecutor)
+atexit.register(close_backend)
+mp_util.Finalize(None, close_backend, exitpriority=10)
+
+
+def _record(elapsed_ms: float, ok: bool):
+    with _stats_lock:
+        _stats["count"] += 1
+        _stats["failures"] += 0 if ok else 1
+        _stats["total_ms"] += elapsed_ms
+        _stats["last_ms"] = elapsed_ms
+        _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+
+
+def pdf_stats() -> dict:
+    """Latência das conversões deste processo (ms)."""
+    with _stats_lock:
+        s = dict(_stats)
+    s["avg_ms"] = s["total_ms"] / s["count"] if s["count"] else 0.0
+    backend = get_backend()
+    s["backend"] = backend.name
+    s["mode"] = backend.mode if isinstance(backend, LibreOfficeBackend) else None
+    return s
+
+
+def convert(docx_path: Path, pdf_path: Path) -> float:
+    """Converte um documento; devolve a latência em ms (PdfConversionError se falhar)."""
+    backend = get_backend()
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        backend.convert(Path(docx_path), Path(pdf_path))
+        ok = True
+    finally:
+        elapsed = (time.perf_counter() - t0) * 1000
+        _record(elapsed, ok)
+        log.info("PDF %s via %s em %.0f ms%s", Path(pdf_path).name, backend.name, elapsed, "" if ok else " (falha)")
+    return elapsed
+
+
+def convert_many(jobs: Sequence[Tuple[Path, Path]]) -> List[Optional[str]]:
+    """Fila de conversões (docx, pdf); devolve o erro de cada item (None = ok)."""
+    jobs = [(Path(d), Path(p)) for d, p in jobs]
+    if not jobs:
+        return []
+    backend = get_backend()
+    t0 = time.perf_counter()
+    errors = backend.convert_many(jobs)
+    per_doc = (time.perf_counter() - t0) * 1000 / len(jobs)
+    for err in errors:
+        _record(per_doc, err is None)
+    log.info("%d PDF(s) via %s, %.0f ms por documento", len(jobs), backend.name, per_doc)
+    return errors
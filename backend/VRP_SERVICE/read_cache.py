@@ -0,0 +1,103 @@
+"""
+Cache de leitura compartilhado entre as telas (e entre os reruns do Streamlit):
+- @cached("vrp_sites", ...): guarda o resultado por (função, argumentos, versões das tabelas lidas)
+- versões: tabela 'data_version' (migração 18), incrementada por triggers em todo
+  INSERT/UPDATE/DELETE -> qualquer caminho de escrita, de qualquer processo, invalida
+- checagem barata: PRAGMA data_version numa conexão dedicada só muda quando outra conexão
+  grava no banco; só então as versões são relidas (1 consulta por escrita, não por leitura)
+- read_cache_stats() / clear_read_cache(): contadores (tela Config) e limpeza manual
+Os resultados são compartilhados: quem chama não deve alterá-los (copie antes).
+
+Config via .env: VRP_READ_CACHE_MAX (entradas em memória, padrão 512; 0 = desligado)
+"""
+import functools
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from backend.VRP_DATABASE.database import get_conn
+
+READ_CACHE_MAX = int(os.getenv("VRP_READ_CACHE_MAX", "512"))
+
+# tabelas com versão mantida por trigger (migração 18)
+TRACKED_TABLES = ("checklists", "vrp_sites", "photos", "photo_derivatives", "reports")
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, Any]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "version_reads": 0}
+
+_watch: Optional[sqlite3.Connection] = None
+_watch_pid: Optional[int] = None
+_watch_dv: Optional[int] = None
+_versions: Dict[str, int] = {}
+
+
+def _current_versions() -> Dict[str, int]:
+    """Versões das tabelas; só consulta 'data_version' quando outra conexão gravou algo."""
+    global _watch, _watch_pid, _watch_dv, _versions
+    with _lock:
+        if _watch is None or _watch_pid != os.getpid():
+            _watch, _watch_pid, _watch_dv = get_conn(), os.getpid(), None
+        dv = _watch.execute("PRAGMA data_version").fetchone()[0]
+        if dv != _watch_dv:
+            _versions = dict(_watch.execute("SELECT tbl, version FROM data_version").fetchall())
+            _watch_dv = dv
+            _stats["version_reads"] += 1
+        return _versions
+
+
+def _freeze(value: Any) -> Any:
+    """Argumentos -> chave hashable (dict/list/set viram tuplas ordenadas)."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def cached(*tables: str) -> Callable:
+    """Decorador: reaproveita o resultado enquanto nenhuma das `tables` mudar."""
+    unknown = set(tables) - set(TRACKED_TABLES)
+    if unknown:
+        raise ValueError(f"Tabela sem versão: {', '.join(sorted(unknown))}")
+
+    def decorator(fn: Callable) -> Callable:
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if READ_CACHE_MAX <= 0:
+                return fn(*args, **kwargs)
+            versions = _current_versions()
+            key = (name, _freeze(args), _freeze(kwargs), tuple(versions.get(t, 0) for t in tables))
+            with _lock:
+                if key in _entries:
+                    _entries.move_to_end(key)
+                    _stats["hits"] += 1
+                    return _entries[key]
+                _stats["misses"] += 1
+            value = fn(*args, **kwargs)
+            with _lock:
+                _entries[key] = value
+                while len(_entries) > READ_CACHE_MAX:
+                    _entries.popitem(last=False)  # versões antigas saem primeiro (LRU)
+            return value
+
+        wrapper.uncached = fn
+        return wrapper
+
+    return decorator
+
+
+def clear_read_cache():
+    with _lock:
+        _entries.clear()
+
+
+def read_cache_stats() -> dict:
+    with _lock:
+        return {**_stats, "entries": len(_entries), "max": READ_CACHE_MAX, "versions": dict(_versions)}
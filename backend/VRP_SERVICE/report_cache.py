@@ -0,0 +1,69 @@
+"""
+Cache dos relatórios gerados (DOCX/PDF) por impressão digital das entradas.
+- report_fingerprint(): hash de checklist + VRP + fotos incluídas (id, ordem, rótulo, hash do arquivo)
+  + texto da IA + REPORT_TEMPLATE_VERSION + DPI das figuras
+- cached_report(): caminhos gravados em 'reports' quando a impressão digital confere e os arquivos existem
+- invalidate_report_cache(): descarta o cache (edição de fotos/checklist)
+"""
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .image_service import REPORT_DPI
+from backend.VRP_DATABASE.database import connection
+
+# incrementar sempre que build_docx mudar o documento gerado
+REPORT_TEMPLATE_VERSION = 2
+
+
+def _file_token(photo: Dict[str, Any]) -> str:
+    """Identidade do arquivo: content_hash; fotos antigas usam tamanho+mtime."""
+    if photo.get("content_hash"):
+        return photo["content_hash"]
+    try:
+        st = Path(photo.get("file_path") or "").stat()
+        return f"{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        return "missing"
+
+
+def report_fingerprint(ck: Dict, site: Dict, photos: List[Dict], ai_text: str) -> str:
+    payload = {
+        "template": REPORT_TEMPLATE_VERSION,
+        "dpi": REPORT_DPI,
+        "ck": ck,
+        "site": site,
+        "photos": [
+            [p.get("id"), p.get("display_order"), p.get("label"), _file_token(p)]
+            for p in photos
+        ],
+        "ai_text": ai_text or "",
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cached_report(checklist_id: int, fingerprint: str) -> Optional[Dict[str, Optional[str]]]:
+    """{"docx_path", "pdf_path"} do último relatório se nada mudou; pdf_path None se ausente."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT docx_path, pdf_path, fingerprint FROM reports WHERE checklist_id=?",
+            (checklist_id,),
+        ).fetchone()
+    if not row or row["fingerprint"] != fingerprint:
+        return None
+    if not row["docx_path"] or not Path(row["docx_path"]).is_file():
+        return None
+    pdf = row["pdf_path"] if row["pdf_path"] and Path(row["pdf_path"]).is_file() else None
+    return {"docx_path": row["docx_path"], "pdf_path": pdf}
+
+
+def invalidate_report_cache(conn: sqlite3.Connection, checklist_ids: Iterable[int]):
+    """Descarta o cache dos checklists (na transação do chamador)."""
+    ids = sorted({int(c) for c in checklist_ids if c is not None})
+    if ids:
+        conn.executemany(
+            "UPDATE reports SET fingerprint=NULL WHERE checklist_id=?", [(c,) for c in ids]
+        )
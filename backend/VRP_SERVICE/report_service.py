@@ -4,11 +4,14 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 from datetime import datetime
 
+from . import pdf_service
 from .export_paths import EXPORTS_DIR, LOGOS_DIR
-from backend.VRP_DATABASE.database import get_conn
+from .report_cache import cached_report, report_fingerprint
+from .storage_service import report_images
+from backend.VRP_DATABASE.database import connection, transaction
 
 LOGO_PATH = LOGOS_DIR / "NOVAES.png"
 
@@ -96,16 +99,15 @@ def _style_table(table):
 
 # ---------- dados ----------
 def _fetch_all(checklist_id: int):
-    conn = get_conn()
-    ck_row = conn.execute("SELECT * FROM checklists WHERE id=?", (checklist_id,)).fetchone()
-    site_row = None
-    if ck_row and ck_row["vrp_site_id"]:
-        site_row = conn.execute("SELECT * FROM vrp_sites WHERE id=?", (ck_row["vrp_site_id"],)).fetchone()
-    photos_rows = conn.execute(
-        "SELECT * FROM photos WHERE checklist_id=? AND include_in_report=1 ORDER BY display_order,id",
-        (checklist_id,)
-    ).fetchall()
-    conn.close()
+    with connection() as conn:
+        ck_row = conn.execute("SELECT * FROM checklists WHERE id=?", (checklist_id,)).fetchone()
+        site_row = None
+        if ck_row and ck_row["vrp_site_id"]:
+            site_row = conn.execute("SELECT * FROM vrp_sites WHERE id=?", (ck_row["vrp_site_id"],)).fetchone()
+        photos_rows = conn.execute(
+            "SELECT * FROM photos WHERE checklist_id=? AND include_in_report=1 ORDER BY display_order,id",
+            (checklist_id,)
+        ).fetchall()
     ck = dict(ck_row) if ck_row else {}
     site = dict(site_row) if site_row else {}
     photos = [dict(p) for p in photos_rows]
@@ -153,8 +155,20 @@ def _add_intro_and_table(doc: Document):
     _style_table(table)
 
 # ---------- DOCX ----------
-def build_docx(checklist_id: int, ai_text: str) -> Path:
+def build_docx(checklist_id: int, ai_text: str, force: bool = False) -> Path:
+    """Gera o DOCX; devolve o último gerado se as entradas não mudaram (force=True ignora o cache)."""
     ck, site, photos = _fetch_all(checklist_id)
+    if not force:
+        cached = cached_report(checklist_id, report_fingerprint(ck, site, photos, ai_text))
+        if cached:
+            return Path(cached["docx_path"])
+    docx_path, _stats = _render_docx(checklist_id, ck, site, photos, ai_text)
+    return docx_path
+
+def _render_docx(checklist_id: int, ck: dict, site: dict, photos: list, ai_text: str) -> Tuple[Path, dict]:
+    """Monta e salva o DOCX. Retorna (caminho, bytes das fotos originais x embutidas)."""
+    # variantes na resolução de impressão (7,5 x 10 cm @ REPORT_DPI), geradas em paralelo
+    image_paths, image_stats = report_images(photos)
     export_folder = EXPORTS_DIR / f"{checklist_id}"
     export_folder.mkdir(parents=True, exist_ok=True)
     fname = export_folder / f"Relatorio_VRP_{checklist_id}.docx"
@@ -251,7 +265,7 @@ def build_docx(checklist_id: int, ai_text: str) -> Path:
     if photos:
         doc.add_heading("Figuras", level=1)
         for ph in photos:
-            path = ph.get("file_path")
+            path = image_paths.get(ph.get("id")) or ph.get("file_path")
             if not path:
                 continue
             try:
@@ -263,30 +277,87 @@ def build_docx(checklist_id: int, ai_text: str) -> Path:
 
     # salva de forma resiliente
     fname = _safe_save_docx(doc, fname)
-    return fname
-
-def convert_to_pdf(docx_path: Path) -> Path | None:
-    """DOCX -> PDF (usa nome alternativo se arquivo estiver bloqueado)."""
+    return fname, image_stats
+
+def _cached_pdf_for(docx_path: Path) -> Path | None:
+    """PDF já gerado a partir deste DOCX (mais novo que ele), conforme 'reports'."""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT pdf_path FROM reports WHERE docx_path=? AND pdf_path IS NOT NULL",
+            (str(docx_path),),
+        ).fetchone()
+    if not row:
+        return None
+    pdf = Path(row["pdf_path"])
+    try:
+        if pdf.stat().st_mtime >= Path(docx_path).stat().st_mtime:
+            return pdf
+    except OSError:
+        pass
+    return None
+
+def convert_to_pdf(docx_path: Path, force: bool = False) -> Path | None:
+    """
+    DOCX -> PDF pelo backend configurado em pdf_service (Word ou LibreOffice).
+    Usa nome alternativo se o arquivo estiver bloqueado; reaproveita PDF atualizado.
+    """
+    if not force:
+        cached = _cached_pdf_for(docx_path)
+        if cached:
+            return cached
     try:
-        from docx2pdf import convert
         out = _next_pdf_path_for(docx_path)
-        convert(str(docx_path), str(out))
+        pdf_service.convert(docx_path, out)
         return out
     except Exception:
         return None
 
-def generate_full_report(checklist_id: int, ai_text: str) -> Tuple[str, str | None]:
-    docx_path = build_docx(checklist_id, ai_text)
-    pdf_path = convert_to_pdf(docx_path)
-
-    conn = get_conn()
-    conn.execute("""
-        INSERT INTO reports (checklist_id, ai_summary, docx_path, pdf_path)
-        VALUES (?,?,?,?)
-        ON CONFLICT(checklist_id) DO UPDATE SET
-            ai_summary=excluded.ai_summary,
-            docx_path=excluded.docx_path,
-            pdf_path=excluded.pdf_path
-    """, (checklist_id, ai_text, str(docx_path), str(pdf_path) if pdf_path else None))
-    conn.commit(); conn.close()
+def convert_many_to_pdf(docx_paths: List[Path], force: bool = False) -> List[Path | None]:
+    """Fila de conversões: vários DOCX de uma vez (mesmo processo soffice aquecido)."""
+    results: List[Path | None] = [None] * len(docx_paths)
+    jobs, slots = [], []
+    for i, docx_path in enumerate(docx_paths):
+        cached = None if force else _cached_pdf_for(docx_path)
+        if cached:
+            results[i] = cached
+            continue
+        try:
+            jobs.append((Path(docx_path), _next_pdf_path_for(Path(docx_path))))
+            slots.append(i)
+        except Exception:
+            pass
+    for i, (_, out), err in zip(slots, jobs, pdf_service.convert_many(jobs)):
+        results[i] = out if err is None else None
+    return results
+
+def generate_full_report(checklist_id: int, ai_text: str, force: bool = False) -> Tuple[str, str | None]:
+    """
+    DOCX + PDF + registro em 'reports'. Se checklist, VRP, fotos, texto e versão do
+    template não mudaram, devolve os arquivos já gerados (force=True regera).
+    """
+    ck, site, photos = _fetch_all(checklist_id)
+    fingerprint = report_fingerprint(ck, site, photos, ai_text)
+    cached = None if force else cached_report(checklist_id, fingerprint)
+    image_stats = {"original_bytes": None, "embedded_bytes": None}
+    if cached:
+        docx_path = Path(cached["docx_path"])
+        pdf_path = Path(cached["pdf_path"]) if cached["pdf_path"] else convert_to_pdf(docx_path)
+    else:
+        docx_path, image_stats = _render_docx(checklist_id, ck, site, photos, ai_text)
+        pdf_path = convert_to_pdf(docx_path, force=True)
+
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO reports (checklist_id, ai_summary, docx_path, pdf_path, fingerprint,
+                                 images_original_bytes, images_embedded_bytes)
+            VALUES (?,?,?,?,?,?,?)
+            ON CONFLICT(checklist_id) DO UPDATE SET
+                ai_summary=excluded.ai_summary,
+                docx_path=excluded.docx_path,
+                pdf_path=excluded.pdf_path,
+                fingerprint=excluded.fingerprint,
+                images_original_bytes=COALESCE(excluded.images_original_bytes, reports.images_original_bytes),
+                images_embedded_bytes=COALESCE(excluded.images_embedded_bytes, reports.images_embedded_bytes)
+        """, (checklist_id, ai_text, str(docx_path), str(pdf_path) if pdf_path else None, fingerprint,
+              image_stats["original_bytes"], image_stats["embedded_bytes"]))
     return str(docx_path), (str(pdf_path) if pdf_path else None)
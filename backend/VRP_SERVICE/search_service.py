@@ -0,0 +1,67 @@
+"""
+Busca textual no índice FTS5 'search_index' (mantido por triggers, migração 17):
+- observações hidráulicas e gerais do checklist, observações de acesso da VRP,
+  rótulo e observação das fotos
+- search(): resultados por relevância (bm25) com trecho destacado (snippet) e o checklist
+  para onde navegar (VRP -> checklist mais recente dela)
+- fts_query(): texto digitado -> consulta FTS5 segura (todas as palavras; a última como prefixo)
+Acentos e maiúsculas são ignorados (tokenizer unicode61 remove_diacritics).
+"""
+import re
+from typing import Any, Dict, List
+
+from backend.VRP_DATABASE.database import connection
+
+SNIPPET_TOKENS = 12
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text: str) -> str:
+    """'piloto vaza' -> '"piloto" "vaza"*' (aspas evitam operadores/sintaxe FTS no texto do usuário)."""
+    words = _WORD.findall(text or "")
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(text: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    [{kind: 'checklist'|'site'|'photo', ref_id, checklist_id, snippet, score,
+      date, municipality, city, place}], mais relevantes primeiro.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    with connection() as conn:
+        rows = conn.execute(
+            f"""
+            WITH hits AS (
+                SELECT s.kind, s.ref_id,
+                       snippet(search_index, 2, '**', '**', '…', {SNIPPET_TOKENS}) AS snippet,
+                       bm25(search_index) AS score
+                  FROM search_index s
+                 WHERE search_index MATCH ?
+                 ORDER BY score
+                 LIMIT ?
+            )
+            SELECT h.*, c.id AS checklist_id, c.date, vs.municipality, vs.city, vs.place
+              FROM hits h
+              LEFT JOIN photos p ON h.kind = 'photo' AND p.id = h.ref_id
+              LEFT JOIN checklists c ON c.id = CASE h.kind
+                    WHEN 'checklist' THEN h.ref_id
+                    WHEN 'photo' THEN p.checklist_id
+                    ELSE (SELECT MAX(c2.id) FROM checklists c2 WHERE c2.vrp_site_id = h.ref_id)
+                END
+              LEFT JOIN vrp_sites vs ON vs.id = CASE h.kind WHEN 'site' THEN h.ref_id ELSE c.vrp_site_id END
+             ORDER BY h.score
+            """,
+            (query, limit),
+        ).fetchall()
+    out = []
+    for r in rows:
+        hit = dict(r)
+        hit["snippet"] = " ".join(hit["snippet"].split())  # quebras de linha do texto -> uma linha
+        out.append(hit)
+    return out
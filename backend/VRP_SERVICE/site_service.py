@@ -0,0 +1,191 @@
+"""
+Consultas espaciais de VRPs (índice R*Tree 'vrp_sites_rtree', mantido por triggers):
+- sites_in_bbox(): VRPs dentro de um retângulo (ex.: área visível do mapa)
+- nearest_sites(): as N VRPs mais próximas de um ponto (busca em caixas crescentes)
+- sites_within_radius(): VRPs a até X metros de um ponto, ordenadas pela distância
+- sites_extent(): retângulo que contém todas as VRPs localizadas (enquadramento do mapa)
+- filtros (município, DMC, tipo, DN) sempre aplicados no SQL (índices da migração 15):
+    query_sites() / count_sites(): lista paginada e total
+    site_facets(): contagem por valor de cada filtro numa única consulta (UNION ALL),
+      cada faceta respeitando os demais filtros
+    site_summary(): totais para o resumo da tela de mapa
+Distâncias em metros pela fórmula de haversine; o R*Tree só faz o pré-filtro pela caixa.
+Leituras passam pelo read_cache (invalidado a cada escrita em vrp_sites/checklists).
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.VRP_DATABASE.database import connection
+from backend.VRP_SERVICE.read_cache import cached
+
+EARTH_RADIUS_M = 6_371_000.0
+M_PER_DEG_LAT = 111_320.0
+
+# colunas devolvidas pelas consultas (as mesmas da tela de mapa)
+SITE_COLUMNS = """
+    vs.id, vs.municipality, vs.city, vs.place, vs.brand, vs.type, vs.dn,
+    vs.latitude, vs.longitude, vs.access_install, vs.network_depth_cm, vs.has_automation,
+    (SELECT COUNT(*) FROM checklists c WHERE c.vrp_site_id = vs.id) AS checklist_count
+"""
+
+# filtros de igualdade aceitos (coluna -> valor); None/"" = sem filtro
+FILTER_COLUMNS = ("municipality", "city", "type", "dn")
+
+BBox = Tuple[float, float, float, float]  # (sul, oeste, norte, leste)
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bbox_around(lat: float, lng: float, radius_m: float) -> BBox:
+    """Caixa que contém o círculo de raio `radius_m` em torno do ponto."""
+    dlat = radius_m / M_PER_DEG_LAT
+    dlng = radius_m / (M_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def _filter_sql(filters: Optional[Dict[str, Any]], skip: Optional[str] = None) -> Tuple[str, list]:
+    """' AND vs.col = ?...' para os filtros informados (exceto `skip`) + parâmetros."""
+    clauses, params = [], []
+    for column, value in (filters or {}).items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Filtro não suportado: {column}")
+        if column == skip or value is None or value == "":
+            continue
+        clauses.append(f"vs.{column} = ?")
+        params.append(value)
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+_LOCATED = "vs.latitude IS NOT NULL AND vs.longitude IS NOT NULL"
+
+
+@cached("vrp_sites", "checklists")
+def sites_in_bbox(south: float, west: float, north: float, east: float,
+                  filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """VRPs com coordenadas dentro da caixa (bordas inclusas)."""
+    where, params = _filter_sql(filters)
+    sql = f"""
+        SELECT {SITE_COLUMNS}
+          FROM vrp_sites_rtree r
+          JOIN vrp_sites vs ON vs.id = r.id
+         WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?
+           -- o R*Tree guarda float32 (caixa arredondada para fora): confirma no valor exato
+           AND vs.latitude BETWEEN ? AND ? AND vs.longitude BETWEEN ? AND ?{where}
+         ORDER BY vs.municipality, vs.city, vs.place
+    """
+    args = [south, north, west, east, south, north, west, east, *params]
+    if limit is not None:
+        sql += " LIMIT ?"
+        args.append(limit)
+    with connection() as conn:
+        return [dict(r) for r in conn.execute(sql, args).fetchall()]
+
+
+def sites_within_radius(lat: float, lng: float, radius_m: float,
+                        filters: Optional[Dict[str, Any]] = None,
+                        exclude_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """VRPs a até `radius_m` metros, da mais próxima para a mais distante (campo 'distance_m')."""
+    out = []
+    for site in sites_in_bbox(*bbox_around(lat, lng, radius_m), filters=filters):
+        if site["id"] == exclude_id:
+            continue
+        site = dict(site)  # resultado do cache é compartilhado
+        site["distance_m"] = haversine_m(lat, lng, site["latitude"], site["longitude"])
+        if site["distance_m"] <= radius_m:
+            out.append(site)
+    out.sort(key=lambda s: s["distance_m"])
+    return out
+
+
+def nearest_sites(lat: float, lng: float, n: int = 5, max_radius_m: float = 50_000,
+                  filters: Optional[Dict[str, Any]] = None,
+                  exclude_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """As `n` VRPs mais próximas (até `max_radius_m`); o raio da busca cresce até achar `n`."""
+    radius = min(250.0, max_radius_m)  # nunca busca além de max_radius_m
+    while True:
+        found = sites_within_radius(lat, lng, radius, filters=filters, exclude_id=exclude_id)
+        if len(found) >= n or radius >= max_radius_m:
+            return found[:n]
+        radius = min(radius * 4, max_radius_m)
+
+
+@cached("vrp_sites")
+def sites_extent(filters: Optional[Dict[str, Any]] = None) -> Optional[BBox]:
+    """(sul, oeste, norte, leste) das VRPs localizadas; None se não houver nenhuma."""
+    where, params = _filter_sql(filters)
+    with connection() as conn:
+        row = conn.execute(
+            f"""SELECT MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude)
+                  FROM vrp_sites vs
+                 WHERE latitude IS NOT NULL AND longitude IS NOT NULL{where}""",
+            params,
+        ).fetchone()
+    return None if row[0] is None else (row[0], row[1], row[2], row[3])
+
+
+@cached("vrp_sites", "checklists")
+def query_sites(filters: Optional[Dict[str, Any]] = None, located: bool = True,
+                limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+    """VRPs que atendem aos filtros, em ordem de município/DMC/complemento."""
+    where, params = _filter_sql(filters)
+    sql = f"""
+        SELECT {SITE_COLUMNS}
+          FROM vrp_sites vs
+         WHERE {_LOCATED if located else "1"}{where}
+         ORDER BY vs.municipality, vs.city, vs.place
+    """
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    with connection() as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+@cached("vrp_sites")
+def count_sites(filters: Optional[Dict[str, Any]] = None, located: bool = True) -> int:
+    where, params = _filter_sql(filters)
+    with connection() as conn:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM vrp_sites vs WHERE {_LOCATED if located else '1'}{where}", params,
+        ).fetchone()[0]
+
+
+@cached("vrp_sites")
+def site_facets(filters: Optional[Dict[str, Any]] = None, located: bool = True) -> Dict[str, List[Tuple[Any, int]]]:
+    """
+    {coluna: [(valor, n_vrps), ...]} para município, DMC, tipo e DN.
+    Cada faceta aplica os outros filtros, não o seu (trocar de valor continua possível).
+    """
+    parts, params = [], []
+    for column in FILTER_COLUMNS:
+        where, p = _filter_sql(filters, skip=column)
+        parts.append(
+            f"""SELECT '{column}' AS facet, vs.{column} AS value, COUNT(*) AS n
+                  FROM vrp_sites vs
+                 WHERE {_LOCATED if located else "1"} AND vs.{column} IS NOT NULL{where}
+                 GROUP BY vs.{column}"""
+        )
+        params += p
+    out: Dict[str, List[Tuple[Any, int]]] = {column: [] for column in FILTER_COLUMNS}
+    with connection() as conn:
+        for r in conn.execute(" UNION ALL ".join(parts) + " ORDER BY facet, value", params):
+            out[r["facet"]].append((r["value"], r["n"]))
+    return out
+
+
+@cached("vrp_sites", "checklists")
+def site_summary(located: bool = True) -> Dict[str, int]:
+    """Total de VRPs, locais DMC distintos e checklists dessas VRPs."""
+    with connection() as conn:
+        row = conn.execute(
+            f"""SELECT COUNT(*) AS sites, COUNT(DISTINCT vs.city) AS dmcs,
+                       COALESCE(SUM((SELECT COUNT(*) FROM checklists c WHERE c.vrp_site_id = vs.id)), 0) AS checklists
+                  FROM vrp_sites vs
+                 WHERE {_LOCATED if located else "1"}"""
+        ).fetchone()
+    return dict(row)
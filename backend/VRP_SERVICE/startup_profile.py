@@ -0,0 +1,284 @@
+"""
+Perfil da partida a frio (primeira requisição após um deploy), sem navegador:
+- cada rodada é um processo Python novo com -X importtime, que executa as fases
+    export_paths  importação + criação das pastas de trabalho
+    imports       demais importações do main_app.py (lidas do próprio arquivo)
+    init_db       migrações pendentes
+    first_page    importação da tela inicial (page_registry)
+  e informa o tempo de cada fase, o pico de memória (RSS) e os módulos carregados
+- relatório: fases (mediana das rodadas), intérprete, total, pico de RSS,
+  pacotes que mais pesam na importação e os módulos mais lentos
+- baseline em JSON: --save-baseline grava; nas execuções seguintes compara e sai com
+  código 1 se o total, alguma fase ou o RSS piorar além do limite (--threshold, --min-ms, --min-mb)
+Por padrão cada rodada usa uma raiz vazia em pasta temporária (VRP_ROOT): banco novo,
+todas as migrações. Para medir uma instalação existente: --root <pasta>.
+
+CLI:
+    python -m backend.VRP_SERVICE.startup_profile --runs 5 --save-baseline
+    python -m backend.VRP_SERVICE.startup_profile --baseline startup_baseline.json --threshold 0.25
+"""
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+APP_DIR = Path(__file__).resolve().parents[2]
+MAIN_APP = APP_DIR / "main_app.py"
+FIRST_PAGE = "Checklist"
+RESULT_MARK = "@@startup_profile "
+PHASE_MARK = "@@phase "
+
+DEFAULT_THRESHOLD = 0.20   # +20% sobre a baseline
+DEFAULT_MIN_MS = 50.0      # diferenças menores que isso são ruído
+DEFAULT_MIN_MB = 10.0
+
+
+# ---------- processo filho (uma partida a frio) ----------
+def main_app_imports(path: Path = MAIN_APP) -> List[str]:
+    """Módulos importados no nível superior do main_app.py, na ordem do arquivo."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return modules
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memória residente deste processo (MB); None se o SO não informar."""
+    try:
+        import resource
+    except ImportError:
+        return _peak_rss_windows_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # macOS: bytes; Linux: KB
+
+
+def _peak_rss_windows_mb() -> Optional[float]:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+                )
+            ]
+
+        counters = _Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def _child():
+    import importlib
+
+    phases: Dict[str, float] = {}
+
+    def run(name: str, step):
+        print(PHASE_MARK + name, file=sys.stderr, flush=True)  # separa as linhas do importtime por fase
+        t0 = time.perf_counter()
+        step()
+        phases[name] = (time.perf_counter() - t0) * 1000
+
+    def _imports():
+        for module in main_app_imports():
+            importlib.import_module(module)
+
+    def _init_db():
+        from backend.VRP_DATABASE.database import init_db
+        init_db()
+
+    def _first_page():
+        from frontend.VRP_SCREENS.page_registry import load_page
+        load_page(FIRST_PAGE)
+
+    run("export_paths", lambda: importlib.import_module("backend.VRP_SERVICE.export_paths"))
+    run("imports", _imports)
+    run("init_db", _init_db)
+    run("first_page", _first_page)
+    print(PHASE_MARK + "end", file=sys.stderr, flush=True)
+    result = {"phases_ms": phases, "peak_rss_mb": peak_rss_mb(), "modules": len(sys.modules)}
+    print(RESULT_MARK + json.dumps(result), flush=True)
+
+
+# ---------- processo pai ----------
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, Any]]:
+    """Linhas do -X importtime -> {módulo: {self_us, cumulative_us, depth, phase}}."""
+    modules: Dict[str, Dict[str, Any]] = {}
+    phase = "interpreter"
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARK):
+            phase = line[len(PHASE_MARK):].strip()
+            continue
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # cabeçalho
+        name = parts[2].rstrip()
+        modules[name.strip()] = {
+            "self_us": int(parts[0]), "cumulative_us": int(parts[1]),
+            "depth": (len(name) - len(name.lstrip())) // 2, "phase": phase,
+        }
+    return modules
+
+
+def run_once(root: Optional[str] = None, python: str = sys.executable) -> Dict[str, Any]:
+    """Uma partida a frio em processo novo; raiz temporária quando `root` não é informado."""
+    with tempfile.TemporaryDirectory(prefix="vrp_startup_") as tmp:
+        env = {**os.environ, "VRP_ROOT": root or tmp, "PYTHONIOENCODING": "utf-8"}
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [python, "-X", "importtime", "-m", "backend.VRP_SERVICE.startup_profile", "--child"],
+            cwd=APP_DIR, env=env, capture_output=True, text=True, encoding="utf-8", errors="replace",
+        )
+        wall_ms = (time.perf_counter() - t0) * 1000
+    line = next((ln for ln in proc.stdout.splitlines() if ln.startswith(RESULT_MARK)), None)
+    if proc.returncode != 0 or line is None:
+        tail = "\n".join(ln for ln in proc.stderr.splitlines() if not ln.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"Partida falhou (código {proc.returncode}):\n{tail}")
+    result = json.loads(line[len(RESULT_MARK):])
+    phases = result["phases_ms"]
+    # inicialização do Python + encerramento do processo
+    result["phases_ms"] = {"interpreter": max(wall_ms - sum(phases.values()), 0.0), **phases}
+    result["total_ms"] = wall_ms
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def _median(values: List[float]) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def summarize(runs: List[Dict[str, Any]], top: int = 15) -> Dict[str, Any]:
+    """Medianas das rodadas + ranking de pacotes (tempo próprio somado) e módulos de topo."""
+    phases = {name: _median([r["phases_ms"].get(name) for r in runs]) for name in runs[0]["phases_ms"]}
+    names = set().union(*(r["imports"] for r in runs))
+
+    def module_ms(name: str, key: str) -> float:
+        return _median([r["imports"][name][key] / 1000 for r in runs if name in r["imports"]]) or 0.0
+
+    packages: Dict[str, float] = {}
+    for name in names:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + module_ms(name, "self_us")
+    top_level = [n for n in names if any(r["imports"].get(n, {}).get("depth") == 0 for r in runs)]
+    slowest = sorted(top_level, key=lambda n: module_ms(n, "cumulative_us"), reverse=True)[:top]
+    phase_of = {n: next(r["imports"][n]["phase"] for r in runs if n in r["imports"]) for n in slowest}
+    return {
+        "runs": len(runs),
+        "total_ms": _median([r["total_ms"] for r in runs]),
+        "phases_ms": phases,
+        "peak_rss_mb": _median([r["peak_rss_mb"] for r in runs]),
+        "modules": _median([r["modules"] for r in runs]),
+        "packages_ms": dict(sorted(packages.items(), key=lambda kv: kv[1], reverse=True)),
+        "slowest_imports": [
+            {"module": n, "cumulative_ms": module_ms(n, "cumulative_us"), "phase": phase_of[n]} for n in slowest
+        ],
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD,
+            min_ms: float = DEFAULT_MIN_MS, min_mb: float = DEFAULT_MIN_MB) -> List[str]:
+    """Regressões (texto) do total, de cada fase e do pico de RSS em relação à baseline."""
+    checks = [("total", current["total_ms"], baseline.get("total_ms"), min_ms, "ms")]
+    checks += [(f"fase {name}", value, baseline.get("phases_ms", {}).get(name), min_ms, "ms")
+               for name, value in current["phases_ms"].items()]
+    checks.append(("pico de RSS", current["peak_rss_mb"], baseline.get("peak_rss_mb"), min_mb, "MB"))
+    regressions = []
+    for label, now, before, floor, unit in checks:
+        if now is None or before is None:
+            continue
+        if now > before * (1 + threshold) and now - before > floor:
+            growth = f"+{(now / before - 1) * 100:.0f}%" if before else "novo"
+            regressions.append(f"{label}: {before:.0f} -> {now:.0f} {unit} ({growth})")
+    return regressions
+
+
+def _print_report(summary: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    def row(label: str, now: Optional[float], before: Optional[float], unit: str = "ms"):
+        text = f"  {label:<14}{now:>9.0f} {unit}" if now is not None else f"  {label:<14}{'—':>9}"
+        if now is not None and before:
+            text += f"   baseline {before:>7.0f} {unit}  ({(now / before - 1) * 100:+.0f}%)"
+        print(text)
+
+    base = baseline or {}
+    print(f"Partida a frio — mediana de {summary['runs']} rodada(s), Python {summary['python']}")
+    row("total", summary["total_ms"], base.get("total_ms"))
+    for name, value in summary["phases_ms"].items():
+        row(name, value, base.get("phases_ms", {}).get(name))
+    row("pico de RSS", summary["peak_rss_mb"], base.get("peak_rss_mb"), "MB")
+    print(f"  módulos carregados: {summary['modules']:.0f}")
+
+    print("Pacotes (tempo próprio de importação):")
+    for package, ms in list(summary["packages_ms"].items())[:10]:
+        print(f"  {package:<28}{ms:>8.1f} ms")
+    print("Importações mais lentas (cumulativo):")
+    for item in summary["slowest_imports"]:
+        print(f"  {item['module']:<40}{item['cumulative_ms']:>8.1f} ms  [{item['phase']}]")
+    if baseline:
+        new = [p for p in summary["packages_ms"] if p not in baseline.get("packages_ms", {})]
+        if new:
+            print(f"Pacotes novos em relação à baseline: {', '.join(sorted(new))}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        _child()
+        sys.exit(0)
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Perfil da partida a frio do app VRP (importações, init_db, memória).")
+    parser.add_argument("--runs", type=int, default=3, help="partidas a frio (mediana; padrão 3)")
+    parser.add_argument("--root", default=None, help="raiz VRP a usar (padrão: pasta temporária vazia por rodada)")
+    parser.add_argument("--baseline", default="startup_baseline.json", help="arquivo JSON da baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como nova baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="piora relativa tolerada (padrão 0.20 = +20%%)")
+    parser.add_argument("--min-ms", type=float, default=DEFAULT_MIN_MS, help="piora absoluta mínima em ms (padrão 50)")
+    parser.add_argument("--min-mb", type=float, default=DEFAULT_MIN_MB, help="piora absoluta mínima em MB (padrão 10)")
+    parser.add_argument("--json", dest="json_out", default=None, help="grava o resumo completo neste arquivo")
+    args = parser.parse_args()
+
+    summary = summarize([run_once(args.root) for _ in range(max(1, args.runs))])
+    baseline_path = Path(args.baseline)
+    baseline = None
+    if baseline_path.is_file() and not args.save_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    _print_report(summary, baseline)
+
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Baseline gravada em {baseline_path}")
+        sys.exit(0)
+    if baseline is None:
+        print(f"Sem baseline em {baseline_path} (use --save-baseline); nada a comparar.")
+        sys.exit(0)
+
+    regressions = compare(summary, baseline, args.threshold, args.min_ms, args.min_mb)
+    for line in regressions:
+        print(f"REGRESSÃO {line}")
+    print("OK: dentro do limite da baseline." if not regressions else f"{len(regressions)} regressão(ões).")
+    sys.exit(1 if regressions else 0)
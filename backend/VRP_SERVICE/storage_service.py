@@ -1,93 +1,491 @@
 # file: C:\Users\Novaes Engenharia\github - deploy\VRP\backend\VRP_SERVICE\storage_service.py
 """
 Gerencia fotos:
-- Diretório por VRP: uploads/VRP_{site_id}/CK_{checklist_id}/arquivo.jpg
-- save_photo_bytes(): salva + registra (com vrp_site_id e checklist_id)
-- list_photos(checklist_id), list_photos_by_vrp(vrp_site_id)
-- update_photo_flags(), delete_photo()
+- Armazenamento por conteúdo: uploads/objects/{hash[:2]}/{sha256}.jpg (hash do JPEG normalizado)
+  * a mesma imagem enviada duas vezes (mesmo ou outro checklist) reaproveita o arquivo
+  * referências = linhas de 'photos' com o mesmo content_hash; o arquivo só é apagado com a última
+  * fotos antigas (uploads/VRP_{site_id}/CK_{checklist_id}/) continuam válidas (content_hash NULL)
+- Derivados (thumb/medium/report) em .../_derivados/, registrados em 'photo_derivatives'
+- save_photo_bytes(): salva + gera derivados + registra (com vrp_site_id e checklist_id)
+- save_photos_bulk(): idem para vários arquivos (pool de threads + um executemany/uma transação)
+- list_photos(checklist_id), list_photos_by_vrp(vrp_site_id) (com caminhos dos derivados; read_cache)
+- photo_src(): menor derivado de tela que atende à largura exibida
+- report_images(): variantes de impressão das fotos do relatório (geradas em paralelo quando faltam)
+- update_photo_flags(), delete_photo(), delete_photo_rows() (com contagem de referências;
+  arquivos apagados só após o COMMIT, via unlink_photo_files())
+- backfill_derivatives(): gera derivados para fotos antigas
+- migrate_legacy_photos(): move fotos antigas para o armazenamento por conteúdo
+  (CLI: python -m backend.VRP_SERVICE.storage_service backfill | dedupe)
 """
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any
-from PIL import Image
+from typing import BinaryIO, List, Dict, Any, Callable, Iterable, Optional, Union
 from io import BytesIO
 from uuid import uuid4
 
 from .export_paths import UPLOADS_DIR
-from backend.VRP_DATABASE.database import get_conn
+from .image_service import (
+    DERIVATIVE_SPECS, SCREEN_KINDS, derivative_path, make_derivatives, open_bounded, report_variant_matches
+)
+from .read_cache import cached
+from .report_cache import invalidate_report_cache
+from backend.VRP_DATABASE.database import connection, transaction
 
-def _vrp_ck_dir(vrp_site_id: int, checklist_id: int) -> Path:
-    d = UPLOADS_DIR / f"VRP_{vrp_site_id}" / f"CK_{checklist_id}"
-    d.mkdir(parents=True, exist_ok=True)
-    return d
+# colunas thumb_path, medium_path, report_path anexadas às linhas de 'photos'
+_DERIVATIVE_COLUMNS = ", ".join(
+    f"(SELECT d.file_path FROM photo_derivatives d WHERE d.photo_id = p.id AND d.kind = '{k}') AS {k}_path"
+    for k in DERIVATIVE_SPECS
+)
+
+OBJECTS_DIR = UPLOADS_DIR / "objects"
+
+def _object_path(content_hash: str) -> Path:
+    return OBJECTS_DIR / content_hash[:2] / f"{content_hash}.jpg"
+
+PhotoData = Union[bytes, BinaryIO]
+
+def _as_stream(data: PhotoData) -> BinaryIO:
+    """Bytes ou arquivo (ex.: UploadedFile do Streamlit) -> stream posicionado no início, sem copiar."""
+    stream = BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    stream.seek(0)
+    return stream
+
+def _source_digest(data: PhotoData) -> str:
+    stream = _as_stream(data)
+    h = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+def _normalize(data: PhotoData):
+    """
+    Decodifica com limite de memória (draft/EXIF/MAX_INGEST_SIDE, ver image_service)
+    e regrava como JPEG RGB (q=90): forma canônica usada no hash.
+    Retorna (imagem decodificada, bytes JPEG).
+    """
+    im = open_bounded(_as_stream(data))
+    buf = BytesIO()
+    im.save(buf, "JPEG", quality=90)
+    return im, buf.getvalue()
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid4().hex[:8]}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def _insert_derivatives(conn, photo_id: int, derivs: Dict[str, Dict]):
+    conn.executemany(
+        """INSERT OR REPLACE INTO photo_derivatives (photo_id, kind, file_path, width, height, bytes)
+           VALUES (?,?,?,?,?,?)""",
+        [(photo_id, kind, d["file_path"], d["width"], d["height"], d["bytes"]) for kind, d in derivs.items()],
+    )
+
+def _known_derivatives(conn, content_hash: str) -> Dict[str, Dict]:
+    """Derivados já registrados para o mesmo conteúdo (e ainda presentes no disco)."""
+    rows = conn.execute(
+        """SELECT d.kind, d.file_path, d.width, d.height, d.bytes
+             FROM photo_derivatives d
+             JOIN photos p ON p.id = d.photo_id
+            WHERE p.content_hash = ?""",
+        (content_hash,),
+    ).fetchall()
+    derivs = {r["kind"]: dict(r) for r in rows if Path(r["file_path"]).exists()}
+    return derivs if len(derivs) == len(DERIVATIVE_SPECS) else {}
+
+def _find_by_source(conn, source_hash: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        "SELECT content_hash, file_path FROM photos WHERE source_hash=? AND content_hash IS NOT NULL LIMIT 1",
+        (source_hash,),
+    ).fetchone()
+    if row and Path(row["file_path"]).exists():
+        return dict(row)
+    return None
+
+def _prepare_photo(data: PhotoData) -> Dict[str, Any]:
+    """
+    Etapa pesada do salvamento (hash, decodificação, gravação do objeto, derivados).
+    Não escreve no banco; segura para rodar em paralelo.
+    """
+    source_hash = _source_digest(data)
+    with connection() as conn:
+        known = _find_by_source(conn, source_hash)
+    image = None
+    if known:
+        content_hash = known["content_hash"]
+        p = Path(known["file_path"])
+    else:
+        image, normalized = _normalize(data)
+        content_hash = hashlib.sha256(normalized).hexdigest()
+        p = _object_path(content_hash)
+        if not p.exists():
+            _write_atomic(p, normalized)
+        del normalized
+
+    with connection() as conn:
+        derivs = _known_derivatives(conn, content_hash)
+    if not derivs:
+        derivs = make_derivatives(p, image=image)
+    return {"source_hash": source_hash, "content_hash": content_hash, "file_path": p, "derivs": derivs}
+
+def _insert_prepared(conn, vrp_site_id: int, checklist_id: int, items: List[tuple]) -> List[int]:
+    """
+    Grava (meta, prepared) em 'photos' + 'photo_derivatives' com executemany.
+    Deve rodar em transação IMMEDIATE: serializa com delete_photo() (se a última
+    referência saiu nesse meio-tempo, o objeto é regravado) e garante ids sequenciais.
+    """
+    for meta, prep in items:
+        if not prep["file_path"].exists():
+            image, normalized = _normalize(meta["data"])
+            _write_atomic(prep["file_path"], normalized)
+            prep["derivs"] = make_derivatives(prep["file_path"], image=image)
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM photos").fetchone()[0]
+    conn.executemany(
+        """INSERT INTO photos (vrp_site_id, checklist_id, label, file_path, caption, include_in_report, display_order,
+                               content_hash, source_hash)
+           VALUES (?,?,?,?,?,?,?,?,?)""",
+        [
+            (vrp_site_id, checklist_id, meta["label"], str(prep["file_path"]), meta["caption"],
+             int(meta["include"]), meta["order"], prep["content_hash"], prep["source_hash"])
+            for meta, prep in items
+        ],
+    )
+    ids = [r["id"] for r in conn.execute("SELECT id FROM photos WHERE id > ? ORDER BY id", (last_id,))]
+    conn.executemany(
+        """INSERT OR REPLACE INTO photo_derivatives (photo_id, kind, file_path, width, height, bytes)
+           VALUES (?,?,?,?,?,?)""",
+        [
+            (photo_id, kind, d["file_path"], d["width"], d["height"], d["bytes"])
+            for photo_id, (_meta, prep) in zip(ids, items)
+            for kind, d in prep["derivs"].items()
+        ],
+    )
+    invalidate_report_cache(conn, [checklist_id])
+    return ids
 
 def save_photo_bytes(
     vrp_site_id: int,
     checklist_id: int,
     original_name: str,
-    data: bytes,
+    data: PhotoData,
     label: str,
     caption: str,
     include: bool,
     order: int = 1,
 ) -> str:
-    """Salva bytes como JPG único e grava em 'photos'. Retorna caminho salvo."""
-    folder = _vrp_ck_dir(vrp_site_id, checklist_id)
-    # nome único: ordem_label_uuid.jpg
-    base = f"{order:03d}_{uuid4().hex[:8]}.jpg"
-    p = folder / base
-    Image.open(BytesIO(data)).convert("RGB").save(p, "JPEG", quality=90)
-
-    conn = get_conn()
-    conn.execute(
-        """INSERT INTO photos (vrp_site_id, checklist_id, label, file_path, caption, include_in_report, display_order)
-           VALUES (?,?,?,?,?,?,?)""",
-        (vrp_site_id, checklist_id, label, str(p), caption, int(include), order),
-    )
-    conn.commit(); conn.close()
-    return str(p)
+    """
+    Salva a foto no armazenamento por conteúdo e grava em 'photos'. Retorna caminho salvo.
+    Reenvio do mesmo arquivo (source_hash conhecido) não decodifica nem grava nada no disco.
+    """
+    prep = _prepare_photo(data)
+    meta = dict(data=data, label=label, caption=caption, include=include, order=order)
+    with transaction(immediate=True) as conn:
+        _insert_prepared(conn, vrp_site_id, checklist_id, [(meta, prep)])
+    return str(prep["file_path"])
 
-def list_photos(checklist_id: int) -> List[Dict[str, Any]]:
-    conn = get_conn()
-    cur = conn.execute(
-        "SELECT * FROM photos WHERE checklist_id=? ORDER BY display_order, id",
-        (checklist_id,),
-    )
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+def save_photos_bulk(
+    vrp_site_id: int,
+    checklist_id: int,
+    items: List[Dict[str, Any]],
+    progress: Optional[Callable[[int, int], None]] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Salva várias fotos de uma vez.
+    items: dicts com original_name, data (bytes ou arquivo), label, caption, include, order.
+    Decodificação/gravação rodam em um pool de threads (PIL libera o GIL);
+    todas as linhas entram com um executemany em uma única transação.
+    progress(feitos, total) é chamado na thread de quem chamou (seguro para Streamlit).
+    Retorna {"saved": [caminhos], "failed": [(nome, erro)]}.
+    """
+    summary: Dict[str, Any] = {"saved": [], "failed": []}
+    total = len(items)
+    if not total:
+        return summary
+    workers = max_workers or min(4, os.cpu_count() or 1, total)
+    results: Dict[int, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_prepare_photo, it["data"]): i for i, it in enumerate(items)}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            i = futures[fut]
+            try:
+                results[i] = fut.result()
+            except Exception as e:
+                summary["failed"].append((items[i].get("original_name", ""), str(e)))
+            if progress:
+                progress(done, total)
 
-def list_photos_by_vrp(vrp_site_id: int) -> List[Dict[str, Any]]:
-    conn = get_conn()
-    cur = conn.execute(
-        "SELECT * FROM photos WHERE vrp_site_id=? ORDER BY checklist_id, display_order, id",
-        (vrp_site_id,),
-    )
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
+    # mantém a ordem de envio (ids crescentes na mesma ordem dos arquivos)
+    prepared = [(items[i], results[i]) for i in sorted(results)]
+    if prepared:
+        with transaction(immediate=True) as conn:
+            _insert_prepared(conn, vrp_site_id, checklist_id, prepared)
+    summary["saved"] = [str(prep["file_path"]) for _meta, prep in prepared]
+    return summary
 
-def update_photo_flags(photo_id: int, include: bool, order: int, caption: str, label: str | None = None):
-    conn = get_conn()
-    if label is None:
-        conn.execute(
-            "UPDATE photos SET include_in_report=?, display_order=?, caption=? WHERE id=?",
-            (int(include), order, caption, photo_id),
+@cached("photos", "photo_derivatives")
+def list_photos(checklist_id: int) -> List[Dict[str, Any]]:
+    with connection() as conn:
+        cur = conn.execute(
+            f"SELECT p.*, {_DERIVATIVE_COLUMNS} FROM photos p WHERE p.checklist_id=? ORDER BY p.display_order, p.id",
+            (checklist_id,),
         )
-    else:
-        conn.execute(
-            "UPDATE photos SET include_in_report=?, display_order=?, caption=?, label=? WHERE id=?",
-            (int(include), order, caption, label, photo_id),
+        return [dict(r) for r in cur.fetchall()]
+
+@cached("photos", "photo_derivatives")
+def list_photos_by_vrp(vrp_site_id: int) -> List[Dict[str, Any]]:
+    with connection() as conn:
+        cur = conn.execute(
+            f"SELECT p.*, {_DERIVATIVE_COLUMNS} FROM photos p WHERE p.vrp_site_id=? ORDER BY p.checklist_id, p.display_order, p.id",
+            (vrp_site_id,),
         )
-    conn.commit(); conn.close()
+        return [dict(r) for r in cur.fetchall()]
 
-def delete_photo(photo_id: int):
-    """Remove do disco e do banco."""
-    conn = get_conn()
-    row = conn.execute("SELECT file_path FROM photos WHERE id=?", (photo_id,)).fetchone()
-    if row:
+def photo_src(photo: Dict[str, Any], min_side: int) -> str:
+    """Menor derivado de tela com lado >= min_side (px); cai para o original se não houver."""
+    for kind in sorted(SCREEN_KINDS, key=lambda k: DERIVATIVE_SPECS[k][0]):
+        max_side = DERIVATIVE_SPECS[kind][0]
+        path = photo.get(f"{kind}_path")
+        if path and max_side >= min_side and Path(path).exists():
+            return path
+    return photo["file_path"]
+
+def report_images(photos: List[Dict[str, Any]], max_workers: Optional[int] = None) -> tuple[Dict[int, str], Dict[str, int]]:
+    """
+    Caminho da variante de impressão ("report") de cada foto, por id.
+    Variantes ausentes ou feitas para outro DPI (ou no esquema antigo de 1600 px)
+    são geradas em paralelo e registradas em 'photo_derivatives'.
+    Retorna ({photo_id: caminho}, {"original_bytes", "embedded_bytes"}).
+    """
+    ids = [p["id"] for p in photos if p.get("id") is not None]
+    current: Dict[int, Dict[str, Any]] = {}
+    if ids:
+        marks = ",".join("?" * len(ids))
+        with connection() as conn:
+            for r in conn.execute(
+                f"SELECT photo_id, file_path, width, height, bytes FROM photo_derivatives WHERE kind='report' AND photo_id IN ({marks})",
+                ids,
+            ):
+                current[r["photo_id"]] = dict(r)
+
+    def _ensure(photo: Dict[str, Any]) -> tuple[int, Optional[Dict[str, Any]]]:
+        src = Path(photo["file_path"])
+        d = current.get(photo["id"])
+        if d and Path(d["file_path"]).is_file() and report_variant_matches(src, d["width"], d["height"]):
+            return photo["id"], d
+        if not src.is_file():
+            return photo["id"], None
         try:
-            Path(row["file_path"]).unlink(missing_ok=True)
+            return photo["id"], make_derivatives(src, kinds=["report"])["report"]
         except Exception:
+            return photo["id"], None
+
+    todo = [p for p in photos if p.get("id") is not None and p.get("file_path")]
+    workers = max_workers or min(4, os.cpu_count() or 1, max(1, len(todo)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(pool.map(_ensure, todo))
+
+    fresh = {pid: d for pid, d in results.items() if d and current.get(pid) != d}
+    if fresh:
+        with transaction() as conn:
+            for pid, d in fresh.items():
+                _insert_derivatives(conn, pid, {"report": d})
+
+    paths: Dict[int, str] = {}
+    stats = {"original_bytes": 0, "embedded_bytes": 0}
+    for p in todo:
+        d = results.get(p["id"])
+        path = d["file_path"] if d else p["file_path"]
+        paths[p["id"]] = path
+        try:
+            stats["original_bytes"] += Path(p["file_path"]).stat().st_size
+            stats["embedded_bytes"] += Path(path).stat().st_size
+        except OSError:
             pass
-    conn.execute("DELETE FROM photos WHERE id=?", (photo_id,))
-    conn.commit(); conn.close()
+    return paths, stats
+
+def update_photo_flags(photo_id: int, include: bool, order: int, caption: str, label: str | None = None):
+    with transaction() as conn:
+        row = conn.execute("SELECT checklist_id FROM photos WHERE id=?", (photo_id,)).fetchone()
+        if row:
+            invalidate_report_cache(conn, [row["checklist_id"]])
+        if label is None:
+            conn.execute(
+                "UPDATE photos SET include_in_report=?, display_order=?, caption=? WHERE id=?",
+                (int(include), order, caption, photo_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE photos SET include_in_report=?, display_order=?, caption=?, label=? WHERE id=?",
+                (int(include), order, caption, label, photo_id),
+            )
+
+def _unlink(path: str) -> bool:
+    try:
+        p = Path(path)
+        if p.is_file():
+            p.unlink(missing_ok=True)
+            return True
+    except Exception:
+        pass
+    return False
+
+def delete_photo_rows(conn, photo_ids: Iterable[int]) -> List[List[str]]:
+    """
+    Exclui as linhas de 'photos' (na transação do chamador) e devolve os arquivos a apagar:
+    um grupo [original, *derivados] por conteúdo que ficou sem referência.
+    Nada é apagado aqui: o chamador chama unlink_photo_files() depois do COMMIT
+    (num ROLLBACK as linhas voltam e os arquivos continuam no disco).
+    """
+    photo_ids = list(photo_ids)
+    if not photo_ids:
+        return []
+    marks = ",".join("?" * len(photo_ids))
+    rows = conn.execute(
+        f"SELECT id, checklist_id, file_path, content_hash FROM photos WHERE id IN ({marks})", photo_ids
+    ).fetchall()
+    invalidate_report_cache(conn, [r["checklist_id"] for r in rows])
+    derivs = conn.execute(
+        f"SELECT photo_id, file_path FROM photo_derivatives WHERE photo_id IN ({marks})", photo_ids
+    ).fetchall()
+    conn.execute(f"DELETE FROM photos WHERE id IN ({marks})", photo_ids)
+
+    deriv_paths: Dict[int, List[str]] = {}
+    for d in derivs:
+        deriv_paths.setdefault(d["photo_id"], []).append(d["file_path"])
+
+    groups, seen = [], set()
+    for r in rows:
+        h = r["content_hash"]
+        if h:
+            if h in seen:
+                continue
+            seen.add(h)
+            still_used = conn.execute(
+                "SELECT 1 FROM photos WHERE content_hash=? LIMIT 1", (h,)
+            ).fetchone()
+            if still_used:
+                continue
+            groups.append([r["file_path"]] + [str(derivative_path(r["file_path"], k)) for k in DERIVATIVE_SPECS])
+        else:
+            # foto antiga: arquivo exclusivo da linha
+            groups.append([r["file_path"]] + deriv_paths.get(r["id"], []))
+    return groups
+
+def unlink_photo_files(groups: Iterable[List[str]]) -> int:
+    """Apaga os grupos devolvidos por delete_photo_rows(); retorna quantos originais saíram do disco."""
+    removed = 0
+    for paths in groups:
+        if _unlink(paths[0]):
+            removed += 1
+        for extra in paths[1:]:
+            _unlink(extra)
+    return removed
+
+def delete_photo(photo_id: int):
+    """Remove do banco; o arquivo só sai do disco quando for a última referência (após o COMMIT)."""
+    with transaction(immediate=True) as conn:
+        groups = delete_photo_rows(conn, [photo_id])
+    unlink_photo_files(groups)
+
+def backfill_derivatives(
+    force: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Gera derivados faltantes para fotos já salvas em UPLOADS_DIR.
+    force=True regenera todos. Retorna contagens {total, generated, missing_file, failed}.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT p.id, p.file_path, (SELECT COUNT(*) FROM photo_derivatives d WHERE d.photo_id = p.id) AS n FROM photos p ORDER BY p.id"
+        ).fetchall()
+    todo = [r for r in rows if force or r["n"] < len(DERIVATIVE_SPECS)]
+    summary = {"total": len(todo), "generated": 0, "missing_file": 0, "failed": 0}
+    for i, r in enumerate(todo, start=1):
+        src = Path(r["file_path"])
+        if not src.is_file():
+            summary["missing_file"] += 1
+        else:
+            try:
+                derivs = make_derivatives(src)
+                with transaction() as conn:
+                    _insert_derivatives(conn, r["id"], derivs)
+                summary["generated"] += 1
+            except Exception:
+                summary["failed"] += 1
+        if progress:
+            progress(i, len(todo))
+    return summary
+
+
+def migrate_legacy_photos(progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """
+    Move fotos antigas (sem content_hash) para o armazenamento por conteúdo,
+    unificando duplicatas. Retorna contagens {total, moved, deduplicated, missing_file}.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT id, file_path FROM photos WHERE content_hash IS NULL ORDER BY id"
+        ).fetchall()
+    summary = {"total": len(rows), "moved": 0, "deduplicated": 0, "missing_file": 0}
+    for i, r in enumerate(rows, start=1):
+        src = Path(r["file_path"])
+        if not src.is_file():
+            summary["missing_file"] += 1
+        else:
+            # arquivos antigos já foram gravados normalizados (JPEG RGB q=90)
+            data = src.read_bytes()
+            content_hash = hashlib.sha256(data).hexdigest()
+            dst = _object_path(content_hash)
+            # cópia primeiro: o original só sai do disco depois do COMMIT
+            # (num ROLLBACK a linha continua apontando para src, que segue lá)
+            if not dst.exists():
+                _write_atomic(dst, data)
+            with transaction(immediate=True) as conn:
+                duplicate = conn.execute(
+                    "SELECT 1 FROM photos WHERE content_hash=? LIMIT 1", (content_hash,)
+                ).fetchone() is not None
+                old_derivs = conn.execute(
+                    "SELECT file_path FROM photo_derivatives WHERE photo_id=?", (r["id"],)
+                ).fetchall()
+                conn.execute("DELETE FROM photo_derivatives WHERE photo_id=?", (r["id"],))
+                conn.execute(
+                    "UPDATE photos SET file_path=?, content_hash=? WHERE id=?",
+                    (str(dst), content_hash, r["id"]),
+                )
+                derivs = _known_derivatives(conn, content_hash) or make_derivatives(dst)
+                _insert_derivatives(conn, r["id"], derivs)
+            unlink_photo_files([[str(src)] + [d["file_path"] for d in old_derivs]])
+            summary["deduplicated" if duplicate else "moved"] += 1
+        if progress:
+            progress(i, len(rows))
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    from backend.VRP_DATABASE.database import init_db
+
+    parser = argparse.ArgumentParser(description="Manutenção do acervo de fotos.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bf = sub.add_parser("backfill", help=f"gera derivados ({', '.join(DERIVATIVE_SPECS)}) para fotos existentes")
+    bf.add_argument("--force", action="store_true", help="regenera mesmo os derivados já existentes")
+    sub.add_parser("dedupe", help="move fotos antigas para o armazenamento por conteúdo (sem duplicatas)")
+    args = parser.parse_args()
+
+    init_db()
+    if args.cmd == "backfill":
+        res = backfill_derivatives(
+            force=args.force,
+            progress=lambda i, n: print(f"\r{i}/{n}", end="", flush=True),
+        )
+        print(f"\nFotos: {res['total']} • geradas: {res['generated']} • "
+              f"arquivo ausente: {res['missing_file']} • falhas: {res['failed']}")
+    elif args.cmd == "dedupe":
+        res = migrate_legacy_photos(progress=lambda i, n: print(f"\r{i}/{n}", end="", flush=True))
+        print(f"\nFotos: {res['total']} • movidas: {res['moved']} • "
+              f"duplicadas unificadas: {res['deduplicated']} • arquivo ausente: {res['missing_file']}")
@@ -5,8 +5,9 @@ Guarda o checklist_id em st.session_state['current_checklist_id'].
 """
 import streamlit as st
 from datetime import date as _date
-from backend.VRP_DATABASE.database import get_conn
+from backend.VRP_DATABASE.database import transaction
 from backend.VRP_MODEL.schemas import VRPSite, Checklist, DMC_LOCATIONS
+from backend.VRP_SERVICE.site_service import nearest_sites
 from frontend.VRP_STYLES.layout import (
     page_setup, app_header, toolbar, section_card, two_col, three_col, pill
 )
@@ -14,39 +15,34 @@ from frontend.VRP_STYLES.layout import (
 SERVICE_TYPES = ['Manutenção Preventiva','Manutenção Preditiva','Manutenção Corretiva','Ajuste e Aferição']
 VRP_TYPES = ['Ação Direta','Auto-Regulada','Pilotada']
 DNs = [50,60,85,100,150,200,250,300,350]
+NEARBY_RADIUS_M = 150  # VRPs já cadastradas até essa distância são sugeridas
 
 def _insert_vrp_site(site: VRPSite) -> int:
-    conn = get_conn()
-    cur = conn.execute("""
-        INSERT INTO vrp_sites (
-            municipality, city, place, brand, type, dn, access_install, traffic, lids, notes_access,
-            latitude, longitude, network_depth_cm, has_automation
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-    """, (
-        site.municipality, site.city, site.place, site.brand, site.type, site.dn, 
-        site.access_install, site.traffic, site.lids, site.notes_access,
-        site.latitude, site.longitude, site.network_depth_cm, int(site.has_automation)
-    ))
-    conn.commit()
-    site_id = cur.lastrowid
-    conn.close()
-    return site_id
+    with transaction() as conn:
+        cur = conn.execute("""
+            INSERT INTO vrp_sites (
+                municipality, city, place, brand, type, dn, access_install, traffic, lids, notes_access,
+                latitude, longitude, network_depth_cm, has_automation
+            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """, (
+            site.municipality, site.city, site.place, site.brand, site.type, site.dn, 
+            site.access_install, site.traffic, site.lids, site.notes_access,
+            site.latitude, site.longitude, site.network_depth_cm, int(site.has_automation)
+        ))
+        return cur.lastrowid
 
 def _insert_checklist(ck: Checklist) -> int:
-    conn = get_conn()
-    cur = conn.execute("""
-        INSERT INTO checklists (
-            date, service_type, contractor_id, contracted_id, team_id, vrp_site_id,
-            has_reg_upstream, has_reg_downstream, has_bypass, notes_hydraulics,
-            p_up_before, p_down_before, p_up_after, p_down_after, observations_general
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-    """, (ck.date, ck.service_type, ck.contractor_id, ck.contracted_id, ck.team_id, ck.vrp_site_id,
-          int(ck.has_reg_upstream), int(ck.has_reg_downstream), int(ck.has_bypass), ck.notes_hydraulics,
-          ck.p_up_before, ck.p_down_before, ck.p_up_after, ck.p_down_after, ck.observations_general))
-    conn.commit()
-    cid = cur.lastrowid
-    conn.close()
-    return cid
+    with transaction() as conn:
+        cur = conn.execute("""
+            INSERT INTO checklists (
+                date, service_type, contractor_id, contracted_id, team_id, vrp_site_id,
+                has_reg_upstream, has_reg_downstream, has_bypass, notes_hydraulics,
+                p_up_before, p_down_before, p_up_after, p_down_after, observations_general
+            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """, (ck.date, ck.service_type, ck.contractor_id, ck.contracted_id, ck.team_id, ck.vrp_site_id,
+              int(ck.has_reg_upstream), int(ck.has_reg_downstream), int(ck.has_bypass), ck.notes_hydraulics,
+              ck.p_up_before, ck.p_down_before, ck.p_up_after, ck.p_down_after, ck.observations_general))
+        return cur.lastrowid
 
 def _required_ok(municipality, city, place, date_str, service_type, brand):
     if not municipality:
@@ -170,6 +166,23 @@ def render():
                     help="Longitude em graus decimais (-180 a 180)"
                 )
             
+            # VRP já cadastrada no mesmo ponto: reaproveita o cadastro em vez de duplicar
+            existing_site_id = None
+            if latitude is not None and longitude is not None:
+                nearby = nearest_sites(latitude, longitude, n=3, max_radius_m=NEARBY_RADIUS_M)
+                if nearby:
+                    options = {None: "Cadastrar nova VRP com os dados acima"}
+                    for near in nearby:
+                        options[near["id"]] = (
+                            f"VRP #{near['id']} - {near['city']} / {near['place'] or 'sem complemento'} "
+                            f"({near['type']}, DN {near['dn']}) a {near['distance_m']:.0f} m"
+                        )
+                    existing_site_id = st.radio(
+                        f"📍 VRP(s) já cadastrada(s) a até {NEARBY_RADIUS_M} m deste ponto",
+                        list(options), format_func=options.get,
+                        help="Escolha uma VRP existente para registrar este checklist nela.",
+                    )
+
             # Botão para abrir Google Maps
             if st.button("📍 Abrir Google Maps para obter coordenadas"):
                 st.markdown(f"""
@@ -217,26 +230,28 @@ def render():
             st.stop()
 
         # salva empresas e equipe como 'free text'
-        conn = get_conn()
         contractor_id = contracted_id = team_id = None
-        if contractor:
-            conn.execute("INSERT INTO companies (name,type) VALUES (?,?)",(contractor,'CONTRATANTE'))
-            contractor_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
-        if contracted:
-            conn.execute("INSERT INTO companies (name,type) VALUES (?,?)",(contracted,'CONTRATADA'))
-            contracted_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
-        if team:
-            conn.execute("INSERT INTO teams (name) VALUES (?)",(team,))
-            team_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
-        conn.commit(); conn.close()
-
-        site = VRPSite(
-            municipality=municipality, city=city, place=place, brand=brand, type=vtype, dn=dn,
-            access_install=access_install, traffic=traffic, lids=lids, notes_access=notes_access,
-            latitude=latitude, longitude=longitude, network_depth_cm=network_depth_cm, 
-            has_automation=has_automation
-        )
-        site_id = _insert_vrp_site(site)
+        with transaction() as conn:
+            if contractor:
+                conn.execute("INSERT INTO companies (name,type) VALUES (?,?)",(contractor,'CONTRATANTE'))
+                contractor_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            if contracted:
+                conn.execute("INSERT INTO companies (name,type) VALUES (?,?)",(contracted,'CONTRATADA'))
+                contracted_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            if team:
+                conn.execute("INSERT INTO teams (name) VALUES (?)",(team,))
+                team_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+        if existing_site_id is not None:
+            site_id = existing_site_id
+        else:
+            site = VRPSite(
+                municipality=municipality, city=city, place=place, brand=brand, type=vtype, dn=dn,
+                access_install=access_install, traffic=traffic, lids=lids, notes_access=notes_access,
+                latitude=latitude, longitude=longitude, network_depth_cm=network_depth_cm, 
+                has_automation=has_automation
+            )
+            site_id = _insert_vrp_site(site)
 
         ck = Checklist(
             date=date, service_type=service_type, contractor_id=contractor_id, contracted_id=contracted_id,
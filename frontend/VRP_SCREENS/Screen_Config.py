@@ -3,7 +3,13 @@ Tela de Configurações: mostra caminhos e flags simples.
 """
 import streamlit as st
 from backend.VRP_SERVICE.export_paths import DB_PATH, UPLOADS_DIR, EXPORTS_DIR
+from backend.VRP_DATABASE.database import connection_stats
+from backend.VRP_SERVICE.ai_cache import ai_cache_stats
+from backend.VRP_SERVICE.llm_client import llm_metrics
+from backend.VRP_SERVICE.pdf_service import pdf_stats
+from backend.VRP_SERVICE.read_cache import read_cache_stats
 from backend.VRP_SERVICE.email_service import email_service
+from frontend.VRP_SCREENS.page_registry import PAGE_MODULES, import_timings
 from frontend.VRP_STYLES.layout import page_setup, app_header, section_card, pill
 
 def render():
@@ -15,10 +21,58 @@ def render():
         st.code(f"Uploads: {UPLOADS_DIR}")
         st.code(f"Exports: {EXPORTS_DIR}")
 
+    with section_card("Banco de dados", "Pool de conexões SQLite deste processo."):
+        stats = connection_stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Conexões abertas", stats["opened"])
+        c2.metric("Reaproveitadas", stats["reused"])
+        c3.metric("Ociosas no pool", stats["idle"])
+        rc = read_cache_stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Leituras do cache", rc["hits"])
+        c2.metric("Idas ao banco", rc["misses"])
+        c3.metric("Releituras de versão", rc["version_reads"])
+        c4.metric("Entradas", f"{rc['entries']}/{rc['max']}")
+
+    with section_card("Telas carregadas", "Cada tela é importada na primeira vez que é aberta neste processo."):
+        timings = import_timings()
+        lines = ["| Tela | Importação |", "|---|---:|"]
+        lines += [f"| {name} | {f'{timings[name]:.0f} ms' if name in timings else '—'} |" for name in PAGE_MODULES]
+        st.markdown("\n".join(lines))
+        pill(f"{len(timings)}/{len(PAGE_MODULES)} telas • {sum(timings.values()):.0f} ms no total")
+
+    with section_card("Conversão PDF", "Backend definido por VRP_PDF_BACKEND no .env."):
+        pdf = pdf_stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Backend", pdf["backend"] + (f" ({pdf['mode']})" if pdf["mode"] else ""))
+        c2.metric("Conversões", int(pdf["count"]), delta=f"{int(pdf['failures'])} falhas" if pdf["failures"] else None,
+                  delta_color="inverse")
+        c3.metric("Média", f"{pdf['avg_ms'] / 1000:.1f} s")
+        c4.metric("Máxima", f"{pdf['max_ms'] / 1000:.1f} s")
+        if pdf["mode"] == "cli":
+            st.caption("Sem python3-uno: cada conversão inicia o LibreOffice (sem processo aquecido).")
+
     with section_card("IA / Ambiente"):
         st.info("As chaves da IA são lidas do arquivo **.env** na raiz do projeto.")
         pill("GROQ", "success")
         st.caption("Modelo padrão: llama-3.3-70b-versatile (configurado no serviço de IA).")
+        llm = llm_metrics()
+        breaker = {"closed": ("Fechado", "success"), "half_open": ("Em teste", "warning"),
+                   "open": (f"Aberto ({llm['breaker_remaining_s']:.0f}s)", "danger")}[llm["breaker"]]
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Chamadas à IA", llm["calls"])
+        c2.metric("Erros", llm["errors"], delta=f"{llm['rejected']} recusadas" if llm["rejected"] else None,
+                  delta_color="off")
+        c3.metric("Latência média", f"{llm['avg_ms'] / 1000:.1f} s")
+        c4.metric("p95", f"{llm['p95_ms'] / 1000:.1f} s")
+        pill(f"Disjuntor: {breaker[0]}", breaker[1])
+        if llm["last_error"]:
+            st.caption(f"Último erro: {llm['last_error']}")
+        cache = ai_cache_stats()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Cache: acertos", cache["hits"])
+        c2.metric("Cache: faltas", cache["misses"])
+        c3.metric("Narrativas em cache", cache["entries"])
 
     # Configurações de Email
     with section_card("📧 Configurações de Email"):
@@ -1,21 +1,26 @@
 """
 Galeria por VRP: escolha a VRP e veja todas as imagens associadas (qualquer checklist).
 UI padronizada com header/logo, cards e paleta.
+Lista de VRPs e fotos vêm do read_cache (só vão ao banco após alguma escrita).
 """
 import streamlit as st
-from backend.VRP_DATABASE.database import get_conn
-from backend.VRP_SERVICE.storage_service import list_photos_by_vrp
+from backend.VRP_DATABASE.database import connection
+from backend.VRP_SERVICE.read_cache import cached
+from backend.VRP_SERVICE.storage_service import list_photos_by_vrp, photo_src
 from frontend.VRP_STYLES.layout import page_setup, app_header, section_card, pill
 
+@cached("vrp_sites")
+def _list_sites() -> list:
+    # Busca VRPs e converte para tipos nativos (dict)
+    with connection() as conn:
+        rows = conn.execute("SELECT id, place, city, brand, dn FROM vrp_sites ORDER BY id DESC").fetchall()
+    return [dict(r) for r in rows]
+
 def render():
     page_setup("VRP • Galeria", icon="🖼️")
     app_header("Galeria por VRP", "Visualize as imagens anexadas por VRP.")
 
-    # Busca VRPs e converte para tipos nativos (dict)
-    conn = get_conn()
-    rows = conn.execute("SELECT id, place, city, brand, dn FROM vrp_sites ORDER BY id DESC").fetchall()
-    conn.close()
-    sites = [dict(r) for r in rows]
+    sites = _list_sites()
 
     if not sites:
         st.info("Sem VRPs cadastradas.")
@@ -26,9 +31,9 @@ def render():
 
     with section_card("Filtro"):
         sel_id = st.selectbox("Selecione a VRP", options=id_options, format_func=lambda _id: labels.get(_id, f"VRP #{_id}"))
-        pill(f"Total: {len(list_photos_by_vrp(sel_id))} imagens")
+        fotos = list_photos_by_vrp(sel_id)
+        pill(f"Total: {len(fotos)} imagens")
 
-    fotos = list_photos_by_vrp(sel_id)
     if not fotos:
         st.info("Esta VRP não possui imagens.")
         return
@@ -37,4 +42,4 @@ def render():
         cols = st.columns(3)
         for i, r in enumerate(fotos):
             with cols[i % 3]:
-                st.image(r["file_path"], use_container_width=True, caption=f"CK {r['checklist_id']} • {r['label']}")
+                st.image(photo_src(r, 480), use_container_width=True, caption=f"CK {r['checklist_id']} • {r['label']}")
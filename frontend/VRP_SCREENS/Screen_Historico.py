@@ -1,32 +1,133 @@
 """
 Lista checklists, permite selecionar um como 'corrente' e EXCLUIR com limpeza de arquivos.
 UI padronizada (header, cards, etc).
+Páginas por cursor (date, id) e filtros no SQL (history_service.list_checklists);
+os controles de exclusão só são montados para o checklist escolhido.
+Busca textual (search_service, FTS5) nas observações, com atalho para o checklist ou a foto.
 """
 import streamlit as st
-from backend.VRP_DATABASE.database import get_conn
-from backend.VRP_SERVICE.history_service import delete_checklist
+from datetime import date as _date
+from backend.VRP_SERVICE.history_service import count_checklists, delete_checklist, list_checklists
+from backend.VRP_SERVICE.search_service import search
+from backend.VRP_SERVICE.site_service import site_facets
 from frontend.VRP_STYLES.layout import page_setup, app_header, section_card, pill
 
+SERVICE_TYPES = ['Manutenção Preventiva','Manutenção Preditiva','Manutenção Corretiva','Ajuste e Aferição']
+PAGE_SIZES = [10, 25, 50]
+
+def _filters() -> dict:
+    """Card de filtros; devolve o dicionário aceito por list_checklists."""
+    with section_card("Filtros"):
+        c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
+        period = c1.date_input("Período", value=(), format="DD/MM/YYYY", key="hist_period")
+        service_type = c2.selectbox("Tipo de serviço", [None] + SERVICE_TYPES, key="hist_service",
+                                    format_func=lambda v: "Todos" if v is None else v)
+        municipalities = [m for m, _ in site_facets(located=False)["municipality"]]
+        municipality = c3.selectbox("Município", [None] + municipalities, key="hist_municipality",
+                                    format_func=lambda v: "Todos" if v is None else v)
+        site_id = c4.number_input("VRP #", min_value=0, step=1, value=0, key="hist_site",
+                                  help="0 = todas")
+    period = tuple(period) if isinstance(period, (list, tuple)) else (period,)
+    return {
+        "date_from": period[0].isoformat() if len(period) >= 1 and isinstance(period[0], _date) else None,
+        "date_to": period[1].isoformat() if len(period) == 2 else None,
+        "service_type": service_type,
+        "municipality": municipality,
+        "vrp_site_id": int(site_id) or None,
+    }
+
+_KIND_LABELS = {"checklist": "📝 Checklist", "site": "📍 VRP", "photo": "📷 Foto"}
+
+def _search_card():
+    """Busca nas observações de checklists, VRPs e fotos; abre o checklist ou a foto encontrada."""
+    with section_card("Buscar", "Observações hidráulicas/gerais, acesso da VRP, rótulos e observações das fotos."):
+        text = st.text_input("Buscar", placeholder="Ex.: piloto vazando", key="hist_search",
+                             label_visibility="collapsed")
+        if not text.strip():
+            return
+        hits = search(text)
+        if not hits:
+            st.info("Nenhum resultado.")
+            return
+        for h in hits:
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                ref = f"#{h['ref_id']}" + (f" • Checklist #{h['checklist_id']}" if h["kind"] != "checklist" else "")
+                st.markdown(f"{_KIND_LABELS[h['kind']]} {ref} — {h['snippet']}")
+                st.caption(f"{h['date'] or 'sem checklist'} • {h['place'] or '—'} – {h['municipality']} ({h['city']})")
+            with col2:
+                label = "Ver foto" if h["kind"] == "photo" else "Abrir"
+                if st.button(label, key=f"hit_{h['kind']}_{h['ref_id']}", disabled=h["checklist_id"] is None):
+                    st.session_state["current_checklist_id"] = h["checklist_id"]
+                    if h["kind"] == "photo":
+                        st.session_state["focus_photo_id"] = h["ref_id"]
+                        st.session_state["nav_to"] = "Fotos"
+                    else:
+                        st.session_state["nav_to"] = "Relatório"
+                    st.rerun()
+
+def _delete_panel(cid: int):
+    """Confirmação de exclusão (montada só para o checklist escolhido)."""
+    with section_card(f"Excluir checklist #{cid}"):
+        st.warning("⚠️ Remove checklist, fotos e relatórios gerados (DOCX/PDF).")
+        confirm = st.checkbox(f"Confirmo excluir o checklist #{cid}", key=f"conf_{cid}")
+        del_orphan_vrp = st.checkbox("Excluir também a VRP se ficar sem checklists", key=f"vrp_{cid}")
+        c1, c2 = st.columns(2)
+        if c2.button("Cancelar", key=f"cancel_{cid}"):
+            st.session_state.pop("hist_delete_id", None)
+            st.rerun()
+        if c1.button("Excluir definitivamente", key=f"del_{cid}", type="secondary", disabled=not confirm):
+            res = delete_checklist(cid, delete_vrp_if_orphan=del_orphan_vrp)
+            if res["ok"]:
+                st.session_state.pop("hist_delete_id", None)
+                st.session_state["hist_flash"] = (
+                    f"Checklist #{cid} excluído. "
+                    f"Arquivos removidos: {res['files_deleted']}. "
+                    f"Exports apagados: {res['exports_deleted']}. "
+                    f"VRP apagada: {res['vrp_deleted']}."
+                )
+                st.rerun()
+            else:
+                st.error(f"Falha ao excluir: {res.get('reason','Erro desconhecido')}")
+
 def render():
     page_setup("VRP • Histórico", icon="🧾")
     app_header("Histórico de Checklists", "Selecione um checklist para gerar relatório ou exclua registros.")
 
-    conn = get_conn()
-    rows = conn.execute("""
-        SELECT c.id, c.date, c.service_type, c.vrp_site_id, vs.municipality, vs.city, vs.place, vs.brand, vs.dn
-        FROM checklists c
-        LEFT JOIN vrp_sites vs ON vs.id = c.vrp_site_id
-        ORDER BY c.id DESC
-    """).fetchall()
-    conn.close()
+    if "hist_flash" in st.session_state:
+        st.success(st.session_state.pop("hist_flash"))
+
+    _search_card()
+    filters = _filters()
+    page_size = st.session_state.get("hist_page_size", PAGE_SIZES[1])
+
+    # cursores das páginas já visitadas; filtros novos -> volta à primeira página
+    signature = (tuple(sorted(filters.items())), page_size)
+    if st.session_state.get("hist_signature") != signature:
+        st.session_state["hist_signature"] = signature
+        st.session_state["hist_cursors"] = [None]
+    cursors = st.session_state["hist_cursors"]
+
+    rows, next_cursor = list_checklists(filters, after=cursors[-1], page_size=page_size)
+    if not rows and len(cursors) > 1:
+        # página esvaziada (ex.: exclusão do último item): volta uma
+        cursors.pop()
+        rows, next_cursor = list_checklists(filters, after=cursors[-1], page_size=page_size)
 
     if not rows:
         st.info("Sem registros.")
         return
 
+    delete_id = st.session_state.get("hist_delete_id")
+    if delete_id is not None:
+        _delete_panel(delete_id)
+
     with section_card("Registros"):
+        total = count_checklists(filters)
+        first = (len(cursors) - 1) * page_size + 1
+        st.caption(f"{first}–{first + len(rows) - 1} de {total} checklist(s)")
         for r in rows:
-            col1, col2, col3, col4 = st.columns([2, 4, 2, 3])
+            col1, col2, col3, col4 = st.columns([2, 4, 2, 2])
             with col1:
                 st.markdown(f"**ID {r['id']}**")
                 st.caption(f"{r['date']}")
@@ -38,19 +139,15 @@ def render():
                     st.session_state["current_checklist_id"] = r["id"]
                     st.success(f"Checklist {r['id']} selecionado. Abra a tela **Relatório**.")
             with col4:
-                with st.expander("Excluir este checklist", expanded=False):
-                    st.warning("⚠️ Remove checklist, fotos e relatórios gerados (DOCX/PDF).")
-                    confirm = st.checkbox(f"Confirmo excluir o checklist #{r['id']}", key=f"conf_{r['id']}")
-                    del_orphan_vrp = st.checkbox("Excluir também a VRP se ficar sem checklists", key=f"vrp_{r['id']}")
-                    if st.button("Excluir definitivamente", key=f"del_{r['id']}", type="secondary", disabled=not confirm):
-                        res = delete_checklist(r["id"], delete_vrp_if_orphan=del_orphan_vrp)
-                        if res["ok"]:
-                            st.success(
-                                f"Checklist #{r['id']} excluído. "
-                                f"Arquivos removidos: {res['files_deleted']}. "
-                                f"Exports apagados: {res['exports_deleted']}. "
-                                f"VRP apagada: {res['vrp_deleted']}."
-                            )
-                            st.rerun()
-                        else:
-                            st.error(f"Falha ao excluir: {res.get('reason','Erro desconhecido')}")
+                if st.button("🗑️ Excluir", key=f"ask_del_{r['id']}"):
+                    st.session_state["hist_delete_id"] = r["id"]
+                    st.rerun()
+
+        nav1, nav2, nav3 = st.columns([1, 1, 2])
+        if nav1.button("◀ Anteriores", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if nav2.button("Próximos ▶", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+        nav3.selectbox("Por página", PAGE_SIZES, key="hist_page_size", index=1)
@@ -1,47 +1,149 @@
 """
 Tela de Mapa VRP: visualização geográfica de todas as válvulas redutoras.
 Usa streamlit-folium para exibir mapa interativo com marcadores das VRPs.
+- poucas VRPs: um marcador Folium por VRP (popup HTML pronto)
+- o mapa só recebe as VRPs da área visível (sites_in_bbox, índice R*Tree); mover/zoom -> rerun
+  com os novos limites, e a camada é trocada sem remontar o mapa (feature_group_to_add)
+- muitas VRPs (> CLUSTER_THRESHOLD, ou modo "Agrupado"): uma única FeatureCollection GeoJSON
+  compacta (textos repetidos em tabelas de consulta) em Leaflet.markercluster, com círculos
+  em canvas; popup/tooltip montados no navegador só quando abertos
 """
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
-from backend.VRP_DATABASE.database import get_conn
+from folium.plugins import MarkerCluster
+from folium.template import Template
+from streamlit_folium import st_folium
+from backend.VRP_SERVICE.site_service import (
+    count_sites, query_sites, site_facets, site_summary, sites_extent, sites_in_bbox
+)
 from frontend.VRP_STYLES.layout import page_setup, app_header, section_card, pill
 
-def _get_vrp_locations():
-    """Busca todas as VRPs com coordenadas válidas."""
-    conn = get_conn()
-    rows = conn.execute("""
-        SELECT vs.id, vs.municipality, vs.city, vs.place, vs.brand, vs.type, vs.dn,
-               vs.latitude, vs.longitude, vs.access_install,
-               vs.network_depth_cm, vs.has_automation,
-               COUNT(c.id) as checklist_count
-        FROM vrp_sites vs
-        LEFT JOIN checklists c ON c.vrp_site_id = vs.id
-        WHERE vs.latitude IS NOT NULL AND vs.longitude IS NOT NULL
-        GROUP BY vs.id
-        ORDER BY vs.municipality, vs.city, vs.place
-    """).fetchall()
-    conn.close()
-    return rows
-
-def _create_map(vrp_locations):
-    """Cria mapa Folium com marcadores das VRPs."""
-    if not vrp_locations:
-        return None
-    
-    # Calcular centro do mapa (média das coordenadas)
-    lats = [r['latitude'] for r in vrp_locations]
-    lngs = [r['longitude'] for r in vrp_locations]
-    center_lat = sum(lats) / len(lats)
-    center_lng = sum(lngs) / len(lngs)
-    
-    # Criar mapa base
+CLUSTER_THRESHOLD = 300   # acima disso o modo automático agrupa
+DETAIL_LIMIT = 50         # VRPs na lista detalhada (expanders são caros no navegador)
+VIEWPORT_LIMIT = 5000     # VRPs desenhadas por vez (área visível)
+
+# filtros da tela (coluna em vrp_sites, rótulo)
+_FILTERS = [("municipality", "Município"), ("city", "Local DMC"), ("type", "Tipo de VRP"), ("dn", "DN (mm)")]
+
+# cores dos ícones Folium (red/blue/green/gray) para os círculos do modo agrupado
+_TYPE_COLORS = {'Ação Direta': '#d63e2a', 'Auto-Regulada': '#38aadd', 'Pilotada': '#72b026'}
+_DEFAULT_COLOR = '#575757'
+
+# campos repetidos viram índices em tabelas de consulta (m=município, c=DMC, b=marca, t=tipo, a=acesso)
+_LOOKUP_FIELDS = {'m': 'municipality', 'c': 'city', 'b': 'brand', 't': 'type', 'a': 'access_install'}
+
+def _sites_geojson(vrp_locations) -> tuple[dict, dict]:
+    """FeatureCollection compacta + tabelas de consulta dos textos repetidos."""
+    lookups = {k: [] for k in _LOOKUP_FIELDS}
+    index = {k: {} for k in _LOOKUP_FIELDS}
+    features = []
+    for vrp in vrp_locations:
+        props = {'i': vrp['id'], 'p': vrp['place'] or '', 'dn': vrp['dn'],
+                 'd': vrp['network_depth_cm'], 'au': 1 if vrp['has_automation'] else 0,
+                 'n': vrp['checklist_count']}
+        for key, field in _LOOKUP_FIELDS.items():
+            value = vrp[field] or ''
+            if value not in index[key]:
+                index[key][value] = len(lookups[key])
+                lookups[key].append(value)
+            props[key] = index[key][value]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point',
+                         'coordinates': [round(vrp['longitude'], 6), round(vrp['latitude'], 6)]},
+            'properties': props,
+        })
+    return {'type': 'FeatureCollection', 'features': features}, lookups
+
+class _GeoJsonCluster(MarkerCluster):
+    """Leaflet.markercluster alimentado por um único GeoJSON; popups montados sob demanda."""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var lk = {{ this.lookups|tojson }};
+                var colors = {{ this.colors|tojson }};
+                function esc(s) {
+                    return String(s == null ? '' : s).replace(/[&<>"']/g, function(ch) {
+                        return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[ch];
+                    });
+                }
+                function popup(layer) {
+                    var p = layer.feature.properties;
+                    var rows = [
+                        ['Município', lk.m[p.m]], ['Local DMC', lk.c[p.c]],
+                        ['Complemento', p.p || 'Não informado'], ['Marca', lk.b[p.b]],
+                        ['Tipo', lk.t[p.t]], ['DN', p.dn + ' mm'], ['Acesso', lk.a[p.a]],
+                        ['Profundidade', (p.d == null ? 'Não informado' : p.d) + ' cm'],
+                        ['Automação', p.au ? 'Sim' : 'Não'], ['Checklists', p.n]
+                    ];
+                    var html = '<div style="width: 250px;"><h4>VRP #' + p.i + '</h4>';
+                    for (var i = 0; i < rows.length; i++) {
+                        html += '<p><strong>' + rows[i][0] + ':</strong> ' + esc(rows[i][1]) + '</p>';
+                    }
+                    return html + '</div>';
+                }
+                var cluster = L.markerClusterGroup({{ this.options|tojavascript }});
+                var layer = L.geoJSON({{ this.data|tojson }}, {
+                    pointToLayer: function(f, latlng) {
+                        var color = colors[lk.t[f.properties.t]] || {{ this.default_color|tojson }};
+                        return L.circleMarker(latlng, {radius: 7, color: '#ffffff', weight: 1,
+                                                       fillColor: color, fillOpacity: 0.9});
+                    },
+                    onEachFeature: function(f, l) {
+                        l.bindTooltip(function(l) {
+                            var p = l.feature.properties;
+                            return 'VRP #' + p.i + ' - ' + esc(lk.c[p.c]);
+                        });
+                        l.bindPopup(popup, {maxWidth: 300});
+                    }
+                });
+                cluster.addLayer(layer);
+                cluster.addTo({{ this._parent.get_name() }});
+                return cluster;
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, vrp_locations, **kwargs):
+        super().__init__(chunkedLoading=True, **kwargs)
+        self._name = "GeoJsonCluster"
+        self.data, self.lookups = _sites_geojson(vrp_locations)
+        self.colors = _TYPE_COLORS
+        self.default_color = _DEFAULT_COLOR
+
+def _base_map(extent) -> folium.Map:
+    """Mapa base enquadrado nas VRPs filtradas (não muda ao mover o mapa: sem remontar o componente)."""
+    south, west, north, east = extent
     m = folium.Map(
-        location=[center_lat, center_lng],
+        location=[(south + north) / 2, (west + east) / 2],
         zoom_start=10,
-        tiles='OpenStreetMap'
+        tiles='OpenStreetMap',
+        prefer_canvas=True,
     )
+    if (south, west) != (north, east):
+        m.fit_bounds([[south, west], [north, east]])
+    return m
+
+def _viewport(key: str, extent):
+    """Área visível devolvida pelo mapa no rerun anterior; o enquadramento se os filtros mudaram."""
+    bounds = (st.session_state.get(key) or {}).get("bounds") or {}
+    sw, ne = bounds.get("_southWest") or {}, bounds.get("_northEast") or {}
+    corners = (sw.get("lat"), sw.get("lng"), ne.get("lat"), ne.get("lng"))
+    if st.session_state.get(f"{key}_extent") != extent or None in corners:
+        return extent
+    return corners
+
+def _cluster_layer(vrp_locations) -> folium.FeatureGroup:
+    """Camada agrupada: um GeoJSON para todas as VRPs (escala para milhares de pontos)."""
+    fg = folium.FeatureGroup(name="VRPs")
+    _GeoJsonCluster(vrp_locations).add_to(fg)
+    return fg
+
+def _marker_layer(vrp_locations) -> folium.FeatureGroup:
+    """Camada com um marcador Folium por VRP."""
+    fg = folium.FeatureGroup(name="VRPs")
     
     # Adicionar marcadores para cada VRP
     for vrp in vrp_locations:
@@ -75,18 +177,18 @@ def _create_map(vrp_locations):
             popup=folium.Popup(popup_html, max_width=300),
             tooltip=f"VRP #{vrp['id']} - {vrp['city']}",
             icon=folium.Icon(color=color, icon='info-sign')
-        ).add_to(m)
+        ).add_to(fg)
     
-    return m
+    return fg
 
 def render():
     page_setup("VRP • Mapa", icon="🗺️")
     app_header("Mapa de Localização das VRPs", "Visualização geográfica de todas as válvulas redutoras cadastradas.")
 
     # Estatísticas rápidas
-    vrp_locations = _get_vrp_locations()
+    summary = site_summary()
     
-    if not vrp_locations:
+    if not summary["sites"]:
         st.warning("Nenhuma VRP com coordenadas geográficas cadastrada.")
         st.info("💡 Adicione coordenadas no formulário de Checklist para visualizar no mapa.")
         return
@@ -95,66 +197,62 @@ def render():
     with section_card("Resumo"):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total de VRPs", len(vrp_locations))
+            st.metric("Total de VRPs", summary["sites"])
         with col2:
-            dmc_locations = len(set(r['city'] for r in vrp_locations))
-            st.metric("Locais DMC", dmc_locations)
+            st.metric("Locais DMC", summary["dmcs"])
         with col3:
-            total_checklists = sum(r['checklist_count'] for r in vrp_locations)
-            st.metric("Checklists", total_checklists)
+            st.metric("Checklists", summary["checklists"])
         with col4:
-            avg_checklists = total_checklists / len(vrp_locations) if vrp_locations else 0
-            st.metric("Média por VRP", f"{avg_checklists:.1f}")
+            st.metric("Média por VRP", f"{summary['checklists'] / summary['sites']:.1f}")
 
-    # Filtros
+    # Filtros (aplicados no SQL; contagens de cada opção consideram os demais filtros)
     with section_card("Filtros"):
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            municipalities = sorted(list(set(r['municipality'] for r in vrp_locations)))
-            selected_municipality = st.selectbox("Município", ["Todos"] + municipalities)
-        
-        with col2:
-            dmc_locations = sorted(list(set(r['city'] for r in vrp_locations)))
-            selected_dmc = st.selectbox("Local DMC", ["Todos"] + dmc_locations)
-        
-        with col3:
-            vrp_types = sorted(list(set(r['type'] for r in vrp_locations)))
-            selected_type = st.selectbox("Tipo de VRP", ["Todos"] + vrp_types)
-        
-        with col4:
-            dns = sorted(list(set(r['dn'] for r in vrp_locations)))
-            selected_dn = st.selectbox("DN (mm)", ["Todos"] + [str(dn) for dn in dns])
-
-        # Aplicar filtros
-        filtered_locations = vrp_locations
-        if selected_municipality != "Todos":
-            filtered_locations = [r for r in filtered_locations if r['municipality'] == selected_municipality]
-        if selected_dmc != "Todos":
-            filtered_locations = [r for r in filtered_locations if r['city'] == selected_dmc]
-        if selected_type != "Todos":
-            filtered_locations = [r for r in filtered_locations if r['type'] == selected_type]
-        if selected_dn != "Todos":
-            selected_dn_int = int(selected_dn)
-            filtered_locations = [r for r in filtered_locations if r['dn'] == selected_dn_int]
-
-        st.caption(f"Mostrando {len(filtered_locations)} de {len(vrp_locations)} VRPs")
+        filters = {column: st.session_state.get(f"map_filter_{column}") for column, _ in _FILTERS}
+        facets = site_facets(filters)
+        for col, (column, label) in zip(st.columns(4), _FILTERS):
+            counts = dict(facets[column])
+            with col:
+                filters[column] = st.selectbox(
+                    label, [None] + list(counts), key=f"map_filter_{column}",
+                    format_func=lambda v, c=counts: "Todos" if v is None else f"{v} ({c[v]})",
+                )
+
+        filtered_total = count_sites(filters)
+        st.caption(f"Mostrando {filtered_total} de {summary['sites']} VRPs")
 
     # Mapa
     with section_card("Mapa Interativo"):
-        if filtered_locations:
-            map_obj = _create_map(filtered_locations)
-            if map_obj:
-                folium_static(map_obj, width=700, height=500)
-            else:
-                st.error("Erro ao gerar mapa.")
+        mode = st.radio(
+            "Exibição", ["Automático", "Agrupado", "Marcadores individuais"], horizontal=True,
+            help=f"Automático agrupa os marcadores acima de {CLUSTER_THRESHOLD} VRPs.",
+        )
+        extent = sites_extent(filters)
+        if extent:
+            # só as VRPs da área visível (índice espacial), no máximo VIEWPORT_LIMIT
+            visible = sites_in_bbox(*_viewport("vrp_map", extent), filters=filters, limit=VIEWPORT_LIMIT + 1)
+            truncated = len(visible) > VIEWPORT_LIMIT
+            visible = visible[:VIEWPORT_LIMIT]
+            clustered = mode == "Agrupado" or (mode == "Automático" and len(visible) > CLUSTER_THRESHOLD)
+            st_folium(
+                _base_map(extent), key="vrp_map", width=700, height=500,
+                feature_group_to_add=(_cluster_layer if clustered else _marker_layer)(visible),
+                returned_objects=["bounds"],
+            )
+            st.session_state["vrp_map_extent"] = extent
+            caption = f"{len(visible)} VRP(s) na área visível"
+            if truncated:
+                caption += f" (limite de {VIEWPORT_LIMIT}; aproxime o mapa para ver todas)"
+            st.caption(caption)
         else:
             st.info("Nenhuma VRP encontrada com os filtros selecionados.")
 
     # Lista detalhada
     with section_card("Lista Detalhada"):
-        if filtered_locations:
-            for vrp in filtered_locations:
+        if filtered_total > DETAIL_LIMIT:
+            st.caption(f"Exibindo as primeiras {DETAIL_LIMIT} de {filtered_total} VRPs. "
+                       "Use os filtros para refinar.")
+        if filtered_total:
+            for vrp in query_sites(filters, limit=DETAIL_LIMIT):
                 with st.expander(f"VRP #{vrp['id']} - {vrp['municipality']} ({vrp['city']})", expanded=False):
                     col1, col2 = st.columns([2, 1])
                     with col1:
@@ -178,7 +276,7 @@ def render():
     # Legenda
     with section_card("Legenda"):
         st.markdown("""
-        **Cores dos marcadores:**
+        **Cores dos marcadores** (no modo agrupado, o número indica quantas VRPs há no grupo):
         - 🔴 **Vermelho:** VRP Ação Direta
         - 🔵 **Azul:** VRP Auto-Regulada  
         - 🟢 **Verde:** VRP Pilotada
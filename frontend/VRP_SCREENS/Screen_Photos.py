@@ -5,10 +5,11 @@ Lista para edição (incluir/ordem/legenda/rótulo) e exclusão.
 UI padronizada com header/logo, toolbar e cards.
 """
 import streamlit as st
-from backend.VRP_DATABASE.database import get_conn
+from backend.VRP_DATABASE.database import connection
+from backend.VRP_SERVICE.read_cache import cached
 from backend.VRP_SERVICE.storage_service import (
-    save_photo_bytes, list_photos, list_photos_by_vrp,
-    update_photo_flags, delete_photo
+    save_photos_bulk, list_photos, list_photos_by_vrp,
+    update_photo_flags, delete_photo, photo_src
 )
 from frontend.VRP_STYLES.layout import (
     page_setup, app_header, toolbar, section_card, pill
@@ -21,16 +22,16 @@ DEFAULT_LABELS = [
     "Conexões (antes)","Conexões (após)","Fechamento de registros","Abertura de registros","Personalizado"
 ]
 
+@cached("checklists")
 def _get_vrp_site_id(checklist_id: int) -> int | None:
-    conn = get_conn()
-    row = conn.execute("SELECT vrp_site_id FROM checklists WHERE id=?", (checklist_id,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("SELECT vrp_site_id FROM checklists WHERE id=?", (checklist_id,)).fetchone()
     return row["vrp_site_id"] if row else None
 
+@cached("vrp_sites")
 def _get_vrp_label(site_id: int) -> str:
-    conn = get_conn()
-    r = conn.execute("SELECT place, city, brand, dn FROM vrp_sites WHERE id=?", (site_id,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        r = conn.execute("SELECT place, city, brand, dn FROM vrp_sites WHERE id=?", (site_id,)).fetchone()
     if not r: return f"VRP #{site_id}"
     return f"{r['place']} – {r['city']} • {r['brand']} DN{r['dn'] or ''}"
 
@@ -86,31 +87,41 @@ def render():
                         ))
                 submitted = st.form_submit_button("Salvar todas")
                 if submitted:
-                    for m in meta:
-                        save_photo_bytes(
-                            vrp_site_id=site_id,
-                            checklist_id=cid,
-                            original_name=m["file"].name,
-                            data=m["file"].getvalue(),
-                            label=m["label"],
-                            caption=m["caption"],
-                            include=m["include"],
-                            order=m["order"],
-                        )
-                    st.success(f"{len(meta)} imagem(ns) salva(s).")
-                    st.rerun()
+                    bar = st.progress(0.0, text="Processando imagens...")
+                    res = save_photos_bulk(
+                        vrp_site_id=site_id,
+                        checklist_id=cid,
+                        items=[
+                            dict(
+                                original_name=m["file"].name,
+                                data=m["file"],  # stream do upload, sem cópia via getvalue()
+                                label=m["label"],
+                                caption=m["caption"],
+                                include=m["include"],
+                                order=m["order"],
+                            )
+                            for m in meta
+                        ],
+                        progress=lambda done, total: bar.progress(done / total, text=f"Processando {done}/{total}"),
+                    )
+                    for name, err in res["failed"]:
+                        st.error(f"Falha ao salvar {name}: {err}")
+                    st.success(f"{len(res['saved'])} imagem(ns) salva(s).")
+                    if not res["failed"]:
+                        st.rerun()
         else:
             st.caption("Dica: você pode arrastar e soltar os arquivos aqui.")
 
     # ===== Lista / edição do checklist =====
     with section_card("Fotos deste checklist", "Edite ordem, rótulo e inclusão; exclua se necessário."):
         rows = list_photos(cid)
+        focus = st.session_state.pop("focus_photo_id", None)  # foto aberta pela busca do Histórico
         if not rows:
             st.info("Nenhuma foto neste checklist.")
         else:
             for r in rows:
-                with st.expander(f"#{r['id']} • {r['label']}  • ordem {r['display_order']}", expanded=False):
-                    st.image(r["file_path"], use_container_width=True, caption=None)
+                with st.expander(f"#{r['id']} • {r['label']}  • ordem {r['display_order']}", expanded=r["id"] == focus):
+                    st.image(photo_src(r, 1280), use_container_width=True, caption=None)
                     col1, col2, col3, col4 = st.columns([1,1,3,1])
                     include = col1.checkbox("Incluir", value=bool(r["include_in_report"]), key=f"inc_{r['id']}")
                     order = col2.number_input("Ordem", 1, 999, value=int(r["display_order"]), key=f"ord_{r['id']}")
@@ -134,4 +145,4 @@ def render():
             cols = st.columns(3)
             for i, r in enumerate(all_rows):
                 with cols[i % 3]:
-                    st.image(r["file_path"], use_container_width=True, caption=f"CK {r['checklist_id']} • {r['label']}")
+                    st.image(photo_src(r, 480), use_container_width=True, caption=f"CK {r['checklist_id']} • {r['label']}")
@@ -1,44 +1,120 @@
 """
 Gera narrativa com IA (ou offline) e exporta DOCX/PDF.
 UI padronizada com header/logo, toolbar e cards.
+Narrativa exibida à medida que a IA responde (stream); exportação e email rodam na fila
+de tarefas (job_service) e a tela só enfileira e acompanha.
 """
 import streamlit as st
-from backend.VRP_SERVICE.ai_service import generate_ai_summary
-from backend.VRP_SERVICE.report_service import generate_full_report
+from backend.VRP_SERVICE.ai_service import AIStreamInterrupted, save_ai_summary, stream_ai_summary
+from backend.VRP_SERVICE.email_outbox import outbox_for_checklist
 from backend.VRP_SERVICE.email_service import email_service
-from backend.VRP_DATABASE.database import get_conn
+from backend.VRP_SERVICE.job_service import latest_job, submit
+from backend.VRP_SERVICE.read_cache import cached
+from backend.VRP_DATABASE.database import connection
 from frontend.VRP_STYLES.layout import page_setup, app_header, toolbar, section_card, pill
 
+@cached("reports")
 def _get_saved_ai_text(checklist_id: int) -> str | None:
-    conn = get_conn()
-    row = conn.execute("""
-        SELECT ai_summary FROM reports WHERE checklist_id=?
-    """, (checklist_id,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT ai_summary FROM reports WHERE checklist_id=?
+        """, (checklist_id,)).fetchone()
     return row["ai_summary"] if row and row["ai_summary"] else None
 
+@cached("checklists", "vrp_sites")
 def _vrp_label_from_ck(cid: int) -> str:
-    conn = get_conn()
-    r = conn.execute("""
-        SELECT vs.place, vs.municipality, vs.city, vs.brand, vs.dn
-        FROM vrp_sites vs
-        INNER JOIN checklists c ON c.vrp_site_id = vs.id
-        WHERE c.id = ?
-    """, (cid,)).fetchone()
-    conn.close()
+    with connection() as conn:
+        r = conn.execute("""
+            SELECT vs.place, vs.municipality, vs.city, vs.brand, vs.dn
+            FROM vrp_sites vs
+            INNER JOIN checklists c ON c.vrp_site_id = vs.id
+            WHERE c.id = ?
+        """, (cid,)).fetchone()
     if not r: return "—"
     return f"{r['place']} – {r['municipality']} ({r['city']}) • {r['brand']} DN{r['dn'] or ''}"
 
-def _get_photos_paths(checklist_id: int) -> list:
-    """Obtém caminhos das fotos associadas ao checklist."""
-    conn = get_conn()
-    rows = conn.execute("""
-        SELECT file_path FROM photos 
-        WHERE checklist_id = ? AND include_in_report = 1
-        ORDER BY display_order
-    """, (checklist_id,)).fetchall()
-    conn.close()
-    return [row["file_path"] for row in rows]
+@cached("reports")
+def _get_image_savings(checklist_id: int) -> tuple | None:
+    """(bytes originais, bytes embutidos) das fotos no último DOCX gerado."""
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT images_original_bytes, images_embedded_bytes FROM reports WHERE checklist_id=?
+        """, (checklist_id,)).fetchone()
+    if not row or not row["images_original_bytes"]:
+        return None
+    return row["images_original_bytes"], row["images_embedded_bytes"] or 0
+
+def _job_active(job: dict | None) -> bool:
+    return bool(job) and job["status"] in ("queued", "running")
+
+def _job_progress(job: dict):
+    label = job.get("message") or job["status"]
+    if job["attempts"] > 1:
+        label += f" (tentativa {job['attempts']}/{job['max_attempts']})"
+    st.progress(float(job.get("progress") or 0), text=label)
+
+@st.fragment(run_every=2)
+def _poll_job(kind: str, cid: int):
+    """Atualiza só este trecho a cada 2 s; ao terminar, recarrega a tela com o resultado."""
+    job = latest_job(kind, cid)
+    if _job_active(job):
+        _job_progress(job)
+    else:
+        st.rerun()
+
+def _show_job(kind: str, cid: int) -> dict | None:
+    """Progresso do job em andamento ou o último job concluído/falho."""
+    job = latest_job(kind, cid)
+    if _job_active(job):
+        _poll_job(kind, cid)
+    elif job and job["status"] == "failed":
+        st.error(f"Falhou após {job['attempts']} tentativa(s): {job.get('error') or '—'}")
+    return job
+
+_OUTBOX_LABELS = {"queued": "⏳ Na fila", "sending": "📤 Enviando", "sent": "✅ Enviado", "failed": "❌ Falhou"}
+
+def _outbox_pending(items: list) -> bool:
+    return any(i["status"] in ("queued", "sending") for i in items)
+
+def _outbox_lines(items: list):
+    for item in items:
+        line = f"{_OUTBOX_LABELS[item['status']]} • {len(item['recipients'])} destinatário(s) • {item['created_at']}"
+        if (item["parts"] or 1) > 1:
+            line += f" • parte {item['part']}/{item['parts']}"
+        if item["status"] == "sent":
+            line += f" → entregue {item['sent_at']}"
+        elif item["last_error"]:
+            line += f" • tentativa {item['attempts']}/{item['max_attempts']}: {item['last_error']}"
+        st.caption(line)
+
+@st.fragment(run_every=3)
+def _poll_outbox(cid: int):
+    items = outbox_for_checklist(cid, limit=6)
+    if not _outbox_pending(items):
+        st.rerun()  # tudo entregue/falho: para de consultar
+    _outbox_lines(items)
+
+def _show_outbox(cid: int):
+    """Status de entrega das últimas mensagens do checklist (atualiza enquanto houver pendentes)."""
+    items = outbox_for_checklist(cid, limit=6)
+    if _outbox_pending(items):
+        _poll_outbox(cid)
+    else:
+        _outbox_lines(items)
+
+def _show_report_result(cid: int, job: dict):
+    res = job["result"] or {}
+    st.success("Relatório exportado.")
+    st.markdown(f"**DOCX:**  `{res.get('docx_path')}`")
+    savings = _get_image_savings(cid)
+    if savings:
+        orig, emb = savings
+        st.caption(f"Fotos no DOCX: {emb / 1e6:.1f} MB (originais: {orig / 1e6:.1f} MB, "
+                   f"redução de {100 * (1 - emb / orig):.0f}%)")
+    if res.get("pdf_path"):
+        st.markdown(f"**PDF:**   `{res['pdf_path']}`")
+    else:
+        st.warning("PDF não gerado. Verifique o backend de PDF (VRP_PDF_BACKEND) na tela **Configurações**.")
 
 def render():
     page_setup("VRP • Relatório", icon="📄")
@@ -60,24 +136,36 @@ def render():
 
     # narrativa
     with section_card("Narrativa técnica (IA)", "Gerada a partir das observações; o texto abaixo é o que irá para o DOCX."):
+        regenerate = st.checkbox("Ignorar cache da IA", value=False,
+                                 help="Sem alterações nos dados, a narrativa anterior da IA é reaproveitada.")
         if actions["Gerar Narrativa (IA)"]:
-            ai_text = generate_ai_summary(cid)
-            st.session_state["ai_text"] = ai_text
-            st.success("Narrativa gerada.")
+            # texto aparece enquanto a IA responde; ao final vai para a prévia e para o banco
+            live = st.empty()
+            try:
+                with live.container():
+                    ai_text = st.write_stream(stream_ai_summary(cid, regenerate=regenerate))
+            except AIStreamInterrupted:
+                st.warning("A resposta da IA foi interrompida. Tente gerar novamente.")
+            else:
+                live.empty()
+                ai_text = ai_text.strip()
+                save_ai_summary(cid, ai_text)
+                st.session_state["ai_text"] = ai_text
+                st.success("Narrativa gerada.")
         ai_text = st.session_state.get("ai_text") or _get_saved_ai_text(cid)
         st.text_area("Prévia", value=ai_text or "", height=320)
 
     # export
     with section_card("Exportação"):
+        force = st.checkbox("Regerar mesmo sem alterações", value=False,
+                            help="Sem alterações em checklist, fotos ou narrativa, o último DOCX/PDF é reaproveitado.")
         if actions["Exportar DOCX/PDF"]:
-            ai_text = (st.session_state.get("ai_text") or _get_saved_ai_text(cid) or generate_ai_summary(cid))
-            docx, pdf = generate_full_report(cid, ai_text)
-            st.success("Relatório exportado.")
-            st.markdown(f"**DOCX:**  `{docx}`")
-            if pdf:
-                st.markdown(f"**PDF:**   `{pdf}`")
-            else:
-                st.warning("PDF não gerado. O PDF depende do Microsoft Word + biblioteca `docx2pdf` instalados no Windows.")
+            ai_text = st.session_state.get("ai_text") or _get_saved_ai_text(cid)
+            # sem narrativa, o próprio job gera a da IA antes do DOCX
+            submit("report", {"checklist_id": cid, "ai_text": ai_text, "force": force})
+        job = _show_job("report", cid)
+        if job and job["status"] == "done":
+            _show_report_result(cid, job)
 
         st.caption("Dica: Abra o DOCX no Word e pressione **F9** para atualizar **Sumário** e **Lista de Figuras**.")
 
@@ -101,43 +189,8 @@ def render():
             for email in recipients:
                 st.write(f"📧 {email}")
             
-            # Botão para enviar
+            # Botão para enviar (o job gera o relatório antes, se ainda não existir)
             if st.button("📤 Enviar Relatório por Email", type="primary"):
-                with st.spinner("Enviando relatório por email..."):
-                    # Obter caminhos dos arquivos
-                    docx_path = ""
-                    pdf_path = ""
-                    
-                    # Buscar relatórios existentes
-                    conn = get_conn()
-                    report_row = conn.execute("""
-                        SELECT docx_path, pdf_path FROM reports WHERE checklist_id = ?
-                    """, (cid,)).fetchone()
-                    conn.close()
-                    
-                    if report_row:
-                        docx_path = report_row["docx_path"] or ""
-                        pdf_path = report_row["pdf_path"] or ""
-                    
-                    # Se não há relatório, gerar primeiro
-                    if not docx_path:
-                        ai_text = (st.session_state.get("ai_text") or _get_saved_ai_text(cid) or generate_ai_summary(cid))
-                        docx_path, pdf_path = generate_full_report(cid, ai_text)
-                        st.success("Relatório gerado automaticamente para envio.")
-                    
-                    # Obter fotos
-                    photos_paths = _get_photos_paths(cid)
-                    
-                    # Enviar email
-                    success = email_service.send_report_email(
-                        checklist_id=cid,
-                        report_path=docx_path,
-                        photos_paths=photos_paths,
-                        recipients=recipients
-                    )
-                    
-                    if success:
-                        st.success("✅ Relatório enviado com sucesso!")
-                        st.info(f"📧 Enviado para {len(recipients)} destinatário(s)")
-                    else:
-                        st.error("❌ Falha ao enviar relatório. Verifique as configurações de email.")
+                submit("email_report", {"checklist_id": cid, "recipients": sorted(recipients)})
+            _show_job("email_report", cid)
+            _show_outbox(cid)
@@ -0,0 +1,52 @@
+"""
+Registro de telas com importação sob demanda:
+- PAGE_MODULES: nome no menu -> módulo da tela (todas expõem render())
+- lazy_page(): função que só importa o módulo quando a tela é aberta pela primeira vez
+  (folium/streamlit_folium, python-docx via IA/relatório etc. ficam fora da partida a frio)
+- import_timings(): tempo de importação de cada tela já carregada neste processo (tela Config)
+Os módulos ficam em sys.modules: nos reruns seguintes a tela custa só o render().
+"""
+import importlib
+import sys
+import threading
+import time
+from typing import Callable, Dict
+
+PAGE_MODULES: Dict[str, str] = {
+    "Checklist":    "frontend.VRP_SCREENS.Screen_Checklist_Form",
+    "Fotos":        "frontend.VRP_SCREENS.Screen_Photos",
+    "Histórico":    "frontend.VRP_SCREENS.Screen_Historico",
+    "Relatório":    "frontend.VRP_SCREENS.Screen_Relatorio",
+    "Galeria VRP":  "frontend.VRP_SCREENS.Screen_Galeria_VRP",
+    "Mapa VRP":     "frontend.VRP_SCREENS.Screen_Mapa_VRP",
+    "Tutorial VRP": "frontend.VRP_SCREENS.SCREEN_VRP_TUTORIAL",
+    "Config":       "frontend.VRP_SCREENS.Screen_Config",
+}
+
+_lock = threading.Lock()
+_import_ms: Dict[str, float] = {}
+
+
+def load_page(name: str) -> Callable[[], None]:
+    """render() da tela; importa o módulo (e mede o tempo) na primeira vez."""
+    module_name = PAGE_MODULES[name]
+    module = sys.modules.get(module_name)
+    if module is None:
+        with _lock:  # duas sessões abrindo a mesma tela: uma importa, a outra espera
+            t0 = time.perf_counter()
+            module = importlib.import_module(module_name)
+            _import_ms.setdefault(name, (time.perf_counter() - t0) * 1000)
+    return module.render
+
+
+def lazy_page(name: str) -> Callable[[], None]:
+    def render():
+        load_page(name)()
+    render.__name__ = f"render_{PAGE_MODULES[name].rsplit('.', 1)[-1]}"
+    return render
+
+
+def import_timings() -> Dict[str, float]:
+    """{tela: ms da primeira importação}, na ordem em que foram abertas."""
+    with _lock:
+        return dict(_import_ms)
@@ -2,34 +2,26 @@
 Aplicação Streamlit principal.
 Navegação por sidebar: Checklist, Fotos, Histórico, Relatório, Config e Galeria VRP.
 Cria o banco (init_db). Suporta navegação programática via st.session_state["nav_to"].
+Telas importadas só quando abertas (page_registry): a partida a frio não carrega folium etc.
 """
 import streamlit as st
 import os
 from dotenv import load_dotenv
 from backend.VRP_DATABASE.database import init_db
-from frontend.VRP_SCREENS import (
-    Screen_Checklist_Form, Screen_Photos, Screen_Historico, Screen_Galeria_VRP, Screen_Relatorio, Screen_Config
-)
-from frontend.VRP_SCREENS.SCREEN_VRP_TUTORIAL import render as Screen_VRP_Tutorial
-from frontend.VRP_SCREENS.Screen_Mapa_VRP import render as Screen_Mapa_VRP
+from backend.VRP_SERVICE.email_outbox import start_sender
+from backend.VRP_SERVICE.job_service import start_workers
+from frontend.VRP_SCREENS.page_registry import PAGE_MODULES, lazy_page
 from frontend.VRP_STYLES.brand import logo_path
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 st.set_page_config(page_title="VRP - Relatórios", layout="wide")
-init_db()
+init_db()  # migrações pendentes; em reruns custa só um PRAGMA user_version
+start_workers()  # fila de relatórios/IA/email; só inicia na primeira execução do processo
+start_sender()   # entrega da fila de emails (conexão SMTP reaproveitada)
 
-PAGES = {
-    "Checklist":  Screen_Checklist_Form.render,
-    "Fotos":      Screen_Photos.render,
-    "Histórico":  Screen_Historico.render,
-    "Relatório":  Screen_Relatorio.render,
-    "Galeria VRP":Screen_Galeria_VRP.render,
-    "Mapa VRP":   Screen_Mapa_VRP,
-    "Tutorial VRP": Screen_VRP_Tutorial,
-    "Config":     Screen_Config.render,
-}
+PAGES = {name: lazy_page(name) for name in PAGE_MODULES}
 
 # Sidebar com logo e nav
 st.sidebar.image(logo_path(), use_container_width=True)
@@ -0,0 +1,32 @@
+"""
+Configuração comum dos testes:
+- VRP_ROOT aponta para uma pasta temporária antes de importar o backend
+  (banco e exports do teste não tocam no perfil real)
+- init_db() uma vez por sessão
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ["VRP_ROOT"] = tempfile.mkdtemp(prefix="vrp_tests_")
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def db():
+    from backend.VRP_DATABASE.database import init_db
+    init_db()
+
+
+@pytest.fixture
+def checklist_id():
+    """Checklist mínimo (date + service_type válidos) para as tabelas que o referenciam."""
+    from backend.VRP_DATABASE.database import transaction
+    with transaction() as conn:
+        return conn.execute(
+            "INSERT INTO checklists (date, service_type) VALUES (date('now'), 'Manutenção Preventiva')"
+        ).lastrowid
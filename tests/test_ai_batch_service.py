@@ -0,0 +1,177 @@
+"""
+Lote da IA contra um servidor compatível local (GROQ_BASE_URL):
+- 429 com Retry-After -> nova tentativa e narrativa da IA
+- erro definitivo de um item -> modelo offline só daquele item
+- 429 na chamada de teste do disjuntor (half_open) devolve a vaga
+- TokenBucket segura as chamadas no ritmo configurado
+- llm_client.chat(): 429 também não conta como falha no disjuntor
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.VRP_SERVICE import ai_batch_service as ab
+from backend.VRP_SERVICE import llm_client
+
+
+def _completion(text: str) -> dict:
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": ab.GROQ_MODEL,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+class StubLLM(ThreadingHTTPServer):
+    """Responde por checklist: script[cid] = [status, ...] consumidos em ordem (depois 200)."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.script = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cid = int(body["messages"][-1]["content"].split()[-1])
+        with self.server.lock:
+            self.server.calls.append((cid, time.monotonic()))
+            queue = self.server.script.get(cid) or []
+            status = queue.pop(0) if queue else 200
+        if status == 200:
+            payload, headers = _completion(f"Narrativa {cid}"), {}
+        elif status == 429:
+            payload, headers = {"error": {"message": "rate limited"}}, {"retry-after": "0"}
+        else:
+            payload, headers = {"error": {"message": "bad request"}}, {}
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubLLM()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("GROQ_BASE_URL", server.url)
+    # contexto sintético: o id do checklist vai na mensagem para o stub saber quem é quem
+    monkeypatch.setattr(ab, "_collect_context", lambda cid: {"ck": {"id": cid}, "site": {}, "photos": []})
+    monkeypatch.setattr(ab, "_build_messages", lambda ctx: [
+        {"role": "system", "content": "teste"},
+        {"role": "user", "content": f"checklist {ctx['ck']['id']}"},
+    ])
+    monkeypatch.setattr(ab, "_offline_template", lambda ctx: f"Offline {ctx['ck']['id']}")
+    monkeypatch.setattr(llm_client, "breaker", llm_client.CircuitBreaker(3, 60))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_retry_after_429_then_success(stub):
+    stub.script = {1: [429, 429]}
+    out = ab.generate_ai_summaries([1, 2], concurrency=2, regenerate=True)
+    assert out == {1: "Narrativa 1", 2: "Narrativa 2"}
+    assert [cid for cid, _ in stub.calls].count(1) == 3
+    assert llm_client.breaker.state == "closed"  # 429 não conta como falha do provedor
+
+    # segunda passada sem regenerate: tudo sai do ai_cache, sem chamar o servidor
+    calls = len(stub.calls)
+    assert ab.generate_ai_summaries([1, 2], concurrency=2) == out
+    assert len(stub.calls) == calls
+
+
+def test_definitive_error_falls_back_per_item(stub):
+    stub.script = {2: [400]}
+    out = ab.generate_ai_summaries([1, 2, 3], concurrency=3, regenerate=True)
+    assert out == {1: "Narrativa 1", 2: "Offline 2", 3: "Narrativa 3"}
+    assert [cid for cid, _ in stub.calls].count(2) == 1  # erro 4xx não é repetido
+
+
+def test_rate_limit_exhausted_falls_back(stub, monkeypatch):
+    monkeypatch.setattr(ab, "MAX_RETRIES", 2)
+    stub.script = {1: [429, 429, 429]}
+    out = ab.generate_ai_summaries([1], regenerate=True)
+    assert out == {1: "Offline 1"}
+    assert len(stub.calls) == 3
+
+
+def test_breaker_trial_released_after_429(stub, monkeypatch):
+    monkeypatch.setattr(llm_client, "breaker", llm_client.CircuitBreaker(1, 0.01))
+    monkeypatch.setattr(ab, "MAX_RETRIES", 1)
+    llm_client.breaker.failure()
+    time.sleep(0.02)
+    assert llm_client.breaker.state == "half_open"
+
+    # a chamada de teste só recebe 429: nada foi registrado e a vaga precisa voltar
+    stub.script = {1: [429, 429]}
+    assert ab.generate_ai_summaries([1], regenerate=True) == {1: "Offline 1"}
+    assert llm_client.breaker.state == "half_open"
+
+    assert ab.generate_ai_summaries([2], regenerate=True) == {2: "Narrativa 2"}
+    assert llm_client.breaker.state == "closed"
+
+
+def test_token_bucket_paces_after_capacity():
+    async def run():
+        bucket = ab.TokenBucket(600)  # 10/s, capacidade 600
+        for _ in range(600):
+            await bucket.acquire()
+        t0 = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        waited = time.monotonic() - t0
+
+        bucket.adjust(-2)  # devolve parte da reserva: a próxima sai sem esperar
+        t1 = time.monotonic()
+        await bucket.acquire(2)
+        return waited, time.monotonic() - t1
+
+    waited, after_refund = asyncio.run(run())
+    assert 0.25 <= waited < 1.0
+    assert after_refund < 0.05
+
+
+def test_interactive_chat_429_does_not_open_breaker(stub, monkeypatch):
+    import groq
+    monkeypatch.setattr(llm_client, "_client", None)  # cliente novo apontando para este stub
+    monkeypatch.setattr(llm_client, "breaker", llm_client.CircuitBreaker(1, 0.01))
+    messages = [{"role": "user", "content": "checklist 7"}]
+
+    stub.script = {7: [429] * 4}  # o cliente síncrono repete uma vez por conta própria
+    for _ in range(2):
+        with pytest.raises(groq.RateLimitError):
+            llm_client.chat(messages, ab.GROQ_MODEL, 0.2)
+    assert llm_client.breaker.state == "closed"
+
+    # chamada de teste (half_open) que só recebe 429 devolve a vaga
+    llm_client.breaker.failure()
+    time.sleep(0.02)
+    stub.script = {7: [429, 429]}
+    with pytest.raises(groq.RateLimitError):
+        llm_client.chat(messages, ab.GROQ_MODEL, 0.2)
+    assert llm_client.breaker.state == "half_open"
+    assert llm_client.chat(messages, ab.GROQ_MODEL, 0.2).choices[0].message.content == "Narrativa 7"
+    assert llm_client.breaker.state == "closed"
@@ -0,0 +1,169 @@
+"""
+Fila de emails contra um servidor SMTP local (EMAIL_SMTP_SECURITY=none):
+- várias mensagens pela mesma conexão
+- 4xx no DATA -> RSET, linha volta para 'queued' com o erro e é reenviada
+- status de cada mensagem atualizado na tabela
+- anexo que sozinho passa do limite é apontado no planejamento
+"""
+import socketserver
+import threading
+
+import pytest
+
+from backend.VRP_DATABASE.database import transaction
+from backend.VRP_SERVICE import email_outbox as outbox
+from backend.VRP_SERVICE.email_attachments import AttachmentTooLargeError, plan_report_email
+
+
+class StubSMTP(socketserver.ThreadingTCPServer):
+    """SMTP mínimo: EHLO/MAIL/RCPT/DATA/RSET/NOOP/QUIT; data_replies = respostas ao fim do DATA."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.connections = 0
+        self.commands = []
+        self.messages = []
+        self.data_replies = []
+        self.lock = threading.Lock()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ESMTP")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            verb = raw.decode().strip().split(" ", 1)[0].upper()
+            with server.lock:
+                server.commands.append(verb)
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-stub")
+                self.reply("250 SIZE 10485760")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 fim com <CRLF>.<CRLF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b".\r\n", b""):
+                        break
+                    lines.append(line)
+                with server.lock:
+                    status = server.data_replies.pop(0) if server.data_replies else "250 queued"
+                    if status.startswith("250"):
+                        server.messages.append(b"".join(lines))
+                self.reply(status)
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 não implementado")
+
+
+@pytest.fixture
+def smtp_stub(monkeypatch):
+    server = StubSMTP()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("EMAIL_SMTP_SECURITY", "none")
+    monkeypatch.setenv("EMAIL_SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("EMAIL_SMTP_PORT", str(server.server_address[1]))
+    monkeypatch.setenv("EMAIL_SMTP_TIMEOUT", "5")
+    monkeypatch.setenv("GESTOR_EMAIL", "gestor@vrp.local")
+    monkeypatch.setenv("EMAIL_ADDRESS", "")
+    monkeypatch.setenv("EMAIL_PASSWORD", "")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_outbox_reuses_connection_and_retries_4xx(smtp_stub, checklist_id, tmp_path):
+    report = tmp_path / "relatorio.pdf"
+    report.write_bytes(b"%PDF-1.4\n" + b"0" * 2048)
+    ids = [
+        outbox.enqueue_report_email(checklist_id, str(report), [], [f"dest{i}@vrp.local"])[0]
+        for i in range(3)
+    ]
+    # a segunda mensagem leva um 451 (temporário) no fim do DATA
+    smtp_stub.data_replies = ["250 queued", "451 tente mais tarde"]
+    before = outbox.outbox_stats()
+
+    session = outbox.SmtpSession()
+    try:
+        assert outbox.deliver_due(session) == 3
+        first, retried, third = (outbox.get_outbox(i) for i in ids)
+        assert first["status"] == "sent" and third["status"] == "sent"
+        assert retried["status"] == "queued"
+        assert retried["attempts"] == 1
+        assert "451" in retried["last_error"]
+        assert "RSET" in smtp_stub.commands  # recusa no DATA não derruba a conexão
+
+        # ainda dentro da espera: nada a entregar
+        assert outbox.deliver_due(session) == 0
+        with transaction() as conn:
+            conn.execute("UPDATE email_outbox SET next_attempt_at=datetime('now') WHERE id=?", (ids[1],))
+        assert outbox.deliver_due(session) == 1
+    finally:
+        session.close()
+
+    rows = [outbox.get_outbox(i) for i in ids]
+    assert [r["status"] for r in rows] == ["sent"] * 3
+    assert [r["attempts"] for r in rows] == [1, 2, 1]
+    assert all(r["last_error"] is None and r["smtp_response"] == "ok" for r in rows)
+    assert smtp_stub.connections == 1
+    assert len(smtp_stub.messages) == 3
+    assert outbox.outbox_stats()["smtp_connections"] - before["smtp_connections"] == 1
+
+
+def test_missing_attachment_fails_without_retry(smtp_stub, checklist_id, tmp_path, monkeypatch):
+    report = tmp_path / "relatorio.pdf"
+    report.write_bytes(b"%PDF-1.4\n")
+    [oid] = outbox.enqueue_report_email(checklist_id, str(report), [], ["dest@vrp.local"])
+
+    def gone(*args, **kwargs):
+        raise FileNotFoundError(str(report))
+    monkeypatch.setattr(outbox.email_service, "write_report_message", gone)
+
+    session = outbox.SmtpSession()
+    try:
+        assert outbox.deliver_due(session) == 1
+    finally:
+        session.close()
+    row = outbox.get_outbox(oid)
+    assert row["status"] == "failed" and row["attempts"] == 1
+    assert "FileNotFoundError" in row["last_error"]
+
+
+def test_stale_sending_respects_max_attempts(checklist_id):
+    ids = outbox.enqueue_report_email(checklist_id, "", [], ["a@vrp.local"]) \
+        + outbox.enqueue_report_email(checklist_id, "", [], ["b@vrp.local"])
+    with transaction() as conn:
+        # duas mensagens presas em 'sending' (processo caiu): uma ainda com tentativas, outra esgotada
+        conn.execute(
+            """UPDATE email_outbox SET status='sending', claimed_at=datetime('now', '-1 hour'),
+                      attempts=CASE id WHEN ? THEN 1 ELSE max_attempts END,
+                      next_attempt_at=datetime('now', '+1 hour')
+                WHERE id IN (?, ?)""",
+            (ids[0], ids[0], ids[1]),
+        )
+    assert outbox._claim(20) == []  # reenfileirada, mas só para depois de next_attempt_at
+    requeued, exhausted = (outbox.get_outbox(i) for i in ids)
+    assert requeued["status"] == "queued"
+    assert exhausted["status"] == "failed" and "interrompido" in exhausted["last_error"]
+
+
+def test_oversize_attachment_is_reported(checklist_id, tmp_path):
+    report = tmp_path / "relatorio.docx"
+    report.write_bytes(b"0" * 64 * 1024)
+    with pytest.raises(AttachmentTooLargeError, match="relatorio.docx"):
+        plan_report_email(checklist_id, str(report), [], max_bytes=32 * 1024)